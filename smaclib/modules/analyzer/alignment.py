@@ -1,6 +1,6 @@
-import sys
 import itertools
 import blist
+import numpy
 
 from lxml import etree
 
@@ -8,47 +8,154 @@ from twisted.internet import reactor
 from twisted.internet import threads
 from twisted.internet import defer
 from smaclib import tasks
-from smaclib.modules.analyzer.identification import get_diff_score
+from smaclib import workers
+from smaclib.modules.analyzer.identification import get_refined_diff_matrix
+from smaclib.modules.analyzer.identification import get_banded_diff_matrix
 
 from zope.interface import implements
 
 class Identification(object):
 
-    implements(tasks.ITaskRunner)
+    implements(tasks.ICancelableTaskRunner)
 
-    def __init__(self, sequences=None, slides=None):
+    chunksize = 64
+    """
+    Number of sequences sent at once to a worker process to compute their
+    distance to each slide.
+    """
+
+    coarse_candidates = None
+    """
+    Number of slides, ranked on their coarse features vectors, whose full
+    distance to each sequence is computed (see
+    ``identification.get_refined_diff_matrix``), or ``None`` to compute the
+    full distance to all the slides.
+
+    The ranking is approximate: a slide within the candidates margin of a
+    sequence (see ``Sequence.missing_max_confidence``) or its second best
+    slide may be missed, which changes its candidates or its confidence (see
+    ``benchmarks.coarse`` for the rates). The full distances are thus
+    computed by default, use the ``index`` for an exact partial search.
+    """
+
+    band = None
+    """
+    Number of slides on each side of the expected position of a sequence
+    whose distance to it is computed, the band being widened while the match
+    inside it is not confident (see ``identification.get_banded_diff_matrix``).
+    Lectures mostly following the slides order are then aligned in a time
+    linear in the number of sequences. Set this to ``None`` to compare each
+    sequence with all the slides.
+    """
+
+    band_confidence = 0.3
+    """
+    Confidence from which the best match inside the band of a sequence is
+    trusted, both to stop widening the band and to anchor the expected
+    position of the following sequences.
+    """
+
+    def __init__(self, sequences=None, slides=None, pool=None, index=None):
         """
         The segmentation sortedset is modified in place.
         """
         self.task = tasks.Task("Slides alignment", self)
         self.segmentation = sequences
         self.slides = slides
+        self.pool = pool
+        """The worker pool to use, defaults to ``workers.get_pool()``."""
+        self.index = index
+        """
+        A ``slideindex.SlideIndex`` over the features vectors of the slides,
+        used instead of the full distances or the coarse features ranking when
+        set.
+        """
+
+        self.job = None
 
     def getTask(self):
         return self.task
 
     @defer.inlineCallbacks
     def start(self):
-        res = yield threads.deferToThread(self.identify)
+        self.task.statustext = "Computing the distance matrix..."
+
+        features = [slide.features for slide in self.slides]
+        frames = (seq.end_frame.features for seq in self.segmentation)
+        chunksize = self.chunksize
+
+        if self.band is not None:
+            # The band follows the sequences in order, in a single chunk
+            frames = ((seq.end_frame.timestamp, seq.end_frame.features)
+                      for seq in self.segmentation)
+            function, args = _band_rows, (features, self.band,
+                                          self.band_confidence)
+            chunksize = max(1, len(self.segmentation))
+        elif self.index is not None:
+            function, args = _index_rows, (self.index,
+                                           _margin(self.segmentation))
+        else:
+            function, args = _diff_rows, (features, self.coarse_candidates)
+
+        pool = self.pool or workers.get_pool()
+        self.job = pool.submit(function, frames, args=args,
+                               chunksize=chunksize)
+
+        try:
+            scores = yield self.job
+            res = yield threads.deferToThread(self.identify, scores)
+        except defer.CancelledError:
+            return
+
+        if self.task.called:
+            # Cancelled while identifying
+            return
+
         self.task.callback(res, "Alignment completed")
 
+    def cancel(self):
+        if self.job is not None:
+            self.job.cancel()
+
     def updateTask(self, statustext):
         def update():
             self.task.statustext = statustext
         reactor.callFromThread(update)
 
-    def get_sequences(self, segmentation, slides):
+    def get_sequences(self, segmentation, slides, scores=None):
         """
         Returns a list of sequences representing the first basic identification
         obtained by matching the features vector of each frame with the
         features vectors of each slide.
+
+        The distance matrix between the frames and the slides is computed
+        unless given as ``scores``, within a ``band`` if set, or else using
+        ``index`` if set.
         """
 
         sequences = blist.sortedset()
-
-        for sequence in segmentation:
-            for slide in slides:
-                sequence.process_candidate(slide)
+        slides = list(slides)
+        frames = [sequence.end_frame.features for sequence in segmentation]
+
+        if scores is None and self.band is not None:
+            scores = get_banded_diff_matrix(
+                frames,
+                [sequence.end_frame.timestamp for sequence in segmentation],
+                [slide.features for slide in slides],
+                self.band,
+                self.band_confidence
+            )
+        elif scores is None and self.index is not None:
+            scores = _index_rows(frames, self.index, _margin(segmentation))
+        elif scores is None:
+            scores = get_refined_diff_matrix(
+                frames,
+                [slide.features for slide in slides],
+                self.coarse_candidates
+            )
+
+        for sequence, row in itertools.izip(segmentation, scores):
+            sequence.set_scores(slides, row)
 
             if sequence.keep():
                 sequences.add(sequence)
@@ -56,46 +163,71 @@ class Identification(object):
         return sequences
 
     def get_base_matches(self, sequences):
-        results = {}
+        """
+        Returns the base matches, defined as the chain of (sequence, slide
+        candidate) pairs with strictly increasing sequences and slide ids
+        which maximizes the sum of the sequences confidences.
+
+        The chain is built iteratively, from the last sequence to the first
+        one: the best chain starting from a given pair is the pair itself
+        followed by the best chain already computed among the ones starting
+        with a later sequence and a slide with a greater id. Those are looked
+        up in a ``_MaxTree`` indexed by slide id, which gives an
+        O(n log n) complexity over the number of candidate pairs.
+
+        Ties are broken in favour of the first sequence and of the best ranked
+        candidate.
+        """
+        sequences = list(sequences)
 
-        for sequence in sequences:
-            for slide in sequence.candidates:
-                self._get_path(sequences, results, sequence, slide)
+        # Slide ids are mapped to reversed ranks, so that the greater slide ids
+        # are at the beginning of the tree.
+        ids = sorted(set(s.id for seq in sequences for s in seq.candidates))
+        ranks = dict((slide_id, len(ids) - i) for i, slide_id in enumerate(ids))
 
-        path = max(results.values(), key=lambda p: p[0])[1]
+        tree = _MaxTree(len(ids))
+        best = None
 
-        for match in path:
-            match.mark_as_assigned()
+        for i in reversed(xrange(len(sequences))):
+            sequence = sequences[i]
+            chains = []
 
-        return blist.sortedset(path)
+            # Look up all the pairs of the current sequence before adding them
+            # to the tree, a sequence can appear only once in the chain.
+            for pos, slide in enumerate(sequence.candidates):
+                rank = ranks[slide.id]
+                following = tree.query(rank - 1)
+
+                if following is not None and following[0] > 0:
+                    confidence = following[0] + sequence.confidence
+                    moves = (sequence, slide, following[3])
+                else:
+                    confidence = 0 + sequence.confidence
+                    moves = (sequence, slide, None)
 
-    def _get_path(self, sequences, results, sequence, slide):
-        if (sequence, slide) in results:
-            return results[sequence, slide]
+                chains.append((rank, (confidence, -i, -pos, moves)))
 
-        max_confidence = 0
-        best_moves = []
+            for rank, chain in chains:
+                tree.update(rank, chain)
 
-        for test_seq in sequences[sequences.index(sequence) + 1:]:
-            for test_slide in test_seq.candidates:
-                if test_slide.id <= slide.id:
-                    continue
+                if best is None or chain > best:
+                    best = chain
 
-                confidence, moves = self._get_path(sequences, results,
-                                                   test_seq, test_slide)
+        path = []
+        moves = best[3] if best is not None else None
 
-                if confidence > max_confidence:
-                    max_confidence = confidence
-                    best_moves = moves
+        while moves is not None:
+            sequence, slide, moves = moves
+            path.append(Match(sequence, slide))
 
-        moves = [Match(sequence, slide)] + best_moves
-        results[sequence, slide] = (max_confidence + sequence.confidence, moves)
+        for match in path:
+            match.mark_as_assigned()
 
-        return results[sequence, slide]
+        return blist.sortedset(path)
 
-    def identify(self):
+    def identify(self, scores=None):
         self.updateTask("Building base sequences...")
-        sequences = self.get_sequences(self.segmentation, self.slides)
+        sequences = self.get_sequences(self.segmentation, self.slides, scores)
 
         self.updateTask("Getting base matches...")
         matches = self.get_base_matches(sequences)
@@ -133,7 +265,7 @@ class Identification(object):
         sorted set.
         """
 
-        while matches[-1].sequence.discard_trailing:
+        while matches and matches[-1].sequence.discard_trailing:
             matches.pop()
 
         return None # Data structures are modified in-place
@@ -224,7 +356,7 @@ class Identification(object):
 
     def merge_remnant_sequences(self, matches, extra_matches):
         result_seq_index = 0
-        prev_slide = -1
+        prev_slide = None
         next_seq = matches[0].sequence
         next_slide = matches[0].slide
 
@@ -232,23 +364,29 @@ class Identification(object):
             seq = extra_match.sequence
 
             try:
-                while seq >= next_seq:
+                while next_seq is not None and seq >= next_seq:
                     result_seq_index += 1
                     prev_slide = next_slide
                     next_slide = matches[result_seq_index].slide
                     next_seq = matches[result_seq_index].sequence
             except IndexError:
-                next_slide = -1
-                next_seq = sys.maxint
+                next_slide = None
+                next_seq = None
 
             if result_seq_index:
                 ext = matches[result_seq_index - 1].extended
-                if ext and ext >= seq.end_frame:
+                if ext and ext.num >= seq.end_frame.num:
                     # Overlapping extra slide, ignore it
                     continue
 
-            if extra_match.slide in (next_slide, prev_slide):
-                matches.insert(result_seq_index, extra_match)
+            # Slides only compare to slides
+            neighbours = [slide for slide in (next_slide, prev_slide)
+                          if slide is not None]
+
+            if extra_match.slide in neighbours:
+                # The matches are sorted by sequence, the extra match lands
+                # at result_seq_index.
+                matches.add(extra_match)
                 result_seq_index += 1
 
     @staticmethod
@@ -291,9 +429,223 @@ class Identification(object):
 
         return None # Data structures are modified in-place
 
+class OnlineIdentification(object):
+    """
+    Incremental counterpart of ``Identification`` for live recordings: the
+    sequences are added one at a time, in the order the segmentation produces
+    them, and the provisional matches are available after each of them.
+
+    The distance of each added sequence to the slides is computed as by
+    ``Identification.get_sequences``, using the ``index`` or the coarse
+    candidates of the given ``Identification`` (the ``band`` needs the whole
+    segmentation and is ignored). The base matches chain is then extended
+    with a forward pass: the best chain ending with each (sequence, slide
+    candidate) pair is the pair itself preceded by the best chain ending with
+    an earlier sequence and a lower slide id, looked up in a ``_MaxTree``.
+    Both passes maximize the same sum of confidences and break the ties
+    between equally confident chains in favour of the first sequence, so
+    that once all the sequences are added the provisional matches are the
+    base matches of the batch identification. The sums are however added in
+    the opposite order, chains whose confidences differ by a rounding error
+    only may thus be ranked differently.
+
+    Only the distances and the base matches are incremental: ``finish`` runs
+    the whole batch ``Identification.identify`` again over the distance rows
+    of the added sequences (``identify(self.scores)``). The base matches are
+    computed once more and the merging passes run over all the sequences,
+    only the distances are not computed again.
+    """
+
+    def __init__(self, slides, identification=None):
+        self.identification = identification or Identification()
+        self.identification.slides = slides
+        self.identification.segmentation = blist.sortedset()
+
+        self.slides = list(slides)
+        self.features = numpy.asarray([slide.features for slide in slides],
+                                      dtype=numpy.float64)
+        self.scores = []
+        """The distance rows of the added sequences, in order."""
+
+        # Slide ids are mapped to ranks, so that the prefix maximum queries
+        # return the chains ending with a lower slide id.
+        self.ranks = dict((slide.id, i + 1)
+                          for i, slide in enumerate(sorted(self.slides)))
+        self.tree = _MaxTree(len(self.slides))
+        self.best = None
+
+    @property
+    def segmentation(self):
+        return self.identification.segmentation
+
+    def distances(self, sequence):
+        """
+        Returns the distance row of the given sequence to the slides.
+        """
+        frames = [sequence.end_frame.features]
+
+        if self.identification.index is not None:
+            return _index_rows(frames, self.identification.index,
+                               sequence.missing_max_confidence)[0]
+
+        return get_refined_diff_matrix(
+            frames, self.features, self.identification.coarse_candidates)[0]
+
+    def add(self, sequence):
+        """
+        Adds the next sequence of the segmentation and returns the updated
+        provisional matches (see ``matches``).
+        """
+        if self.segmentation and sequence <= self.segmentation[-1]:
+            raise ValueError("Sequences have to be added in order.")
+
+        row = self.distances(sequence)
+        sequence.set_scores(self.slides, row)
+
+        self.segmentation.add(sequence)
+        self.scores.append(row)
+
+        if sequence.keep():
+            self.extend(sequence, len(self.scores) - 1)
+
+        return self.matches()
+
+    def extend(self, sequence, index):
+        """
+        Records the best chains ending with each candidate of the given
+        sequence, the ``index``-th one of the segmentation.
+        """
+        chains = []
+
+        # Look up all the pairs of the sequence before adding them to the
+        # tree, a sequence can appear only once in the chain.
+        for pos, slide in enumerate(sequence.candidates):
+            rank = self.ranks[slide.id]
+            previous = self.tree.query(rank - 1)
+
+            if previous is not None and previous[0] > 0:
+                confidence = previous[0] + sequence.confidence
+                moves = (sequence, slide, previous[3])
+            else:
+                confidence = 0 + sequence.confidence
+                moves = (sequence, slide, None)
+
+            # Same tie-break key as Identification.get_base_matches
+            chains.append((rank, (confidence, -index, -pos, moves)))
+
+        for rank, chain in chains:
+            self.tree.update(rank, chain)
+
+            if self.best is None or chain > self.best:
+                self.best = chain
+
+    def matches(self):
+        """
+        Returns the list of the provisional matches: the best chain of
+        (sequence, slide candidate) pairs found among the sequences added so
+        far. The sequences and the slides are not marked as assigned.
+        """
+        path = []
+        moves = self.best[3] if self.best is not None else None
+
+        while moves is not None:
+            sequence, slide, moves = moves
+            path.append(Match(sequence, slide))
+
+        path.reverse()
+
+        return path
+
+    def finish(self):
+        """
+        Returns the final matches, running the batch
+        ``Identification.identify`` over the distance rows of all the added
+        sequences.
+        """
+        return self.identification.identify(self.scores)
+
+def _diff_rows(frames, slides, k=None):
+    """
+    Worker process function for ``Identification``, returning the rows of the
+    distance matrix between the given frames and slides features vectors (see
+    ``Identification.coarse_candidates``).
+    """
+    return list(get_refined_diff_matrix(frames, slides, k))
+
+def _band_rows(frames, slides, width, min_confidence):
+    """
+    Worker process function for ``Identification``, returning the rows of the
+    distance matrix between the given ``(timestamp, features)`` frames and
+    the slides features vectors, computed within a band around the expected
+    position of each frame (see ``Identification.band``).
+    """
+    timestamps, features = zip(*frames)
+    return list(get_banded_diff_matrix(features, timestamps, slides, width,
+                                       min_confidence))
+
+def _margin(sequences):
+    """
+    Returns the relative margin of the best score within which the slides are
+    candidates of any of the given sequences (see
+    ``Sequence.missing_max_confidence``), which a partial search of the
+    distances must not miss.
+    """
+    return max([sequence.missing_max_confidence for sequence in sequences] or
+               [Sequence.missing_max_confidence])
+
+def _index_rows(frames, index, margin):
+    """
+    Worker process function for ``Identification``, returning the rows of the
+    distance matrix between the given frames features vectors and the slides
+    of the given ``slideindex.SlideIndex``, computed for the candidates
+    within the relative ``margin`` of the best score only (see ``_margin``).
+    """
+    return list(index.get_diff_matrix(list(frames), margin))
+
+
+class _MaxTree(object):
+    """
+    A Fenwick tree holding comparable values and answering prefix maximum
+    queries in O(log n) time. Positions are 1-based.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.values = [None] * (size + 1)
+
+    def update(self, position, value):
+        """
+        Records ``value`` at the given position.
+        """
+        while position <= self.size:
+            current = self.values[position]
+            if current is None or value > current:
+                self.values[position] = value
+            position += position & -position
+
+    def query(self, position):
+        """
+        Returns the greatest value recorded at positions up to ``position``
+        included, or ``None`` if no value was recorded there.
+        """
+        result = None
+
+        while position > 0:
+            value = self.values[position]
+            if value is not None and (result is None or value > result):
+                result = value
+            position -= position & -position
+
+        return result
+
+
 class Frame(object):
+    """
+    A frame of the video, identified by its number. Frames of a
+    ``FrameTable`` are views over one of its rows.
+    """
 
-    framerate = 25.
+    __slots__ = ('framerate', 'num', 'timestamp', '_features', '_row')
 
     def __init__(self, frame_num, features=None, framerate=25.):
         self.framerate = framerate
@@ -301,6 +653,29 @@ class Frame(object):
         self.timestamp = (frame_num - 1.) / self.framerate
         self.features = features
 
+    @classmethod
+    def fromtable(cls, table, row):
+        """
+        Creates a view over the given row of a ``FrameTable``.
+        """
+        frame = cls(int(table.numbers[row]), table.features, table.framerate)
+
+        if table.features is not None:
+            frame._row = row
+
+        return frame
+
+    @property
+    def features(self):
+        if self._row is None:
+            return self._features
+        return self._features[self._row]
+
+    @features.setter
+    def features(self, features):
+        self._features = features
+        self._row = None
+
     def __str__(self):
         return str(self.num)
 
@@ -308,14 +683,79 @@ class Frame(object):
         return str(self.num)
 
     def __sub__(self, other):
-        if type(other) == int:
-            return Frame(self.num - other)
+        # Only the numbers are involved, the features are left behind
+        if type(other) != int:
+            other = other.num
+
+        return Frame(self.num - other, None, self.framerate)
+
+
+class FrameTable(object):
+    """
+    Struct of arrays holding the numbers, the timestamps and the features
+    vectors of a set of frames, one frame per row.
+
+    The frames of the table (see ``frame``) are thin views over its rows:
+    their features vector is read from the ``features`` matrix when needed
+    instead of being an array or a list of their own, so that the memory used
+    to align a long recording stays close to the size of the matrix.
+
+    Only the features are shared: each frame holds its number and timestamp
+    as attributes, and the sequences built over the tables (see
+    ``sequences_fromtables``) are compared one object at a time by the
+    sorted sets of the alignment passes.
+    """
+
+    def __init__(self, numbers, features=None, framerate=25.):
+        self.framerate = framerate
+        self.numbers = numpy.asarray(numbers, dtype=numpy.int64)
+        self.timestamps = (self.numbers - 1.) / framerate
+        self.features = None
+
+        if features is not None:
+            self.features = numpy.asarray(features, dtype=numpy.float64)
+
+    def __len__(self):
+        return len(self.numbers)
+
+    def frame(self, index):
+        """
+        Returns the frame of the given row.
+        """
+        return Frame.fromtable(self, index)
+
 
-        return Frame(self.num - other.num)
+def sequences_fromtables(first_frames, last_frames, unstable=None,
+                         sequence_class=None):
+    """
+    Returns the sorted set of the sequences going from each frame of the
+    ``first_frames`` table to the frame of the same row of the
+    ``last_frames`` table, flagged as unstable according to the same row of
+    the ``unstable`` array if given. The sequences are instances of
+    ``sequence_class`` if given, a subclass of ``Sequence`` overriding its
+    thresholds for instance.
+    """
+    if unstable is None:
+        unstable = numpy.zeros(len(last_frames), dtype=bool)
+
+    if sequence_class is None:
+        sequence_class = Sequence
+
+    # Sort the rows on the table numbers, the sorted set is then built from
+    # already ordered sequences.
+    order = numpy.argsort(last_frames.numbers, kind='mergesort')
+
+    return blist.sortedset(
+        sequence_class(first_frames.frame(i), last_frames.frame(i),
+                       bool(unstable[i]))
+        for i in order
+    )
 
 
 class Match(object):
 
+    __slots__ = ('sequence', 'slide', 'base', 'extended')
+
     def __init__(self, seq, slide, base=True):
         self.sequence = seq
         self.slide = slide
@@ -385,6 +825,9 @@ class Match(object):
 
 
 class Slide(object):
+
+    __slots__ = ('id', 'imagepath', 'features', 'displayed', 'assigned_to')
+
     def __init__(self, slide_id, features=None, imagepath=''):
         self.id = slide_id
         self.imagepath = imagepath
@@ -463,15 +906,23 @@ class Sequence(object):
     when going back in the slide stream.
     """
 
+    __slots__ = ('start_frame', 'end_frame', 'unstable', 'assigned_slide',
+                 '_slides', '_scores', '_candidates', '_candidate_indexes',
+                 '_confidence')
+
     def __init__(self, start_frame, end_frame, unstable=False):
         self.start_frame = start_frame
         self.end_frame = end_frame
         self.unstable = unstable
         self.assigned_slide = None
-        self._candidates = [{}, None, 0]
+        self._slides = []
+        self._scores = None
+        self._candidates = None
+        self._candidate_indexes = None
+        self._confidence = 0
 
     def __cmp__(self, other):
-        return self.id.__cmp__(other.id)
+        return cmp(self.end_frame.num, other.end_frame.num)
 
     @property
     def discard_trailing(self):
@@ -489,35 +940,59 @@ class Sequence(object):
     def id(self):
         return self.end_frame.num
 
-    def process_candidate(self, slide):
-        diff = get_diff_score(slide.features, self.end_frame.features)
-        self._candidates[0][slide] = diff
-        self._candidates[1] = None
+    def set_scores(self, slides, scores):
+        """
+        Sets the difference scores of the end frame of this sequence against
+        each slide of the ``slides`` list, as a row of the matrix computed by
+        ``get_diff_matrix``.
+        """
+        self._slides = slides
+        self._scores = scores
+        self._candidates = None
 
     @property
     def best_score(self):
-        return self._candidates[0][self.candidates[0]]
+        if self._candidates is None:
+            self._process_candidates()
+
+        return float(self._scores[self._candidate_indexes[0]])
 
     @property
     def candidates(self):
-        if self._candidates[1] is None:
+        if self._candidates is None:
             self._process_candidates()
 
-        return self._candidates[1]
+        return self._candidates
 
     def _process_candidates(self):
-        candidates = self._candidates[0].items()
-        candidates.sort(key=lambda c: c[1])
+        # A stable sort keeps the ties in the slides order
+        order = numpy.argsort(self._scores, kind='mergesort')
+        ranked = self._scores[order]
+
+        best = float(ranked[0])
+        second_best = float(ranked[1])
 
-        best = candidates[0][1]
-        second_best = candidates[1][1]
+        if best:
+            self._confidence = (second_best - best) / best
+
+            # Scores are sorted, thus the relative scores are sorted too and
+            # the candidates are the leading ones.
+            relative = (ranked - best) / best
+            count = numpy.searchsorted(relative, self.missing_max_confidence,
+                                       side='right')
+        else:
+            # An exact match: the relative scores are undefined, the match is
+            # infinitely confident unless another slide matches exactly too,
+            # and only the exact matches are candidates.
+            self._confidence = numpy.inf if second_best else 0.0
+            count = numpy.searchsorted(ranked, 0.0, side='right')
 
-        take = lambda c: (c[1] - best) / best <= self.missing_max_confidence
-        candidates = itertools.takewhile(take, candidates)
-        candidates = [c for c, _ in candidates if c.displayed]
+        indexes = order[:count]
+        displayed = numpy.fromiter((self._slides[i].displayed
+                                    for i in indexes), bool, count)
 
-        self._candidates[1] = candidates
-        self._candidates[2] = (second_best - best) / best
+        self._candidate_indexes = indexes[displayed]
+        self._candidates = [self._slides[i] for i in self._candidate_indexes]
 
     def keep(self):
         if self.confidence >= self.min_confidence:
@@ -530,10 +1005,10 @@ class Sequence(object):
 
     @property
     def confidence(self):
-        if self._candidates[1] is None:
+        if self._candidates is None:
             self._process_candidates()
 
-        return self._candidates[2]
+        return self._confidence
 
     def __repr__(self):
         return "Sequence({0!s}, {1!s})".format(self.start_frame, self.end_frame)
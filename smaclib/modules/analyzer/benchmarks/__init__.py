@@ -0,0 +1,31 @@
+"""
+Benchmarks for the analyzer module.
+
+Each module of this package can be run as a script and prints its results on
+the standard output, for example::
+
+    python -m smaclib.modules.analyzer.benchmarks.features
+"""
+
+
+import time
+
+
+def timeit(func, *args, **kwargs):
+    """
+    Runs ``func`` with the given arguments ``repeat`` times (default 3) and
+    returns a ``(best_time, result)`` tuple, where ``best_time`` is the
+    fastest run in seconds.
+    """
+    repeat = kwargs.pop('repeat', 3)
+    best = None
+
+    for _ in xrange(repeat):
+        start = time.time()
+        result = func(*args, **kwargs)
+        elapsed = time.time() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best, result
@@ -0,0 +1,245 @@
+"""
+Measures the time and the peak memory of each stage of the slides alignment
+(see ``alignment.Identification.identify``) on synthetic lectures (see
+``synthetic.lecture``).
+
+Usage::
+
+    python -m smaclib.modules.analyzer.benchmarks.alignment [options]
+
+A scenario is run for each combination of the ``--slides``, ``--sequences``,
+``--revisit`` and ``--noise`` values. The whole alignment is timed first,
+then each stage is timed while the alignment runs again. The peak memory of
+a stage is the growth of the resident memory while it runs in a forked
+process, which leaves the state of the measured process untouched.
+
+The results are printed and, with ``--output``, saved as JSON. Pass the JSON
+results of a previous run as ``--baseline`` to print the time ratios of the
+current run against it.
+"""
+
+
+import os
+import sys
+import json
+import time
+import platform
+import resource
+import argparse
+import itertools
+
+from smaclib.modules.analyzer import alignment
+from smaclib.modules.analyzer.benchmarks import synthetic
+from smaclib.modules.analyzer.benchmarks import timeit
+
+
+STAGES = (
+    'get_sequences',
+    'get_base_matches',
+    'merge_off_sequence_slides',
+    'merge_redundant_sequences',
+    'merge_remnant_sequences',
+    'assign_orphan_sequences',
+    'filter_trailling_sequences',
+)
+"""
+The ``Identification`` methods called by ``identify``, in order.
+"""
+
+
+def resident_memory():
+    """
+    Returns the current resident memory of the process, in bytes.
+    """
+    with open('/proc/self/statm') as fh:
+        return int(fh.read().split()[1]) * resource.getpagesize()
+
+
+def peak_memory(func, *args):
+    """
+    Runs ``func`` with the given arguments in a forked process and returns
+    the growth of its resident memory at its peak, in bytes.
+    """
+    read, write = os.pipe()
+    pid = os.fork()
+
+    if not pid:
+        try:
+            os.close(read)
+            start = resident_memory()
+            func(*args)
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            os.write(write, str(max(0, peak - start)))
+        finally:
+            os._exit(0)
+
+    os.close(write)
+
+    with os.fdopen(read) as fh:
+        result = fh.read()
+
+    os.waitpid(pid, 0)
+
+    return int(result) if result else None
+
+
+class StageRecorder(object):
+    """
+    Wraps the stages of an ``Identification`` to record the time and the
+    peak memory of each of their calls.
+    """
+
+    def __init__(self, ident, memory=True):
+        self.memory = memory
+        self.stages = []
+
+        for name in STAGES:
+            setattr(ident, name, self.wrap(name, getattr(ident, name)))
+
+    def wrap(self, name, method):
+        def stage(*args):
+            peak = peak_memory(method, *args) if self.memory else None
+
+            start = time.time()
+            result = method(*args)
+            elapsed = time.time() - start
+
+            self.stages.append((name, elapsed, peak))
+            return result
+        return stage
+
+    def summary(self):
+        """
+        Returns the list of the stages, their calls being summed up in the
+        order of their first call.
+        """
+        result = []
+        totals = {}
+
+        for name, elapsed, peak in self.stages:
+            if name not in totals:
+                totals[name] = {'name': name, 'calls': 0, 'time': 0.0,
+                                'peak_memory': peak}
+                result.append(totals[name])
+
+            total = totals[name]
+            total['calls'] += 1
+            total['time'] += elapsed
+
+            if peak is not None:
+                total['peak_memory'] = max(total['peak_memory'], peak)
+
+        return result
+
+
+def run(slides, sequences, revisit, noise, seed=0, repeat=3, memory=True):
+    """
+    Runs the alignment of a synthetic lecture and returns its results.
+    """
+    def lecture():
+        return synthetic.lecture(slides, sequences, noise, seed, revisit)
+
+    # The alignment modifies the sequences, each run needs its own lecture
+    lectures = [lecture() for _ in xrange(repeat)]
+
+    def identify():
+        return alignment.Identification(*lectures.pop()).identify()
+
+    elapsed, matches = timeit(identify, repeat=repeat)
+
+    ident = alignment.Identification(*lecture())
+    total_peak = peak_memory(ident.identify) if memory else None
+
+    ident = alignment.Identification(*lecture())
+    recorder = StageRecorder(ident, memory)
+    ident.identify()
+
+    return {
+        'slides': slides,
+        'sequences': sequences,
+        'revisit': revisit,
+        'noise': noise,
+        'seed': seed,
+        'matches': len(matches),
+        'time': elapsed,
+        'peak_memory': total_peak,
+        'stages': recorder.summary(),
+    }
+
+
+def key(result):
+    return tuple(result[k] for k in ('slides', 'sequences', 'revisit',
+                                     'noise', 'seed'))
+
+
+def report(result, baseline=None):
+    print ('{slides} slides, {sequences} sequences, revisit {revisit}, '
+           'noise {noise}: {matches} matches').format(**result)
+
+    row = '{0:>28} {1:>6} {2:>10} {3:>12} {4:>10}'
+    print row.format('stage', 'calls', 'time (s)', 'peak (KiB)', 'vs base')
+
+    previous = {}
+    if baseline is not None:
+        previous = dict((s['name'], s['time']) for s in baseline['stages'])
+        previous[None] = baseline['time']
+
+    def line(name, calls, elapsed, peak, label=None):
+        peak = '-' if peak is None else '{0:.0f}'.format(peak / 1024.)
+        ratio = ''
+        if previous.get(name):
+            ratio = '{0:.2f}x'.format(elapsed / previous[name])
+        print row.format(label or name, calls, '{0:.4f}'.format(elapsed),
+                         peak, ratio)
+
+    for stage in result['stages']:
+        line(stage['name'], stage['calls'], stage['time'],
+             stage['peak_memory'])
+
+    line(None, '', result['time'], result['peak_memory'], 'identify')
+    print
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the stages of "
+                                     "the slides alignment.")
+    parser.add_argument('--slides', type=int, nargs='+', default=[30, 200])
+    parser.add_argument('--sequences', type=int, nargs='+',
+                        default=[80, 600])
+    parser.add_argument('--revisit', type=float, nargs='+', default=[0.0, 0.1])
+    parser.add_argument('--noise', type=float, nargs='+', default=[1.0, 4.0])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help="do not measure the peak memory")
+    parser.add_argument('--output', help="file to save the JSON results to")
+    parser.add_argument('--baseline', help="JSON results to compare with")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = dict((key(r), r) for r in json.load(fh)['scenarios'])
+
+    scenarios = []
+    for slides, sequences, revisit, noise in itertools.product(
+            args.slides, args.sequences, args.revisit, args.noise):
+        result = run(slides, sequences, revisit, noise, args.seed,
+                     args.repeat, args.memory)
+        report(result, baseline.get(key(result)))
+        scenarios.append(result)
+
+    if args.output:
+        results = {
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'scenarios': scenarios,
+        }
+
+        with open(args.output, 'w') as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
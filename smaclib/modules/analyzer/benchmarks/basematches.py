@@ -0,0 +1,43 @@
+"""
+Measures how the base matches search of the alignment scales with the number
+of sequences of a recording.
+
+Usage::
+
+    python -m smaclib.modules.analyzer.benchmarks.basematches [count ...]
+
+The default counts go from 100 up to 5,000 sequences.
+"""
+
+
+import sys
+
+from smaclib.modules.analyzer import alignment
+from smaclib.modules.analyzer.benchmarks import synthetic
+from smaclib.modules.analyzer.benchmarks import timeit
+
+
+COUNTS = (100, 250, 500, 1000, 2000, 5000)
+
+
+def main(counts):
+    row = '{0:>10} {1:>8} {2:>12} {3:>10} {4:>10}'
+    print row.format('sequences', 'slides', 'candidates', 'matches',
+                     'time (s)')
+
+    for count in counts:
+        sequences, slides = synthetic.lecture(slides_count=count // 4,
+                                              sequences_count=count,
+                                              noise=8.0)
+        ident = alignment.Identification(sequences, slides)
+        sequences = ident.get_sequences(sequences, slides)
+        candidates = sum(len(s.candidates) for s in sequences)
+
+        elapsed, matches = timeit(ident.get_base_matches, sequences)
+
+        print row.format(count, len(slides), candidates, len(matches),
+                         '{0:.3f}'.format(elapsed))
+
+
+if __name__ == '__main__':
+    main([int(c) for c in sys.argv[1:]] or COUNTS)
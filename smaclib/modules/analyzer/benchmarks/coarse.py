@@ -0,0 +1,169 @@
+"""
+Measures the recall and the speed of the coarse-to-fine frame to slide
+matching (see ``identification.get_refined_diff_matrix``) for several numbers
+``k`` of refined candidates.
+
+Usage::
+
+    python -m smaclib.modules.analyzer.benchmarks.coarse [slides [frames]]
+
+Slides and frames are synthetic images (see ``synthetic.slide_image`` and
+``synthetic.frame_image``); the default is 400 slides and 800 frames.
+
+For each ``k`` the following values are reported:
+
+ * ``recall``: the rate of frames whose best matching slide is among the
+   ``k`` nearest slides according to the coarse vectors;
+ * ``exact``: the rate of frames whose alignment candidates and confidence
+   are the same as with the full distance matrix; the confidence depends on
+   the second best matching slide, which is more often missed;
+ * ``matches``: whether the alignment of a lecture showing the slides in
+   order is the same as with the full distance matrix.
+
+The same values are reported for the search through a ``slideindex.SlideIndex``
+(whose candidates are always exact), on the ``index`` row; its build time is
+reported separately. The ``band`` row reports them for the search within a
+band of slides around the expected position of each frame (see
+``identification.get_banded_diff_matrix``), whose confidences are exact only
+when the second best slide lies in the band.
+"""
+
+
+import sys
+
+import blist
+import numpy
+
+from smaclib.modules.analyzer import alignment
+from smaclib.modules.analyzer import identification
+from smaclib.modules.analyzer import slideindex
+from smaclib.modules.analyzer.benchmarks import synthetic
+from smaclib.modules.analyzer.benchmarks import timeit
+
+
+K = (2, 4, 8, 16, 32, 64)
+
+BAND = 3
+
+
+def features(slides_count, frames_count):
+    """
+    Returns the features vectors of the frames of a lecture mostly following
+    the slides order, and the ones of the slides.
+    """
+    slides = [synthetic.slide_image(i) for i in xrange(slides_count)]
+
+    random = numpy.random.RandomState(0)
+    shown = numpy.cumsum(random.rand(frames_count) < 0.4) % slides_count
+    frames = [synthetic.frame_image(slides[s], i) for i, s in enumerate(shown)]
+
+    slides = identification.gen_feature_vects(slides, low_quality=False)
+    frames = identification.gen_feature_vects(frames, low_quality=True)
+
+    return frames, slides
+
+
+def candidates(scores, slides):
+    """
+    Returns the candidates and the confidence the alignment derives from each
+    row of the ``scores`` matrix.
+    """
+    result = []
+
+    for row in scores:
+        sequence = alignment.Sequence(None, None)
+        sequence.set_scores(slides, row)
+        result.append((sequence.candidates, sequence.confidence))
+
+    return result
+
+
+def matches(frames, slides, scores):
+    """
+    Returns the ``(sequence, slide)`` pairs of the alignment of the given
+    frames to the given slides, using the given distance matrix.
+    """
+    slides = blist.sortedset(alignment.Slide(i, f)
+                             for i, f in enumerate(slides))
+    sequences = blist.sortedset()
+
+    for i, features in enumerate(frames):
+        first = alignment.Frame(i * 250 + 1)
+        last = alignment.Frame(i * 250 + 200, features)
+        sequences.add(alignment.Sequence(first, last))
+
+    ident = alignment.Identification(sequences, slides)
+    result = ident.identify(scores)
+
+    return [(m.sequence.id, m.slide.id) for m in result]
+
+
+def main(slides_count=400, frames_count=800):
+    frames, slides = features(slides_count, frames_count)
+    objects = [alignment.Slide(i) for i in xrange(slides_count)]
+
+    full_time, full = timeit(identification.get_diff_matrix, frames, slides)
+    expected = candidates(full, objects)
+    aligned = matches(frames, slides, full)
+
+    # Rank of the best slide of each frame according to the coarse vectors
+    coarse = identification.get_diff_matrix(
+        identification.coarse_features(frames),
+        identification.coarse_features(slides)
+    )
+    best = coarse[numpy.arange(len(full)), full.argmin(axis=1)]
+    rank = (coarse < best[:, numpy.newaxis]).sum(axis=1)
+
+    print '{0} slides, {1} frames, full matrix: {2:.3f}s'.format(
+            slides_count, frames_count, full_time)
+    print
+
+    row = '{0:>6} {1:>8} {2:>8} {3:>8} {4:>10} {5:>8}'
+    print row.format('k', 'recall', 'exact', 'matches', 'time (s)', 'speedup')
+
+    for k in K:
+        elapsed, refined = timeit(identification.get_refined_diff_matrix,
+                                  frames, slides, k)
+
+        recall = (rank < k).mean()
+        exact = numpy.mean([a == b for a, b in
+                            zip(candidates(refined, objects), expected)])
+        same = matches(frames, slides, refined) == aligned
+
+        print row.format(k, '{0:.4f}'.format(recall),
+                         '{0:.4f}'.format(exact), 'same' if same else 'differ',
+                         '{0:.3f}'.format(elapsed),
+                         '{0:.1f}x'.format(full_time / elapsed))
+
+    build_time, index = timeit(slideindex.SlideIndex, slides)
+    elapsed, indexed = timeit(index.get_diff_matrix, frames,
+                              alignment.Sequence.missing_max_confidence)
+
+    exact = numpy.mean([a == b for a, b in
+                        zip(candidates(indexed, objects), expected)])
+    same = matches(frames, slides, indexed) == aligned
+
+    print row.format('index', '', '{0:.4f}'.format(exact),
+                     'same' if same else 'differ', '{0:.3f}'.format(elapsed),
+                     '{0:.1f}x'.format(full_time / elapsed))
+
+    timestamps = [alignment.Frame(i * 250 + 200).timestamp
+                  for i in xrange(frames_count)]
+    elapsed, banded = timeit(identification.get_banded_diff_matrix, frames,
+                             timestamps, slides, BAND,
+                             alignment.Identification.band_confidence)
+
+    exact = numpy.mean([a == b for a, b in
+                        zip(candidates(banded, objects), expected)])
+    same = matches(frames, slides, banded) == aligned
+
+    print row.format('band', '', '{0:.4f}'.format(exact),
+                     'same' if same else 'differ', '{0:.3f}'.format(elapsed),
+                     '{0:.1f}x'.format(full_time / elapsed))
+    print
+    print 'index build: {0:.3f}s, {1:.1f} full scores per frame'.format(
+            build_time, index.computed / float(frames_count))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,46 @@
+"""
+Compares the decoding throughput of the forward (streaming) and of the
+seeking (random access) frame readers of the segmentation.
+
+Usage::
+
+    python -m smaclib.modules.analyzer.benchmarks.decoding video [step ...]
+
+The default step is the segmenter resolution.
+"""
+
+
+import sys
+
+from smaclib.modules.analyzer import segmentation
+from smaclib.modules.analyzer.benchmarks import timeit
+
+
+def consume(path, step, seek):
+    reader = segmentation.VideoReader(path)
+    count = 0
+
+    for _ in reader.iterframes(step, seek):
+        count += 1
+
+    return count
+
+
+def main(path, steps):
+    row = '{0:>6} {1:>8} {2:>8} {3:>12} {4:>12}'
+    print row.format('step', 'mode', 'frames', 'time (s)', 'frames/s')
+
+    for step in steps:
+        for mode, seek in (('forward', False), ('seek', True)):
+            elapsed, count = timeit(consume, path, step, seek, repeat=1)
+
+            print row.format(step, mode, count, '{0:.2f}'.format(elapsed),
+                             '{0:.1f}'.format(count / elapsed))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        sys.exit(__doc__)
+
+    main(sys.argv[1], [int(s) for s in sys.argv[2:]]
+                      or [segmentation.VideoSegmenter.resolution])
@@ -0,0 +1,59 @@
+"""
+Compares the vectorized feature extraction engine with the original pixel by
+pixel implementation.
+
+Usage::
+
+    python -m smaclib.modules.analyzer.benchmarks.features [image ...]
+
+If no image is given, synthetic frames of common sizes are generated.
+"""
+
+
+import sys
+
+import numpy
+import Image
+
+from smaclib.modules.analyzer import identification
+from smaclib.modules.analyzer.benchmarks import timeit
+from smaclib.modules.analyzer.tests.test_identification import \
+        gen_feature_vect_loop
+
+
+def synthetic_images(sizes=((320, 240), (640, 480), (1024, 768))):
+    random = numpy.random.RandomState(0)
+
+    for width, height in sizes:
+        data = (random.rand(height, width, 3) * 255).astype(numpy.uint8)
+        yield '{0}x{1} (synthetic)'.format(width, height), \
+              Image.fromarray(data)
+
+
+def main(paths):
+    if paths:
+        images = ((path, Image.open(path)) for path in paths)
+    else:
+        images = synthetic_images()
+
+    row = '{0:<30} {1:>10} {2:>10} {3:>8} {4:>12}'
+    print row.format('image', 'loop (s)', 'array (s)', 'speedup', 'max error')
+
+    for name, image in images:
+        image.load()
+
+        loop_time, expected = timeit(gen_feature_vect_loop, image,
+                                     low_quality=True, repeat=1)
+        array_time, actual = timeit(identification.gen_feature_vect,
+                                    image, low_quality=True)
+
+        error = numpy.abs(numpy.subtract(actual, expected)).max()
+
+        print row.format(name, '{0:.4f}'.format(loop_time),
+                         '{0:.4f}'.format(array_time),
+                         '{0:.1f}x'.format(loop_time / array_time),
+                         '{0:.2e}'.format(error))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,46 @@
+"""
+Reports where the time of the segmentation of a video goes: decoding the
+sampled frames, filtering (or downscaling) them and comparing them (see
+``segmentation.VideoSegmenter.timings``).
+
+Usage::
+
+    python -m smaclib.modules.analyzer.benchmarks.segmentation video [width height]
+
+The frames are compared at full resolution, or on grayscale proxies of the
+given size.
+"""
+
+
+import sys
+
+from smaclib.modules.analyzer import segmentation
+
+
+def main(path, analysis_size=None):
+    segmenter = segmentation.VideoSegmenter(segmentation.VideoReader(path))
+    segmenter.analysis_size = analysis_size
+
+    sequences = sum(1 for _ in segmenter.sequences())
+    summary = segmenter.timing_summary()
+    total = summary.decode + summary.blur + summary.diff
+
+    print '{0} frames analyzed, {1} sequences found'.format(summary.number,
+                                                           sequences)
+    print
+
+    row = '{0:>8} {1:>10} {2:>14} {3:>8}'
+    print row.format('step', 'time (s)', 'per frame (ms)', 'share')
+
+    for step in ('decode', 'blur', 'diff'):
+        elapsed = getattr(summary, step)
+        print row.format(step, '{0:.2f}'.format(elapsed),
+                         '{0:.2f}'.format(elapsed * 1000 / summary.number),
+                         '{0:.0%}'.format(elapsed / total))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 4):
+        sys.exit(__doc__)
+
+    main(sys.argv[1], tuple(int(a) for a in sys.argv[2:]) or None)
@@ -0,0 +1,97 @@
+"""
+Generators of synthetic analysis data, used by the benchmarks and by the test
+suite to exercise the alignment without real recordings.
+"""
+
+
+import blist
+import numpy
+import Image
+
+from smaclib.modules.analyzer import alignment
+from smaclib.modules.analyzer import identification
+
+
+def lecture(slides_count=30, sequences_count=80, noise=1.0, seed=0,
+            revisit=0.0):
+    """
+    Builds a simple lecture whose sequences mostly follow the slides order and
+    whose frame features are noisy copies of the displayed slide features.
+    Each sequence goes back to one of the already presented slides with the
+    ``revisit`` probability, before the lecture resumes where it stopped.
+
+    Returns a ``(sequences, slides)`` tuple of sorted sets of
+    ``alignment.Sequence`` and ``alignment.Slide`` objects, ready to be fed to
+    ``alignment.Identification``.
+    """
+    random = numpy.random.RandomState(seed)
+    length = identification.FEATURES_LENGTH
+    base = random.rand(slides_count, length) * 10
+
+    slides = blist.sortedset(alignment.Slide(i + 1, f.tolist())
+                             for i, f in enumerate(base))
+    sequences = blist.sortedset()
+
+    position, frame = 0, 1
+    for _ in xrange(sequences_count):
+        if random.rand() < 0.4:
+            position = min(position + 1, slides_count - 1)
+        shown = position
+        if revisit and random.rand() < revisit:
+            shown = random.randint(0, position + 1)
+        features = base[shown] + random.randn(length) * noise
+
+        first = alignment.Frame(frame)
+        frame += random.randint(25, 2000)
+        last = alignment.Frame(frame, features.tolist())
+        sequences.add(alignment.Sequence(first, last))
+
+    return sequences, slides
+
+
+def slide_image(seed, size=(320, 240)):
+    """
+    Renders a slide-like image: a light background with a title bar and some
+    dark text-like lines and blocks.
+    """
+    random = numpy.random.RandomState(seed)
+    width, height = size
+
+    data = numpy.empty((height, width, 3), dtype=numpy.uint8)
+    data[...] = random.randint(180, 256, 3)
+
+    title = height // 8
+    data[:title] = random.randint(0, 256, 3)
+
+    y = title + random.randint(5, 20)
+    while y < height - 10:
+        x = random.randint(5, width // 4)
+        line = random.randint(3, 9)
+        data[y:y + line, x:x + random.randint(width // 8, width - x)] = \
+                random.randint(0, 100, 3)
+        y += line + random.randint(4, 25)
+
+    for _ in xrange(random.randint(0, 3)):
+        w, h = random.randint(20, width // 3), random.randint(20, height // 3)
+        x, y = random.randint(0, width - w), random.randint(title, height - h)
+        data[y:y + h, x:x + w] = random.randint(0, 256, 3)
+
+    return Image.fromarray(data)
+
+
+def frame_image(slide, seed, noise=6.0):
+    """
+    Degrades a slide image the way its recording would be: blurred by the
+    scaling, with a shifted exposure and some sensor noise.
+    """
+    random = numpy.random.RandomState(seed)
+    width, height = slide.size
+
+    frame = slide.resize((width // 2, height // 2), Image.BILINEAR)
+    frame = frame.resize((width, height), Image.BILINEAR)
+
+    data = numpy.asarray(frame, dtype=numpy.float64)
+    data = data * random.uniform(0.85, 1.05) + random.uniform(-15, 15)
+    data += random.randn(*data.shape) * noise
+
+    return Image.fromarray(data.clip(0, 255).astype(numpy.uint8))
@@ -2,6 +2,7 @@ import itertools
 import functools
 import collections
 
+import numpy
 import ImageFilter
 
 try:
@@ -86,6 +87,13 @@ class BorderCropper(object):
     Maximum width-to-height ratio the video frame must have after removing the
     border.
     """
+
+    convergence_samples = None
+    """
+    Number of successive processed images for which the computed border must
+    stay the same for the borders histogram to be considered as converged (see
+    ``converged``). Set this to ``None`` to never consider it converged.
+    """
     
     def __init__(self):
         self.borders = collections.defaultdict(lambda: 0)
@@ -106,41 +114,95 @@ class BorderCropper(object):
         other border satifies the ratio conditions.
         """
 
+        self.stable_samples = 0
+        """
+        Number of successive processed images for which the computed border
+        did not change.
+        """
+
+        self._border = None
+
     def process_side(self, pixels, size, side):
         for x, y in itercoords(side, *size):
             if sum(pixels[x, y]) > self.border_detection_threshold:
                 break
         return x, y
 
-    @optimize
+    def find_border(self, image):
+        """
+        Returns the ``(left, top, right, bottom)`` border of a single
+        (already filtered) image, or ``None`` if the image is entirely black.
+
+        The rows and columns profiles, telling whether they contain at least a
+        pixel whose color magnitude exceeds the detection threshold, are
+        computed at once on the image data; the border is delimited by the
+        first and last lines set in each profile.
+        """
+        data = numpy.asarray(image, dtype=numpy.int32)
+
+        if data.ndim == 3:
+            data = data.sum(axis=2)
+
+        bright = data > self.border_detection_threshold
+
+        rows = numpy.flatnonzero(bright.any(axis=1))
+        cols = numpy.flatnonzero(bright.any(axis=0))
+
+        if not len(rows):
+            return None
+
+        return int(cols[0]), int(rows[0]), int(cols[-1]), int(rows[-1])
+
+    def detect(self, image):
+        """
+        Returns the border of a single image (see ``find_border``), after
+        having applied the image filter to it.
+        """
+        if self.image_filter:
+            image = image.filter(self.image_filter)
+
+        return self.find_border(image)
+
     def process(self, image):
         """
         Processes a single image and adds its border to the internal mapping
         for later computing.
         """
-        if self.image_filter:
-            image = image.filter(self.image_filter)
-        
-        pixels = image.load()
-        
-        self.max_width = max(self.max_width, image.size[0])
-        self.max_height = max(self.max_height, image.size[1])
-        
-        top = self.process_side(pixels, image.size, TOP_DOWN)[1]
-        bottom = self.process_side(pixels, image.size, BOTTOM_UP)[1]
-        
-        if top > bottom:
-            return
-        
-        left = self.process_side(pixels, image.size, LTR)[0]
-        right = self.process_side(pixels, image.size, RTL)[0]
-        
-        if left > right:
-            return
-        
-        self.borders[left, top, right, bottom] += 1
+        border = self.detect(image)
+        self.add_border(border, image.size)
+        return border
+
+    def add_border(self, border, size):
+        """
+        Adds the border detected on an image of the given size to the internal
+        mapping, as done by ``process``. This allows to detect the borders
+        elsewhere (for example in another process).
+        """
+        self.max_width = max(self.max_width, size[0])
+        self.max_height = max(self.max_height, size[1])
         
-        return (left, top, right, bottom)
+        if border is not None:
+            self.borders[border] += 1
+
+        computed = self.compute_border()
+
+        if computed == self._border:
+            self.stable_samples += 1
+        else:
+            self._border = computed
+            self.stable_samples = 1
+
+    @property
+    def converged(self):
+        """
+        Whether the border computed from the processed images stayed the same
+        for ``convergence_samples`` images, meaning that processing more
+        images is not needed.
+        """
+        if self.convergence_samples is None:
+            return False
+
+        return self.stable_samples >= self.convergence_samples
     
     def compute_border(self):
         """
@@ -151,6 +213,8 @@ class BorderCropper(object):
         
         for border, _ in borders:
             left, top, right, bottom = border
+            if bottom == top:
+                continue
             ratio = float(right - left) / float(bottom - top)
             if self.min_ratio < ratio < self.max_ratio:
                 return left, top, right, bottom
@@ -0,0 +1,154 @@
+"""
+Persistent cache of the features vectors computed by the identification.
+
+The same slideshows (and sometimes the same videos) are analyzed over and over
+again. A ``FeatureCache`` stores each computed features vector in its own file,
+named after a hash of the image content and of the extraction parameters, so
+that analyzing an unchanged image again only costs the hashing.
+
+The cache lives entirely on the file system and can be shared by several
+processes (the worker processes of a ``smaclib.workers.WorkerPool`` for
+instance): entries are written atomically, reading an entry marks it as
+recently used and ``trim`` evicts the least recently used entries once the
+cache exceeds its size limit.
+"""
+
+
+import os
+import errno
+import hashlib
+import tempfile
+
+import numpy
+
+from smaclib.modules.analyzer import identification
+
+
+class FeatureCache(object):
+    """
+    A features vectors cache stored in ``directory`` and limited to ``size``
+    bytes (see ``trim``).
+    """
+
+    size = 256 * 1024 * 1024
+    """
+    Default maximum size (in bytes) of the cached vectors.
+    """
+
+    temp_prefix = '.tmp-'
+    """
+    Prefix of the files being written by ``put`` before being renamed to
+    their entry path. They are ignored by ``trim``.
+    """
+
+    def __init__(self, directory, size=None):
+        self.directory = directory
+
+        if size is not None:
+            self.size = size
+
+    @staticmethod
+    def parameters(low_quality, size=None):
+        """
+        Returns the extraction parameters the features vectors depend on: the
+        version of the extraction code, its settings, and the size in which
+        the images are fitted before the extraction if any.
+        """
+        if size is not None:
+            size = tuple(size)
+
+        return (identification.FEATURES_VERSION, identification.N,
+                identification.M, identification.t,
+                identification.GRADIENT_THRESOLD, bool(low_quality), size)
+
+    def key(self, low_quality, size, *contents):
+        """
+        Returns the key of the features vector of the image with the given
+        contents (strings or contiguous arrays) extracted with the given
+        quality setting, after having been fitted in ``size`` if not
+        ``None``.
+        """
+        digest = hashlib.sha1(repr(self.parameters(low_quality, size)))
+
+        for content in contents:
+            digest.update(content)
+
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """
+        Returns the features vector stored under ``key``, or ``None`` if the
+        cache does not contain it.
+        """
+        path = self.path(key)
+
+        try:
+            vector = numpy.fromfile(path, dtype=numpy.float64)
+            os.utime(path, None)
+        except (IOError, OSError):
+            return None
+
+        if len(vector) != identification.FEATURES_LENGTH:
+            return None
+
+        return vector.tolist()
+
+    def put(self, key, vector):
+        """
+        Stores the features vector under ``key``.
+        """
+        path = self.path(key)
+        directory = os.path.dirname(path)
+
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        fd, temp = tempfile.mkstemp(prefix=self.temp_prefix, dir=directory)
+
+        with os.fdopen(fd, 'wb') as fh:
+            numpy.asarray(vector, dtype=numpy.float64).tofile(fh)
+
+        os.rename(temp, path)
+
+    def trim(self):
+        """
+        Removes the least recently used vectors until the cache no longer
+        exceeds its size limit.
+
+        The files still being written by ``put`` (possibly by another
+        process) are left alone, as removing them would make their final
+        rename fail.
+        """
+        entries = []
+        total = 0
+
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.startswith(self.temp_prefix):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        entries.sort()
+
+        for _, size, path in entries:
+            if total <= self.size:
+                break
+
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+            total -= size
@@ -0,0 +1,158 @@
+"""
+In-memory storage for the frames kept during the analysis of a video.
+
+The frames retained by the segmentation are cropped and then analyzed, which
+used to cost a PNG compression and decompression round trip at each step. A
+``FrameStore`` keeps them decoded in memory instead, up to a given budget,
+and spills the ones exceeding it to uncompressed raw files which are read
+back through memory mapping.
+"""
+
+
+import os
+import shutil
+import tempfile
+import itertools
+import threading
+
+import numpy
+import Image
+
+
+class FrameStore(object):
+    """
+    A mapping of keys to frame images, holding the images in memory up to
+    ``memory`` bytes and spilling the exceeding ones to raw files.
+    """
+
+    memory = 256 * 1024 * 1024
+    """
+    Default memory budget (in bytes) for the images held in memory.
+    """
+
+    def __init__(self, memory=None, directory=None):
+        if memory is not None:
+            self.memory = memory
+
+        self.used = 0
+        """Amount of memory used by the images currently held in memory."""
+
+        self._directory = directory
+        self._owned = directory is None
+        self._images = {}
+        self._spilled = {}
+        self._keys = itertools.count()
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self):
+        """
+        The directory to which the images are spilled. A temporary directory
+        is created on first access if none was given.
+        """
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix='smac-', suffix='-frames')
+        return self._directory
+
+    def __len__(self):
+        return len(self._images) + len(self._spilled)
+
+    def __contains__(self, key):
+        return key in self._images or key in self._spilled
+
+    def put(self, image, key=None):
+        """
+        Stores the given image, replacing the one stored under ``key`` if
+        given, and returns the key under which it is stored.
+
+        Lazy images (such as crops or images opened from a file) are loaded
+        first, so that the stored image owns its pixels and does not keep its
+        source alive outside of the memory budget.
+        """
+        image.load()
+        size = image.size[0] * image.size[1] * len(image.getbands())
+
+        with self._lock:
+            if key is None:
+                key = next(self._keys)
+            else:
+                self._discard(key)
+
+            if self.used + size <= self.memory:
+                self._images[key] = image, size
+                self.used += size
+                return key
+
+        data = numpy.asarray(image)
+
+        fd, filename = tempfile.mkstemp(suffix='.raw', dir=self.directory)
+        with os.fdopen(fd, 'wb') as fh:
+            data.tofile(fh)
+
+        with self._lock:
+            self._spilled[key] = (filename, image.mode, data.shape)
+
+        return key
+
+    def get(self, key):
+        """
+        Returns the image stored under ``key``.
+        """
+        with self._lock:
+            try:
+                return self._images[key][0]
+            except KeyError:
+                filename, mode, shape = self._spilled[key]
+
+        data = numpy.memmap(filename, dtype=numpy.uint8, mode='r', shape=shape)
+        image = Image.fromarray(data, mode)
+        image.load()
+        del data
+
+        return image
+
+    def remove(self, key):
+        """
+        Removes the image stored under ``key``.
+        """
+        with self._lock:
+            self._discard(key)
+
+    def _discard(self, key):
+        if key in self._images:
+            self.used -= self._images.pop(key)[1]
+        elif key in self._spilled:
+            os.remove(self._spilled.pop(key)[0])
+
+    def spilled(self, key):
+        """
+        Returns the ``(filename, mode, shape)`` description of the raw file
+        to which the image stored under ``key`` was spilled, or ``None`` if
+        the image is held in memory.
+        """
+        return self._spilled.get(key)
+
+    def adopt(self, filename, mode, shape):
+        """
+        Takes ownership of a raw image file spilled by another store (for
+        example one of a worker process sharing the same directory, see
+        ``spilled``) and returns the key under which it is now stored.
+        """
+        with self._lock:
+            key = next(self._keys)
+            self._spilled[key] = (filename, mode, tuple(shape))
+
+        return key
+
+    def clear(self):
+        """
+        Removes all the stored images, and the spill directory if it was
+        created by this store.
+        """
+        with self._lock:
+            for key in self._images.keys() + self._spilled.keys():
+                self._discard(key)
+
+            if self._owned and self._directory is not None:
+                shutil.rmtree(self._directory, ignore_errors=True)
+                self._directory = None
@@ -20,27 +20,51 @@ applied by convolution on the grayscaled image.
 @type gy: C{2d-array} of C{int}
 @var gy: Matrix used to extract the vertical edges magnitudes.  Will be
 applied by convolution on the grayscaled image.
+@type FEATURES_LENGTH: C{int}
+@var FEATURES_LENGTH: Number of elements of a feature vector.
+@type FEATURES_VERSION: C{int}
+@var FEATURES_VERSION: Version of the features extraction, to be incremented
+by any change of the code altering the computed vectors so that the vectors
+cached by a previous version are not reused (see
+L{featurecache.FeatureCache}).
+@type BATCH_BYTES_PER_PIXEL: C{int}
+@var BATCH_BYTES_PER_PIXEL: Memory used by L{gen_feature_vects} for each
+pixel of a batched image.
+@type COARSE_N: C{int}
+@var COARSE_N: Number of columns of the coarse summary grid (see
+L{coarse_features}).
+@type COARSE_M: C{int}
+@var COARSE_M: Number of lines of the coarse summary grid.
+@type COARSE_LENGTH: C{int}
+@var COARSE_LENGTH: Number of elements of a coarse features vector.
 """
 __author__ = 'Jean Revertera <jean.revertera@hefr.ch>' 
 __docformat__ = 'epytext en'
 __version__ = '0.1-final'
 
 # Standards libs.
-import sys
+import collections
 
 # External libs.
 import ImageFilter
-from numpy import reshape
+import numpy
 from convolve import convolve2d
 
+from smaclib.modules.analyzer import imaging
+
 
 #full()
 t = 8
 N = 13 # 21
 M = int(round(N / 1.333333))
 GRADIENT_THRESOLD = 10
-# We have to bypass the Python default limit number of recursive call.
-sys.setrecursionlimit(2000)
+FEATURES_LENGTH = N * M * 2 + 2
+FEATURES_VERSION = 1
+# Luma matrix and both edge magnitude matrices.
+BATCH_BYTES_PER_PIXEL = 4 * 3
+COARSE_N = 4
+COARSE_M = 3
+COARSE_LENGTH = COARSE_N * COARSE_M * 2 + 2
 
 # Construct the gx and gy matrices.
 v = t/2
@@ -77,42 +101,103 @@ del l1
 del l2
 del l3
 
-def _filter_edges(hm, vm, directions, edges, index, width, height):
+def image_size(img):
+    """
+    Returns the C{(width, height)} size of the given image or image array.
+    """
+    if isinstance(img, numpy.ndarray):
+        return img.shape[1], img.shape[0]
+    return img.size
+
+def _luma_matrix(img, low_quality=False):
     """
-    Internal method used to filter edges.
+    Converts the given image to a 2D luma matrix, sharpening it beforehand if
+    it comes from a low quality source.
+
+    Image arrays (see L{imaging}) are processed without going through PIL.
+    """
+    if isinstance(img, numpy.ndarray):
+        if low_quality:
+            img = imaging.sharpen(img)
+        return imaging.luma(img).astype(numpy.int32)
+
+    # If the image is from a low-quality source, we first try to sharpen its
+    # its edges.
+    if low_quality:
+        img = img.filter(ImageFilter.SHARPEN)
+
+    # Convert to grayscale with respect to the image luminosity, by doing a
+    # Luma conversion.
+    # See: http://www.pythonware.com/library/pil/handbook/image.htm
+    img = img.convert("L")
 
-    @type hm: C{2d-array} of C{int}
+    return numpy.asarray(img, dtype=numpy.int32)
+
+def _edge_features(hm, vm):
+    """
+    Computes the feature vector from the horizontal and vertical edge
+    magnitude matrices as returned by the convolution step.
+
+    Both matrices can either be 2-D (a single image) or 3-D (a stack of
+    same-sized images, the first axis being the image index); the returned
+    array has respectively 1 or 2 dimensions.
+
+    @type hm: C{numpy.ndarray}
     @param hm: Matrix containing the horizontal edges magnitude.
-    @type vm: C{2d-array} of C{int}
+    @type vm: C{numpy.ndarray}
     @param vm: Matrix containing the vertical edges magnitude.
-    @type directions: C{2d-array} of C{bool}
-    @param directions: Matrix referencing the directions of the edges. C{True}
-    denotes a vertical edge, while C{False} denotes a horizontal edge.
-    @type edges: C{2d-array} of C{bool}
-    @param edges: Matrix referencing where are located the edges.
-    @type index: C{int}
-    @param index: the pixel linearized position which has to be tested.
-    @type width: C{int}
-    @param width: The width of image.
-    @type height: C{int}
-    @param height: The height of image.
-    """
-    # Get the edge direction.
-    dir = directions[index]
-    # Translate the index into polar coordinates.
-    x = index % width
-    y = index / width
-    # If the edge magnitude is superior to the gradient thresold:
-    if((not dir and hm[y][x] < GRADIENT_THRESOLD) or (dir and
-            vm[y][x] < GRADIENT_THRESOLD)):
-        edges[index] = False
+
+    @rtype: C{numpy.ndarray} of C{float}
+    @return: The feature vector(s) corresponding to the edge maps.
+    """
+    height, width = hm.shape[-2:]
+
+    # True means a vertical edge, and False a horizontal edge. The greather
+    # (vertical or horizontal) edge magnitude defines the edge direction.
+    directions = hm < vm
+
+    # Only keep the edges whose magnitude in their own direction reaches the
+    # gradient thresold.
+    vert = numpy.where(directions & (vm >= GRADIENT_THRESOLD), vm, 0)
+    hor = numpy.where(~directions & (hm >= GRADIENT_THRESOLD), hm, 0)
+
+    # Width and height of partitionned columns and lines. Pixels exceeding
+    # the last complete cell are ignored.
+    cell_w = width // N
+    cell_h = height // M
+
+    # Sum the edge magnitudes of each cell by reshaping the (cropped) maps to
+    # (..., M, cell_h, N, cell_w) and reducing over the in-cell axes.
+    shape = hm.shape[:-2] + (M, cell_h, N, cell_w)
+    vert = vert[..., :M * cell_h, :N * cell_w].reshape(shape)
+    hor = hor[..., :M * cell_h, :N * cell_w].reshape(shape)
+    vert_em = vert.sum(axis=-1, dtype=numpy.float64).sum(axis=-2)
+    hor_em = hor.sum(axis=-1, dtype=numpy.float64).sum(axis=-2)
+
+    # Normalize the sums by the cell area.
+    vert_em /= cell_w * cell_h
+    hor_em /= cell_w * cell_h
+
+    # Interleave the horizontal and vertical magnitudes of each cell, line by
+    # line, and append the two normalized global features.
+    cells = numpy.concatenate((hor_em[..., numpy.newaxis],
+                               vert_em[..., numpy.newaxis]), axis=-1)
+    cells = cells.reshape(hm.shape[:-2] + (M * N * 2,))
+
+    factor = 1.0 / (M * N)
+    globals_ = numpy.concatenate((
+        hor_em.sum(axis=(-2, -1))[..., numpy.newaxis] * factor,
+        vert_em.sum(axis=(-2, -1))[..., numpy.newaxis] * factor,
+    ), axis=-1)
+
+    return numpy.concatenate((cells, globals_), axis=-1)
 
 def gen_feature_vect(img, low_quality=False):
     """
-    Generate a feature vector from the image at the specified location.
+    Generate a feature vector from the given image.
 
-    @type fname: C{string}
-    @param fname: Path to the image file.
+    @type img: C{Image} or C{numpy.ndarray}
+    @param img: The image to analyze, or its RGB or luma array.
     @type low_quality: C{bool}
     @param low_quality: C{True} if the image is considered of a low quality,
     C{False} otherwise. A sharpening filter is applied on low quality
@@ -122,112 +207,88 @@ def gen_feature_vect(img, low_quality=False):
     @rtype: C{list} of C{float}
     @return: The feature vector corresponding to this image.
     """
-    # If the image is from a low-quality source, we first try to sharpen its
-    # its edges.
-    if low_quality:
-        img = img.filter(ImageFilter.SHARPEN)
+    m = _luma_matrix(img, low_quality)
 
-    # Convert to grayscale with respect to the image luminosity, by doing a
-    # Luma conversion.
-    # See: http://www.pythonware.com/library/pil/handbook/image.htm
-    img = img.convert("L")
-    width = img.size[0]
-    height = img.size[1]
-    # The image nb of pixels.
-    pixel_nb  = width * height
-    # The data structure returned by the Image module is a 1-D shape, we
-    # have to transform it to a 2D-matrix.
-    m = reshape(img.getdata(), (height, width))
     # Proceed with the convolution to extract edge magnitues.
-    hm = convolve2d(m, gx).tolist()
-    vm = convolve2d(m, gy).tolist()
-    # This boolean matrix will describe edge direction for each pixel. True
-    # means a vertical edge, and False a horizontal edge.
-    directions = [False] * pixel_nb
-    # This boolean matrix describe which pixels are considered as edge (True
-    # if it's the case, false otherwise). At the beginning, we consider that
-    # ALL pixels are potential edges.
-    edges = [True] * pixel_nb
-    # Variable representing a linarized version of polar coordinates.
-    index = 0
-
-    # We first define the edge direction for every pixel in the image.
-    for y in xrange(0, height):
-      for x in xrange(0, width):
-        index = y * width + x
-        # The greather (vertical or horizontal) edge magnitude defines the
-        # edge direction.
-        if(hm[y][x] < vm[y][x]):
-            directions[index] = True
-        continue
-
-    # Filter the edges.
-    for index in xrange(0, pixel_nb):
-        _filter_edges(hm, vm, directions, edges, index, width, height)
-
-    # Width of partitionned columns.
-    cell_w = width / N
-
-    # Height of partitionned lines.
-    cell_h = height / M
-
-    # Contains the sum of the vertical edge magnitudes from the partitionned
-    # image.
-    vert_em = []
-    # For every cell of the partitionned image:
-    for m in range(0, M):
-        # Temporary variable. Used to build each line of vert_em.
-        em_entry = []
-        for n in range(0, N):
-            # Compute the sum of the edge magnitudes.
-            total_em = 0
-            for y in xrange(m * cell_h, m * cell_h + cell_h):
-                for x in xrange(n * cell_w, n * cell_w + cell_w):
-                    index = y * width + x
-                    if(directions[index] and edges[index]):
-                        total_em += vm[y][x]
-            # Append the normalized sum to the result.
-            em_entry.append((1.0/(cell_w *  cell_h)) * total_em)
-        vert_em.append(em_entry)
-    
-    # Contains the sum of the horizontal edge magnitudes from the partitionned
-    # image.
-    hor_em = []
-    # For every cell of the partitionned image:
-    for m in range(0, M):
-        # Temporary variable. Used to build each line of hor_em.
-        em_entry = []
-        for n in range(0, N):
-            # Compute the sum of the edge magnitudes.
-            total_em = 0
-            for y in xrange(m * cell_h, m * cell_h + cell_h):                
-                for x in xrange(n * cell_w, n * cell_w + cell_w):
-                    index = y * width + x
-                    if (not directions[index]) and edges[index]:
-                        total_em += hm[y][x]
-            # Append the normalized sum to the result.
-            em_entry.append((1.0/(cell_w * cell_h)) * total_em)
-        hor_em.append(em_entry)
-
-    # The feature vector of the image.
-    F = []
-    # The two global feature (the sum of all edge magnitudes).
-    vert_gm = 0
-    hor_gm = 0
-    for m in range(0, M):    
-        for n in range(0, N):
-            hm = hor_em[m][n]
-            vm = vert_em[m][n]
-            vert_gm += vm
-            hor_gm += hm
-            F.append(hm)
-            F.append(vm)
-    factor = 1.0/(M*N)
-    # Normalize the global features and add them to the vector.
-    F.append(hor_gm * factor)
-    F.append(vert_gm * factor)
-    # Return the feature vector.
-    return F
+    hm = numpy.asarray(convolve2d(m, gx))
+    vm = numpy.asarray(convolve2d(m, gy))
+
+    return _edge_features(hm, vm).tolist()
+
+def gen_feature_vects(images, low_quality=False):
+    """
+    Generate the feature vectors of a whole set of images in a single batched
+    pass.
+
+    Images of the same size are stacked together and their edge maps are
+    reduced at once, which saves most of the per-image overhead of
+    L{gen_feature_vect}. The caller is responsible of limiting the number of
+    images passed at once (see L{batch_memory}).
+
+    @type images: C{iterable} of C{Image} or C{numpy.ndarray}
+    @param images: The images (or image arrays) to analyze.
+    @type low_quality: C{bool}
+    @param low_quality: C{True} if the images are considered of a low quality,
+    C{False} otherwise. See L{gen_feature_vect}.
+
+    @rtype: C{2d-array} of C{float}
+    @return: A matrix containing the feature vector of the n-th image as its
+    n-th row.
+    """
+    images = list(images)
+    result = numpy.empty((len(images), FEATURES_LENGTH), dtype=numpy.float64)
+
+    # Group the images indexes by size.
+    groups = collections.defaultdict(list)
+    for index, img in enumerate(images):
+        groups[image_size(img)].append(index)
+
+    for (width, height), indexes in groups.iteritems():
+        hm = numpy.empty((len(indexes), height, width), dtype=numpy.float32)
+        vm = numpy.empty((len(indexes), height, width), dtype=numpy.float32)
+
+        for i, index in enumerate(indexes):
+            m = _luma_matrix(images[index], low_quality)
+            hm[i] = convolve2d(m, gx)
+            vm[i] = convolve2d(m, gy)
+
+        result[indexes] = _edge_features(hm, vm)
+
+    return result
+
+def batch_memory(size):
+    """
+    Returns the approximate amount of memory, in bytes, needed by
+    L{gen_feature_vects} to process an image of the given C{(width, height)}
+    size.
+    """
+    return size[0] * size[1] * BATCH_BYTES_PER_PIXEL
+
+def iterbatches(items, memory, size):
+    """
+    Splits the C{items} iterable in lists whose images can be processed by
+    L{gen_feature_vects} without exceeding C{memory} bytes. The C{size}
+    callable shall return the C{(width, height)} size of the image of a given
+    item.
+
+    A batch always contains at least one item, even if it alone exceeds the
+    memory limit. All the items are put in a single batch if C{memory} is
+    C{None}.
+    """
+    batch, used = [], 0
+
+    for item in items:
+        needed = batch_memory(size(item))
+
+        if batch and memory is not None and used + needed > memory:
+            yield batch
+            batch, used = [], 0
+
+        batch.append(item)
+        used += needed
+
+    if batch:
+        yield batch
 
 def get_diff_score(f1, f2):
     """
@@ -246,3 +307,227 @@ def get_diff_score(f1, f2):
     for j in range(0, len(f1)):
         diff += (f1[j]-f2[j])**2
     return diff
+
+def get_diff_matrix(f1, f2):
+    """
+    Return the difference scores between each pair of features vectors of the
+    two given sets, as L{get_diff_score} would compute them.
+
+    The squared differences are accumulated one feature at a time over the
+    whole matrix, in the same order as L{get_diff_score} does, so that the
+    results are exactly the same.
+
+    @type f1: C{2d-array} of C{float}
+    @param f1: Features vectors of the first set of images, one per row.
+    @type f2: C{2d-array} of C{float}
+    @param f2: Features vectors of the second set of images, one per row.
+
+    @rtype: C{2d-array} of C{float}
+    @return: The difference score between the i-th vector of C{f1} and the
+    j-th vector of C{f2} at position C{(i, j)}.
+    """
+    f1 = numpy.asarray(f1, dtype=numpy.float64)
+    f2 = numpy.asarray(f2, dtype=numpy.float64)
+
+    diff = numpy.zeros((len(f1), len(f2)), dtype=numpy.float64)
+    buf = numpy.empty_like(diff)
+
+    for j in xrange(f1.shape[1]):
+        numpy.subtract(f1[:, j, numpy.newaxis], f2[numpy.newaxis, :, j], buf)
+        # Use pow() as the ** operator does: x * x may round differently.
+        numpy.power(buf, 2.0, buf)
+        diff += buf
+
+    return diff
+
+def _coarse_matrix():
+    """
+    Builds the matrix projecting a features vector onto its coarse summary
+    (see L{coarse_features}).
+    """
+    matrix = numpy.zeros((N * M * 2 + 2, COARSE_LENGTH), dtype=numpy.float64)
+
+    rows = numpy.array_split(numpy.arange(M), COARSE_M)
+    cols = numpy.array_split(numpy.arange(N), COARSE_N)
+
+    for i, lines in enumerate(rows):
+        for j, columns in enumerate(cols):
+            weight = 1.0 / numpy.sqrt(len(lines) * len(columns))
+            coarse = (i * COARSE_N + j) * 2
+            for m in lines:
+                for n in columns:
+                    cell = (m * N + n) * 2
+                    # Horizontal and vertical magnitudes
+                    matrix[cell, coarse] = weight
+                    matrix[cell + 1, coarse + 1] = weight
+
+    # The global features are kept as they are.
+    matrix[-2, -2] = matrix[-1, -1] = 1.0
+
+    return matrix
+
+def coarse_features(f):
+    """
+    Returns the coarse summary of the given features vectors: the edge
+    magnitudes of the L{N}xL{M} grid cells are pooled into a
+    L{COARSE_N}xL{COARSE_M} grid, and the two global features are kept.
+
+    The magnitudes of each pooled cell are summed and scaled by the inverse
+    square root of their count, so that the (squared L2) distance between two
+    coarse vectors never exceeds the distance between the full ones.
+
+    @type f: C{2d-array} of C{float}
+    @param f: Features vectors, one per row.
+
+    @rtype: C{2d-array} of C{float}
+    @return: The coarse vector of the n-th features vector as its n-th row.
+    """
+    return numpy.dot(numpy.asarray(f, dtype=numpy.float64), _coarse_matrix())
+
+def get_refined_diff_matrix(f1, f2, k):
+    """
+    Return the difference scores between each vector of C{f1} and its C{k}
+    nearest vectors of C{f2} according to their coarse summaries (see
+    L{coarse_features}), all other scores being infinite.
+
+    Only the coarse distances are computed between all the pairs, which saves
+    most of the work of L{get_diff_matrix} when C{f2} is much larger than
+    C{k}. The computed scores are exactly the ones L{get_diff_matrix} would
+    return.
+
+    @type f1: C{2d-array} of C{float}
+    @param f1: Features vectors of the first set of images, one per row.
+    @type f2: C{2d-array} of C{float}
+    @param f2: Features vectors of the second set of images, one per row.
+    @type k: C{int}
+    @param k: Number of candidates of C{f2} to refine for each vector of
+    C{f1}; all the pairs are computed if C{None}.
+
+    @rtype: C{2d-array} of C{float}
+    @return: The difference score between the i-th vector of C{f1} and the
+    j-th vector of C{f2} at position C{(i, j)}, or C{inf}.
+    """
+    f1 = numpy.asarray(f1, dtype=numpy.float64)
+    f2 = numpy.asarray(f2, dtype=numpy.float64)
+
+    if k is None or k >= len(f2) or not len(f1):
+        return get_diff_matrix(f1, f2)
+
+    coarse = get_diff_matrix(coarse_features(f1), coarse_features(f2))
+    indexes = numpy.argpartition(coarse, k - 1, axis=1)[:, :k]
+    del coarse
+
+    diff = numpy.zeros(indexes.shape, dtype=numpy.float64)
+    buf = numpy.empty_like(diff)
+
+    # Same operations, in the same order, as get_diff_matrix.
+    for j in xrange(f1.shape[1]):
+        numpy.subtract(f1[:, j, numpy.newaxis], f2[:, j][indexes], buf)
+        numpy.power(buf, 2.0, buf)
+        diff += buf
+
+    result = numpy.empty((len(f1), len(f2)), dtype=numpy.float64)
+    result.fill(numpy.inf)
+    result[numpy.arange(len(f1))[:, numpy.newaxis], indexes] = diff
+
+    return result
+
+def _diff_row(f, f2):
+    """
+    Return the difference scores between the features vector C{f} and each
+    vector of C{f2}, exactly as L{get_diff_matrix} would compute them: the
+    cumulative sum adds the squared differences one feature at a time, in the
+    same order.
+    """
+    buf = f - f2
+    numpy.power(buf, 2.0, buf)
+    return numpy.cumsum(buf, axis=1)[:, -1]
+
+def get_banded_diff_matrix(f1, timestamps, f2, width, min_confidence):
+    """
+    Return the difference scores between each vector of C{f1} and the vectors
+    of C{f2} lying in a band around its expected position, all other scores
+    being infinite.
+
+    The vectors of C{f1} are frames taken at the given C{timestamps}, in
+    order, and the ones of C{f2} are the slides, in the order they were
+    presented. The expected position of a frame is the slide of the previous
+    confident match, moved forward at the average pace of the lecture for the
+    time elapsed since then. The band spans C{width} slides on each side of
+    the expected position and is doubled until the confidence of the best
+    match inside it reaches C{min_confidence}, with the best match not lying
+    on one of its edges, or until it spans all the slides.
+
+    The computed scores are exactly the ones L{get_diff_matrix} would return.
+
+    @type f1: C{2d-array} of C{float}
+    @param f1: Features vectors of the frames, one per row.
+    @type timestamps: C{list} of C{float}
+    @param timestamps: Timestamps of the frames, in seconds.
+    @type f2: C{2d-array} of C{float}
+    @param f2: Features vectors of the slides, one per row.
+    @type width: C{int}
+    @param width: Initial number of slides on each side of the expected
+    position whose score is computed.
+    @type min_confidence: C{float}
+    @param min_confidence: Confidence, as defined by
+    C{alignment.Sequence.confidence}, from which a match is trusted.
+
+    @rtype: C{2d-array} of C{float}
+    @return: The difference score between the i-th vector of C{f1} and the
+    j-th vector of C{f2} at position C{(i, j)}, or C{inf}.
+    """
+    f1 = numpy.asarray(f1, dtype=numpy.float64)
+    f2 = numpy.asarray(f2, dtype=numpy.float64)
+    count = len(f2)
+    width = max(1, width)
+
+    if not len(f1) or 2 * width + 1 >= count:
+        return get_diff_matrix(f1, f2)
+
+    result = numpy.empty((len(f1), count), dtype=numpy.float64)
+    result.fill(numpy.inf)
+
+    # Average number of slides shown per second
+    duration = timestamps[-1] - timestamps[0]
+    pace = float(count) / duration if duration > 0 else 0.0
+    anchor, anchor_time = 0, timestamps[0]
+
+    for i in xrange(len(f1)):
+        expected = anchor + pace * (timestamps[i] - anchor_time)
+        expected = min(int(round(expected)), count - 1)
+        row = result[i]
+        start = stop = expected
+        half = width
+
+        while True:
+            low = max(0, expected - half)
+            high = min(count, expected + half + 1)
+
+            # Only the slides entering the band are compared
+            for a, b in ((low, start), (stop, high)):
+                if a < b:
+                    row[a:b] = _diff_row(f1[i], f2[a:b])
+            start, stop = low, high
+
+            band = row[low:high]
+            order = numpy.argsort(band, kind='mergesort')[:2]
+            best, second_best = band[order[0]], band[order[1]]
+            confidence = (second_best - best) / best if best else numpy.inf
+            position = low + order[0]
+
+            if low == 0 and high == count:
+                break
+
+            inside = (low == 0 or position > low) and \
+                     (high == count or position < high - 1)
+
+            if inside and confidence >= min_confidence:
+                break
+
+            half *= 2
+
+        if confidence >= min_confidence:
+            anchor, anchor_time = position, timestamps[i]
+
+    return result
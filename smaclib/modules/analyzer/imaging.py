@@ -0,0 +1,231 @@
+"""
+NumPy counterparts of the PIL operations applied to video frames.
+
+The frames are decoded to arrays (see ``segmentation.VideoReader``), which the
+segmentation and the features extraction process directly instead of wrapping
+each of them in a PIL image. The functions of this module compute the same
+pixel values as the PIL operations they replace, up to the rounding of the
+area averaging done by ``area_resize``.
+
+Color images are ``(height, width, 3)`` arrays of RGB bytes, grayscale images
+are ``(height, width)`` arrays.
+"""
+
+
+import itertools
+
+import numpy
+
+
+def crop(data, box):
+    """
+    Returns a view over the ``(left, top, right, bottom)`` box of the given
+    image, right and bottom excluded as for ``Image.crop``. The whole image
+    is returned if ``box`` is ``None``.
+    """
+    if box is None:
+        return data
+
+    left, top, right, bottom = box
+    return data[top:bottom, left:right]
+
+
+def luma(data):
+    """
+    Returns the luma of the given RGB image, as ``Image.convert('L')`` does.
+    Grayscale images are returned unchanged.
+    """
+    if data.ndim == 2:
+        return data
+
+    data = data.astype(numpy.int32)
+    result = data[..., 0] * 19595
+    result += data[..., 1] * 38470
+    result += data[..., 2] * 7471
+    result >>= 16
+
+    return result.astype(numpy.uint8)
+
+
+def sharpen(data):
+    """
+    Returns the given image filtered as by ``ImageFilter.SHARPEN``: the one
+    pixel wide border is left as is.
+    """
+    data = numpy.asarray(data)
+    source = data.astype(numpy.int32)
+    inner = source[1:-1, 1:-1]
+
+    neighbours = numpy.zeros_like(inner)
+    for rows in (slice(None, -2), slice(1, -1), slice(2, None)):
+        for columns in (slice(None, -2), slice(1, -1), slice(2, None)):
+            neighbours += source[rows, columns]
+    neighbours -= inner
+
+    # (32 * center - 2 * neighbours) / 16, rounded and clipped to a byte
+    total = inner * 32 - neighbours * 2
+    numpy.clip(total, 0, None, total)
+    total += 8
+    total >>= 4
+    numpy.clip(total, 0, 255, total)
+
+    result = data.copy()
+    result[1:-1, 1:-1] = total
+
+    return result
+
+
+def vertical_blur(data, size=5, out=None, work=None):
+    """
+    Returns the given image filtered by a vertical box of ``size`` rows, as
+    by a ``size``x``size`` ``ImageFilter.Kernel`` whose middle column only is
+    set: the ``size // 2`` pixels wide border is left as is.
+
+    The result is written to ``out`` if given, which must have the shape of
+    the image and cannot be the image itself. The sums are accumulated in
+    ``work`` if given, an int32 array of the shape of the image without its
+    border.
+    """
+    border = size // 2
+    height, width = data.shape[:2]
+
+    if out is None:
+        out = numpy.empty_like(data)
+
+    if height <= 2 * border or width <= 2 * border:
+        out[...] = data
+        return out
+
+    rows = height - 2 * border
+    source = data[:, border:width - border]
+
+    if work is None:
+        work = numpy.empty(source[:rows].shape, dtype=numpy.int32)
+
+    work[...] = source[:rows]
+    for row in xrange(1, size):
+        work += source[row:rows + row]
+
+    # Round half up, as PIL does
+    work *= 2
+    work += size
+    work //= 2 * size
+
+    out[border:height - border, border:width - border] = work
+
+    if border:
+        out[:border] = data[:border]
+        out[-border:] = data[-border:]
+        out[:, :border] = data[:, :border]
+        out[:, -border:] = data[:, -border:]
+
+    return out
+
+
+def area_resize(data, size):
+    """
+    Returns the given image downscaled to ``size`` ``(width, height)`` by
+    averaging the pixels falling in each target pixel, as float32 values.
+    """
+    width, height = size
+    rows = numpy.arange(height) * data.shape[0] // height
+    columns = numpy.arange(width) * data.shape[1] // width
+
+    total = numpy.add.reduceat(data.astype(numpy.float32), rows, axis=0)
+    total = numpy.add.reduceat(total, columns, axis=1)
+
+    counts = numpy.diff(numpy.append(rows, data.shape[0]))[:, numpy.newaxis]
+    counts = counts * numpy.diff(numpy.append(columns, data.shape[1]))
+
+    if total.ndim == 3:
+        counts = counts[..., numpy.newaxis]
+
+    total /= counts
+
+    return total
+
+
+def difference(data_a, data_b, out=None):
+    """
+    Returns the sum over the channels of the variance of the absolute
+    difference between the two given images, as the sum of the ``var``
+    attribute of an ``ImageStat.Stat`` over an ``ImageChops.difference``.
+
+    The difference is computed in ``out`` if given, a float32 array of the
+    shape of the images.
+    """
+    diff = numpy.subtract(data_a, data_b, out, dtype=numpy.float32)
+    numpy.absolute(diff, diff)
+
+    height = diff.shape[0]
+    channels = diff.shape[2] if diff.ndim == 3 else 1
+    rows = diff.reshape(height, -1)
+    count = float(rows.size // channels)
+
+    # Summing the rows first keeps the reductions contiguous. The sums of
+    # the byte differences of a column are exact in single precision.
+    total = rows.sum(axis=0).reshape(-1, channels)
+    mean = total.sum(axis=0, dtype=numpy.float64) / count
+
+    numpy.square(diff, diff)
+    squares = rows.sum(axis=0, dtype=numpy.float64).reshape(-1, channels)
+    squares = squares.sum(axis=0) / count
+
+    # Same formula as ImageStat: mean of the squares minus the squared mean
+    return float((squares - mean * mean).sum())
+
+
+def signature(data, size=(16, 12)):
+    """
+    Returns a perceptual signature of the given image: its luma downscaled to
+    ``size``, normalized to a zero mean and a unit standard deviation so that
+    exposure changes do not alter it.
+
+    Unlike bit hashes comparing neighbouring cells, which flip at random on
+    the flat backgrounds of slides, signatures of two frames showing the same
+    slide stay close (see ``signature_distance``) while a single added text
+    line sets them apart.
+    """
+    grid = area_resize(luma(data), size)
+    grid -= grid.mean()
+
+    deviation = grid.std()
+    if deviation:
+        grid /= deviation
+
+    return grid
+
+
+def signature_distance(signature_a, signature_b):
+    """
+    Returns the largest difference between the cells of the two given
+    signatures.
+    """
+    return float(numpy.absolute(signature_a - signature_b).max())
+
+
+def signature_key(signature, distance):
+    """
+    Returns the key of the bucket of the given signature for a search of the
+    signatures within ``distance`` of it (see ``signature_neighbours``): the
+    means of three of its quadrants, quantized by steps of ``distance``.
+    """
+    height, width = signature.shape
+    top, bottom = signature[:height // 2], signature[height // 2:]
+
+    means = (top[:, :width // 2].mean(), top[:, width // 2:].mean(),
+             bottom[:, :width // 2].mean())
+
+    return tuple(int(numpy.floor(mean / distance)) for mean in means)
+
+
+def signature_neighbours(key):
+    """
+    Returns the keys of the buckets which may hold the signatures within the
+    distance of the signatures of the bucket ``key`` (see ``signature_key``).
+
+    The mean of a quadrant of two signatures differs by no more than their
+    distance, thus their quantized means differ by one step at most.
+    """
+    return [tuple(k + offset for k, offset in itertools.izip(key, offsets))
+            for offsets in itertools.product((-1, 0, 1), repeat=len(key))]
@@ -25,6 +25,7 @@ import os
 import tempfile
 import tarfile
 import blist
+import numpy
 import cStringIO as StringIO
 
 from lxml import etree
@@ -33,7 +34,13 @@ from smaclib.modules.base import Module
 from smaclib.modules.analyzer import tasks as analyzer_tasks
 from smaclib.modules import tasks as common_tasks
 from smaclib.modules.analyzer import segmentation
+from smaclib.modules.analyzer.segmentation import features_fromxml
 from smaclib.modules.analyzer import alignment
+from smaclib.modules.analyzer import identification
+from smaclib.modules.analyzer import framestore
+from smaclib.modules.analyzer import featurecache
+from smaclib.modules.analyzer import slideindex
+from smaclib.conf import settings
 from smaclib import tasks
 
 from twisted.internet import defer
@@ -44,6 +51,18 @@ from twisted.python import filepath
 from zope.interface import implements
 
 
+def feature_cache():
+    """
+    Returns the features vectors cache configured in the settings, or ``None``
+    if the cache is disabled.
+    """
+    if settings.feature_cache_root is None:
+        return None
+
+    return featurecache.FeatureCache(settings.feature_cache_root.path,
+                                     settings.feature_cache_size)
+
+
 class SlideAnalysisDelegate(object):
 
     implements(tasks.ITaskRunner)
@@ -54,7 +73,7 @@ class SlideAnalysisDelegate(object):
         self.runners = {
             'download': common_tasks.FileDownloadTask(slides_url),
             'extract': tasks.DeferredRunner("Slideshow bundle extraction", self._extract),
-            'analyze': analyzer_tasks.SlideAnalysisTask(),
+            'analyze': analyzer_tasks.SlideAnalysisTask(cache=feature_cache()),
             'encode': tasks.DeferredRunner("Analysis results encoding", self._serialize),
             'upload': analyzer_tasks.FileUploadTask(destination=upload_url)
         }
@@ -105,6 +124,7 @@ class SlideAnalysisDelegate(object):
 
         runner = self.runners['analyze']
         runner.slides = slides
+        runner.analysis_size = settings.slide_analysis_size
         return runner.getTask()()
 
     def serialize(self, slides):
@@ -162,12 +182,13 @@ class VideoAnalysisDelegate(object):
 
     def __init__(self, video_url, upload_url):
         self.video_url = video_url
+        self.store = framestore.FrameStore()
 
         self.runners = {
             'download': analyzer_tasks.FileDownloadTask(video_url),
-            'segment': analyzer_tasks.VideoSegmentationTask(),
+            'segment': analyzer_tasks.VideoSegmentationTask(store=self.store),
             'crop': analyzer_tasks.VideoCroppingTask(),
-            'analyze': analyzer_tasks.FrameAnalysisTask(),
+            'analyze': analyzer_tasks.FrameAnalysisTask(cache=feature_cache()),
             'encode': tasks.DeferredRunner("Analysis results encoding", self._serialize),
             'upload': analyzer_tasks.FileUploadTask(destination=upload_url)
         }
@@ -184,9 +205,14 @@ class VideoAnalysisDelegate(object):
         d.addCallback(self.save_details)
         d.addCallback(self.crop)
         d.addCallback(self.analyze)
+        d.addBoth(self.cleanup)
         d.addCallback(self.serialize)
         d.addCallback(self.upload)
 
+    def cleanup(self, result):
+        self.store.clear()
+        return result
+
     def save_details(self, res):
         sequences, self.duration, self.framerate, self.framescount = res
         return sequences
@@ -216,6 +242,7 @@ class VideoAnalysisDelegate(object):
     def crop(self, sequences):
         runner = self.runners['crop']
         runner.sequences = sequences
+        runner.convergence_samples = settings.crop_convergence_samples
         return runner.getTask()()
 
     def analyze(self, sequences):
@@ -291,38 +318,46 @@ class IdentificationDelegate(object):
 
         slides = blist.sortedset()
         for slide in metadata.xpath('slide'):
-            features = slide.xpath('features/text()')[0].split(' ')
-            features = [float(i) for i in features]
+            features = features_fromxml(slide.find('features'))
 
             path = slide.get('imagepath')
             num = int(slide.get('id'))
             slides.add(alignment.Slide(num, features, path))
 
+        # Index the slideshow, or reuse its index if recently aligned
+        features = [slide.features for slide in slides]
+        index = yield threads.deferToThread(slideindex.get_index, features)
+
         # Parse the video segmentation
         segmentation_temp = yield segmentation
         segmentation = etree.parse(segmentation_temp)
 
         framerate = float(segmentation.getroot().get('framerate'))
 
-        sequences = blist.sortedset()
-        for sequence in segmentation.xpath('sequence'):
-            features = sequence.xpath('features/text()')[0].split(' ')
-            features = [float(i) for i in features]
+        nodes = segmentation.xpath('sequence')
 
-            first = int(sequence.xpath('first-frame/@number')[0])
-            first = alignment.Frame(first, framerate=framerate)
+        # The features vectors are decoded straight into the rows of a single
+        # matrix, which the frames of the sequences are views over.
+        features = numpy.empty((len(nodes), identification.FEATURES_LENGTH))
 
-            last = int(sequence.xpath('last-frame/@number')[0])
-            last = alignment.Frame(last, features, framerate=framerate)
+        firsts, lasts, unstable = [], [], []
+        for row, sequence in enumerate(nodes):
+            features[row] = features_fromxml(sequence.find('features'))
+            firsts.append(int(sequence.xpath('first-frame/@number')[0]))
+            lasts.append(int(sequence.xpath('last-frame/@number')[0]))
+            unstable.append(not int(sequence.get('stable')))
 
-            isunstable = not int(sequence.get('stable'))
-
-            sequences.add(alignment.Sequence(first, last, unstable=isunstable))
+        sequences = alignment.sequences_fromtables(
+            alignment.FrameTable(firsts, framerate=framerate),
+            alignment.FrameTable(lasts, features, framerate),
+            unstable
+        )
 
         # Start identification task
         ident = self.runners['identify']
         ident.slides = slides
         ident.segmentation = sequences
+        ident.index = index
         matches = yield ident.getTask()()
         
         # Serialize results
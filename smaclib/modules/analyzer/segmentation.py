@@ -1,28 +1,75 @@
 import os
 import sys
+import time
+import base64
 import cPickle as pickle
 from collections import namedtuple
 
 import pyffmpeg
 from lxml import etree
+import numpy
 import Image
-import ImageFilter
-import ImageChops
-import ImageStat
 
 from smaclib.modules.analyzer import identification
+from smaclib.modules.analyzer import imaging
+from smaclib.modules.analyzer import cropping
 
 
 # pylint: disable=W0105,C0103
 
 
+FEATURES_ENCODING = 'base64-float32le'
+"""
+Encoding of the features vectors written to the XML outputs: the vector
+components as little-endian 32 bits floats, base64 encoded. Elements without
+an ``encoding`` attribute hold the legacy space separated text format.
+"""
+
+
+def features_toxml(parent, vector):
+    """
+    Appends a ``features`` element holding the given features vector, encoded
+    as described by ``FEATURES_ENCODING``, to the ``parent`` element.
+    """
+    data = numpy.asarray(vector, dtype='<f4')
+
+    features = etree.SubElement(parent, "features")
+    features.set("encoding", FEATURES_ENCODING)
+    features.set("length", str(len(data)))
+    features.text = base64.b64encode(data.tostring())
+
+    return features
+
+
+def features_fromxml(features):
+    """
+    Decodes the features vector held by a ``features`` element, in either the
+    current or the legacy text format, and returns it as an array.
+    """
+    encoding = features.get("encoding")
+    text = features.text or ''
+
+    if encoding is None:
+        return numpy.array(text.split(), dtype=numpy.float64)
+
+    if encoding != FEATURES_ENCODING:
+        raise ValueError("Unsupported features encoding: {0}".format(encoding))
+
+    data = numpy.frombuffer(base64.b64decode(text), dtype='<f4')
+
+    if len(data) != int(features.get("length", len(data))):
+        raise ValueError("Truncated features vector")
+
+    return data.astype(numpy.float64)
+
+
 def difference(img_a, img_b):
     """
-    Calculates the difference between two images, defined as the sum of the
-    variance of each color channel contained by the image resulting from their
-    subtraction.
+    Calculates the difference between two image arrays, defined as the sum of
+    the variance of each color channel contained by the image resulting from
+    their subtraction.
     """
-    return sum(ImageStat.Stat(ImageChops.difference(img_a, img_b)).var)
+    return imaging.difference(img_a, img_b)
 
 
 class Sequence(object):
@@ -54,8 +101,7 @@ class Sequence(object):
         frame.set("number", str(self.last_frame.number))
         frame.set("timestamp", str(self.last_frame.timestamp))
         
-        features = etree.SubElement(seq, "features")
-        features.text = " ".join([str(f) for f in self.features])
+        features_toxml(seq, self.features)
         
         return seq
 
@@ -72,21 +118,46 @@ class Sequence(object):
 
 
 class Slide(object):
+
+    analysis_size = None
+    """
+    Size in which the slide images are fitted before extracting their
+    features vectors (see ``load_slide``), or ``None`` to analyze the slides
+    at their full size. The edge magnitudes depend on the scale of the image,
+    so a size close to the one of the cropped video frames the slides are
+    compared with, such as ``(640, 480)``, makes them more comparable; the
+    vectors then differ from the ones of the slides analyzed at full size.
+    """
+
+    analysis_directory = 'analysis'
+    """
+    Name of the directory, next to the slide images, holding their analysis
+    copies: the same images already downscaled by the archiver rasterizer.
+    """
+
     def __init__(self, slide_id, image_file):
         self.id = slide_id
         self.image_file = image_file
         self.displayed = True
         self._features = []
 
+    @property
+    def image(self):
+        return Image.open(self.image_file)
+
     @property
     def features(self):
         if not self._features:
-            img = Image.open(self.image_file)
+            img = load_slide(self.image_file, self.analysis_size)
             self._features = identification.gen_feature_vect(img, low_quality=False)
             del img
 
         return self._features
 
+    @features.setter
+    def features(self, features):
+        self._features = features
+
     def __cmp__(self, other):
         return self.id.__cmp__(other.id)
 
@@ -96,22 +167,107 @@ class Slide(object):
         slide.set("id", str(self.id))
         slide.set("imagepath", self.image_file)
 
-        features = etree.SubElement(slide, "features")
-        features.text = " ".join([str(f) for f in self.features])
+        features_toxml(slide, self.features)
 
         return slide
 
 
+def analysis_copy(filename):
+    """
+    Returns the path of the analysis copy of the given slide image file (see
+    ``Slide.analysis_directory``).
+    """
+    directory, basename = os.path.split(filename)
+    return os.path.join(directory, Slide.analysis_directory, basename)
+
+
+def load_slide(filename, size=None):
+    """
+    Opens the given slide image file fitted in ``size``, or at its full size
+    if ``size`` is ``None``.
+
+    The analysis copy of the slide (see ``analysis_copy``) is decoded instead
+    of the full image if it exists and is at least as large as needed. JPEG
+    images are directly decoded at a reduced scale (see ``Image.draft``).
+
+    The copies are downscaled by the archiver with a different filter than
+    ``Image.ANTIALIAS``, the pixels, and thus the features vectors, depend on
+    whether a copy was decoded.
+    """
+    img = Image.open(filename)
+
+    if size is None:
+        return img
+
+    width, height = img.size
+    scale = min(1.0, float(size[0]) / width, float(size[1]) / height)
+    target = max(1, int(width * scale)), max(1, int(height * scale))
+
+    try:
+        copy = Image.open(analysis_copy(filename))
+    except IOError:
+        pass
+    else:
+        if copy.size[0] >= target[0] and copy.size[1] >= target[1]:
+            img = copy
+
+    if img.size == target:
+        return img
+
+    img.draft(img.mode, target)
+
+    # Resampling palette images would pick the nearest pixels only
+    if img.mode not in ('L', 'RGB', 'RGBA'):
+        img = img.convert('RGB')
+
+    return img.resize(target, Image.ANTIALIAS)
+
+
 class Frame(namedtuple('Frame', 'number timestamp image')):
     """
     Named tuple to hold frame objects with an image, a number and a timestamp
     attribute.
+
+    The image of a frame can be kept in a ``FrameStore`` (see ``keep``) or
+    saved to an image file (see ``save``), in order to be closed and reloaded
+    when needed.
+
+    Frames read from a video hold their pixels as an array (see ``data``)
+    which is a view over the buffer of the decoder, and is thus overwritten
+    when the next frame is decoded. Call ``retain`` on the frames which must
+    survive the next decode.
     """
     def __init__(self, number, timestamp, image):
         self._number = number
         self._timestamp = timestamp
         self._image = image
+        self._data = None
+        self._shared = False
         self._filename = None
+        self._store = None
+        self._key = None
+
+    @classmethod
+    def fromarray(cls, number, timestamp, data, shared=False):
+        """
+        Creates a frame whose pixels are held by the ``data`` array. Set
+        ``shared`` if the array is a view over a buffer which is going to be
+        reused (see ``retain``).
+        """
+        frame = cls(number, timestamp, None)
+        frame._data = data
+        frame._shared = shared
+        return frame
+
+    @classmethod
+    def fromstore(cls, number, timestamp, store, key):
+        """
+        Creates a closed frame whose image is held by ``store`` under ``key``.
+        """
+        frame = cls(number, timestamp, None)
+        frame._store = store
+        frame._key = key
+        return frame
     
     @property
     def number(self):
@@ -120,30 +276,95 @@ class Frame(namedtuple('Frame', 'number timestamp image')):
     @property
     def timestamp(self):
         return self._timestamp
+
+    @property
+    def store(self):
+        return self._store
+
+    @property
+    def key(self):
+        return self._key
     
+    @property
+    def shared(self):
+        """
+        Whether the pixels of this frame are still held by the buffer of the
+        decoder, see ``retain``.
+        """
+        return self._shared
+
     @property
     def image(self):
         if self._image is None:
-            self._image = Image.open(self._filename)
+            if self._data is not None:
+                self._image = Image.fromarray(self.retain()._data)
+            elif self._store is not None:
+                self._image = self._store.get(self._key)
+            else:
+                self._image = Image.open(self._filename)
         return self._image
 
-    @property
-    def features(self):
-        return identification.gen_feature_vect(self.image, low_quality=True)
-
     @image.setter
     def image(self, image):
         self._image = image
+        self._data = None
+        self._shared = False
+
+    @property
+    def data(self):
+        """
+        The pixels of this frame, as an RGB (or luma) array.
+        """
+        if self._data is None:
+            self._data = numpy.asarray(self.image)
+        return self._data
+
+    @property
+    def features(self):
+        return identification.gen_feature_vect(self.data, low_quality=True)
+
+    def retain(self):
+        """
+        Copies the pixels of this frame out of the buffer of the decoder, if
+        still held by it, so that the frame survives the decoding of the next
+        ones. Returns the frame itself.
+        """
+        if self._shared:
+            self._data = self._data.copy()
+            self._shared = False
+        return self
     
     def delete(self):
+        if self._store is not None:
+            self._store.remove(self._key)
+            self._store = self._key = None
+
         if self._filename is None:
             return
         
         os.remove(self._filename)
 
     def close(self):
-        assert self._filename is not None, "Save the frame before closing it."
+        assert self._filename is not None or self._store is not None, \
+               "Save or keep the frame before closing it."
         self._image = None
+        self._data = None
+        self._shared = False
+
+    def keep(self, store=None, close=True):
+        """
+        Puts the frame image in the given ``FrameStore``, or updates it in the
+        store already holding it if ``store`` is omitted.
+        """
+        if store is not None and store is not self._store:
+            self._store, self._key = store, None
+
+        assert self._store is not None, "You have to provide a store."
+
+        self._key = self._store.put(self.image, self._key)
+
+        if close:
+            self.close()
 
     def save(self, filename=None, close=True, *args, **kwargs):
         """
@@ -162,13 +383,31 @@ class Frame(namedtuple('Frame', 'number timestamp image')):
 
 class VideoReader(object):
 
-    def __init__(self, video_path):
+    mode = 'RGB'
+    """
+    Pixel format of the decoded frames: either ``'RGB'`` or ``'L'`` (luma
+    only).
+    """
+
+    track_modes = {
+        'RGB': pyffmpeg.TS_VIDEO_RGB24,
+        'L': pyffmpeg.TS_VIDEO_GRAY8,
+    }
+    """
+    Pyffmpeg track selections for each of the supported pixel formats. They
+    decode the frames to arrays sharing the buffer of the decoder.
+    """
+
+    def __init__(self, video_path, mode=None):
         self.filename = video_path
 
+        if mode is not None:
+            self.mode = mode
+
         self.reader = pyffmpeg.FFMpegReader()
         """The reader for the given video file."""
 
-        self.reader.open(video_path, pyffmpeg.TS_VIDEO_PIL)
+        self.reader.open(video_path, self.track_modes[self.mode])
 
         self.__video = None
         self.__framescount = None
@@ -195,7 +434,7 @@ class VideoReader(object):
 
         return self.__framescount
 
-    def iterframes(self, step=1):
+    def iterframes(self, step=1, seek=False, first=1, last=None):
         """
         Generator of frame images and metadata for the currently open video
         stream.
@@ -203,16 +442,137 @@ class VideoReader(object):
         By default the generator yields a result each frame; this value can be
         adjusted by setting the optional ``step`` parameter.
 
+        By default the stream is decoded forward and the frames between two
+        steps are simply dropped. Set ``seek`` to ``True`` to seek to each
+        yielded frame instead; this is faster only if ``step`` spans several
+        keyframe intervals, as each seek decodes again from the previous
+        keyframe.
+
+        The ``first`` and ``last`` arguments restrict the iteration to a range
+        of frame numbers (``last`` excluded, defaults to the frames count).
+
         The tuple returned for each step contains the following values:
 
             (frame_number, frame_timestamp, frame_image)
 
+        The pixels of the yielded frames are views over the buffer of the
+        decoder (see ``Frame.data``): call ``Frame.retain`` on the frames to
+        be used after the next iteration.
+        """
+        if last is None:
+            last = self.framescount
+
+        if seek:
+            return self._iterframes_seek(step, first, last)
+        else:
+            return self._iterframes_forward(step, first, last)
+
+    def getframe(self, number):
+        """
+        Seeks to the given frame and returns it. As for ``iterframes``, the
+        pixels of the frame are a view over the buffer of the decoder.
+        """
+        self.video.seek_to_frame(number)
+        #video.get_current_frame() -> pts, count, frame, frametype, vectors
+        pts, _, data, _, _ = self.video.get_current_frame()
+        return Frame.fromarray(number, pts / 1000000., data, True)
+
+    def _iterframes_seek(self, step, first, last):
+        for frame_num in xrange(first, last, step):
+            yield self.getframe(frame_num)
+
+    def _iterframes_forward(self, step, first, last):
+        self.video.seek_to_frame(first)
+
+        for frame_num in xrange(first, last):
+            if frame_num > first:
+                try:
+                    self.video.get_next_frame()
+                except IOError:
+                    # End of stream reached before the estimated frames count
+                    return
+
+            if (frame_num - first) % step:
+                continue
+
+            pts, _, data, _, _ = self.video.get_current_frame()
+            yield Frame.fromarray(frame_num, pts / 1000000., data, True)
+
+
+FrameTiming = namedtuple('FrameTiming', 'number decode blur diff')
+"""
+Time (in seconds) spent decoding, filtering (or downscaling) and comparing a
+frame analyzed by ``VideoSegmenter.sequences``.
+"""
+
+
+class ChangeDetector(object):
+    """
+    Compares the analysis images of successive frames against a reference
+    one, as ``difference`` does, reusing preallocated buffers: one for the
+    reference image, one for the current image and one for their difference.
+
+    The analysis image of a frame is its vertically blurred version, or its
+    grayscale downscaled proxy if ``analysis_size`` is set, of its ``region``
+    (see ``VideoSegmenter.analysis_image``).
+    """
+
+    def __init__(self, blur_size=5, analysis_size=None, region=None):
+        self.blur_size = blur_size
+        self.analysis_size = analysis_size
+        self.region = region
+
+        self.reference = None
+        """Analysis image the current one is compared to."""
+
+        self.current = None
+        """Analysis image of the last loaded frame."""
+
+        self._diff = None
+        self._work = None
+
+    def _allocate(self, shape, dtype):
+        self.reference = numpy.empty(shape, dtype=dtype)
+        self.current = numpy.empty(shape, dtype=dtype)
+        self._diff = numpy.empty(shape, dtype=numpy.float32)
+
+        if self.analysis_size is None:
+            border = 2 * (self.blur_size // 2)
+            work = (shape[0] - border, shape[1] - border) + shape[2:]
+            self._work = numpy.empty(work, dtype=numpy.int32)
+
+    def load(self, data):
+        """
+        Computes the analysis image of the given frame image array in the
+        current image buffer.
+        """
+        data = imaging.crop(data, self.region)
+
+        if self.analysis_size is not None:
+            data = imaging.area_resize(imaging.luma(data), self.analysis_size)
+
+        if self.current is None or self.current.shape != data.shape:
+            self._allocate(data.shape, data.dtype)
+
+        if self.analysis_size is None:
+            imaging.vertical_blur(data, self.blur_size, self.current,
+                                  self._work)
+        else:
+            self.current[...] = data
+
+    def keep(self):
+        """
+        Makes the current analysis image the reference the next ones are
+        compared to.
+        """
+        self.reference, self.current = self.current, self.reference
+
+    def score(self):
+        """
+        Returns the difference between the reference and the current analysis
+        images.
         """
-        for frame_num in xrange(1, self.framescount, step):
-            self.video.seek_to_frame(frame_num)
-            #video.get_current_frame() -> pts, count, frame, frametype, vectors
-            pts, _, image, _, _ = self.video.get_current_frame()
-            yield Frame(frame_num, pts / 1000000., image.copy())
+        return imaging.difference(self.reference, self.current, self._diff)
 
 
 class VideoSegmenter(object):
@@ -221,16 +581,10 @@ class VideoSegmenter(object):
     comparing subsequent frames with a certain time-resolution.
     """
 
-    frame_filter = ImageFilter.Kernel(
-        (5, 5),
-        [0, 0, 1, 0, 0,
-         0, 0, 1, 0, 0,
-         0, 0, 1, 0, 0,
-         0, 0, 1, 0, 0,
-         0, 0, 1, 0, 0]
-    )
+    blur_size = 5
     """
-    Filter to be applied to the frame image before starting to process it.
+    Height of the vertical box filter applied to the frame image before
+    starting to process it (see ``imaging.vertical_blur``).
     """
 
     resolution = 25
@@ -275,14 +629,83 @@ class VideoSegmenter(object):
     Maximum of detection in a row before switching to passive mode.
     """
 
-    def __init__(self, video_reader):
+    analysis_size = None
+    """
+    Size ``(width, height)`` of the grayscale proxy on which the change
+    detection is run, e.g. ``(160, 120)``. Set to ``None`` (the default) to
+    compare the full resolution color frames.
+    """
+
+    region = None
+    """
+    The ``(left, top, right, bottom)`` box of the frames on which the change
+    detection is run, right and bottom excluded. Set to ``None`` (the
+    default) to compare whole frames. See ``estimate_region``.
+    """
+
+    region_samples = 15
+    """
+    Number of frames, spread over the whole video, on which
+    ``estimate_region`` detects the border.
+    """
+
+    proxy_score_scale = None
+    """
+    Factor mapping the scores computed on the grayscale proxies to the scale of
+    the full resolution scores, so that the same thresholds apply. No single
+    factor fits all the recordings, as it depends on the colors and on the
+    fine details of the slides: it is estimated on the video being segmented
+    (see ``calibrate_proxy``) before the segmentation starts if left to
+    ``None`` (the default).
+    """
+
+    calibration_samples = 30
+    """
+    Number of frames, spread over the whole video, on which
+    ``calibrate_proxy`` compares the full resolution and the proxy scores.
+    """
+
+    default_proxy_score_scale = 3.0
+    """
+    Factor used when no change is found to calibrate ``proxy_score_scale``.
+    The full resolution score sums the variances of the three color channels,
+    which are close to the variance of the luma on the mostly gray contents
+    of slides, whereas the proxy only has the luma.
+    """
+
+    seek = False
+    """
+    Whether the frames are read by seeking to each sampled frame (random
+    access) or by decoding the stream forward and dropping the unneeded frames
+    (streaming, the default).
+    """
+
+    coarse_step = None
+    """
+    Step (in frames) at which the video is first sampled, e.g. ``125``. When
+    a sample differs from the current slide, the interval since the previous
+    sample is bisected down to ``resolution`` to find the change frame, and
+    the video is then sampled at ``resolution`` until the images are stable
+    again. The samples in between are not decoded and are accounted as
+    unchanged ones. Frames are read by seeking (see ``VideoReader.getframe``)
+    in this mode. Set to ``None`` (the default) to sample every
+    ``resolution`` frames.
+    """
+
+    def __init__(self, video_reader, seek=None):
         """
         Creates a new segmentetion helper for the video read by the
         ``video_reader`` video_reader.
+
+        The ``seek`` argument overrides the ``VideoSegmenter.seek`` default
+        frame reading mode for this segmenter.
         """
         self.reader = video_reader
         """The reader for the given video file."""
 
+        if seek is not None:
+            self.seek = seek
+
         self.scd_interval = 0
         """Frames passed since the last threshold adjustement."""
 
@@ -300,6 +723,10 @@ class VideoSegmenter(object):
         self.changes_in_a_row = 0
         """Number of slide changes detects in a row."""
 
+        self.timings = []
+        """``FrameTiming`` of each frame analyzed by the last ``sequences``
+        run."""
+
     def adjust_threshold(self):
         """
         Checks the slide change detection threshold each
@@ -352,6 +779,101 @@ class VideoSegmenter(object):
         self.scores['changes'] = 0
         self.scores['nochanges'] = 0
 
+    def proxy(self, data):
+        """
+        Returns the grayscale, downscaled to ``analysis_size``, version of the
+        given frame image array.
+        """
+        return imaging.area_resize(imaging.luma(data), self.analysis_size)
+
+    def analysis_image(self, data):
+        """
+        Returns the image array on which the change detection is run for the
+        given frame image array: either its proxy or its filtered full
+        resolution version, depending on ``analysis_size``, of its ``region``.
+        """
+        data = imaging.crop(data, self.region)
+
+        if self.analysis_size is None:
+            return imaging.vertical_blur(data, self.blur_size)
+        else:
+            return self.proxy(data)
+
+    def calibrate_proxy(self):
+        """
+        Estimates ``proxy_score_scale`` for the video being segmented as the
+        median ratio between the full resolution and the proxy scores of
+        ``calibration_samples`` frames spread over the whole video, each
+        compared to the previous one. Only the pairs whose full resolution
+        score exceeds the lower threshold, which mostly show different
+        slides, are taken into account.
+
+        The estimate is stored on this segmenter and returned. The
+        ``default_proxy_score_scale`` is used if no change is found.
+        """
+        count = self.reader.framescount
+        numbers = numpy.linspace(1, count - 1, self.calibration_samples)
+
+        ratios = []
+        previous = None
+
+        for number in sorted(set(numbers.astype(int))):
+            try:
+                frame = self.reader.getframe(int(number))
+            except IOError:
+                # The stream is shorter than its estimated frames count
+                continue
+
+            data = imaging.crop(frame.data, self.region)
+            current = imaging.vertical_blur(data, self.blur_size), \
+                      self.proxy(data)
+
+            if previous is not None:
+                score = difference(previous[0], current[0])
+                proxy_score = difference(previous[1], current[1])
+
+                if score > self.scd_lower_threshold and proxy_score:
+                    ratios.append(score / proxy_score)
+
+            previous = current
+
+        if ratios:
+            ratios.sort()
+            self.proxy_score_scale = ratios[len(ratios) // 2]
+        else:
+            self.proxy_score_scale = self.default_proxy_score_scale
+
+        return self.proxy_score_scale
+
+    def estimate_region(self):
+        """
+        Estimates the region of the frames showing the slides, as the border
+        which ``cropping.BorderCropper`` finds on ``region_samples`` frames
+        spread over the whole video, excluding the black borders and the
+        overlays around the slides.
+
+        The estimate is stored as ``region`` on this segmenter and returned.
+        """
+        cropper = cropping.BorderCropper()
+        count = self.reader.framescount
+        numbers = numpy.linspace(1, count - 1, self.region_samples)
+
+        for number in sorted(set(numbers.astype(int))):
+            try:
+                frame = self.reader.getframe(int(number))
+            except IOError:
+                # The stream is shorter than its estimated frames count
+                continue
+            cropper.process(frame.image)
+
+        if not cropper.max_width:
+            return self.region
+
+        left, top, right, bottom = cropper.compute_border()
+        self.region = left, top, right + 1, bottom + 1
+
+        return self.region
+
     def detect_change(self, previous, current):
         """
         Returns a tuple containing the score of the difference between the
@@ -361,8 +883,30 @@ class VideoSegmenter(object):
         This method also does all bookkeeping for the different statistics
         needed to switch modes or adjust the threshold.
         """
+        return self.process_score(difference(previous, current))
+
+    def magnitude(self, score):
+        """
+        Returns the magnitude of the given difference score, on the scale of
+        the thresholds.
+        """
+        if self.analysis_size is not None:
+            return score * self.proxy_score_scale
+        return score
 
-        current_magnitude = difference(previous, current)
+    def exceeds(self, score):
+        """
+        Whether the given difference score denotes a change with the current
+        threshold.
+        """
+        return self.magnitude(score) > self.threshold
+
+    def process_score(self, current_magnitude):
+        """
+        Same as ``detect_change``, for the already computed difference score
+        ``current_magnitude`` between the previous and the current images.
+        """
+        current_magnitude = self.magnitude(current_magnitude)
 
         if current_magnitude > self.threshold:
             self.counters['changes'] += 1
@@ -388,25 +932,59 @@ class VideoSegmenter(object):
 
         return current_magnitude, passive_mode
 
-    def sequences(self):
+    def process_skipped(self, score, count):
+        """
+        Does the bookkeeping of ``process_score`` for ``count`` samples
+        skipped by the coarse sampling (see ``coarse_step``), which are deemed
+        unchanged with the given difference score.
+        """
+        for _ in xrange(count):
+            magnitude = self.magnitude(score)
+
+            self.counters['nochanges'] += 1
+            self.scores['nochanges'] += magnitude
+
+            self.counters['static'] += 1
+            self.scores['static'] += magnitude
+
+            self.changes_in_a_row = 0
+            self.adjust_threshold()
+
+    def sequences(self, first=1, last=None):
         """
         Generator for ``Sequence`` objects describing the segmentation of the
         video into different slide-related chunks.
 
-        Note: the PIL library reuses image objects. Be sure to copy it if you
-        want to reuse in sucessive generator iterations (use the .copy method)
+        The ``first`` and ``last`` arguments restrict the segmentation to a
+        range of frames, see ``VideoReader.iterframes``.
+
+        The first and last frames of the yielded sequences are retained (see
+        ``Frame.retain``) and can be used after the next iterations.
         """
 
-        frame = prev_frame = self.reader.iterframes(self.resolution).next()
-        prev_blurred = frame.image.filter(self.frame_filter)
+        if self.analysis_size is not None and self.proxy_score_scale is None:
+            self.calibrate_proxy()
+
+        detector = ChangeDetector(self.blur_size, self.analysis_size,
+                                  self.region)
+        self.timings = []
+
+        frames = self.reader.iterframes(self.resolution, self.seek, first,
+                                        last)
+        frame = prev_frame = frames.next().retain()
+        detector.load(frame.data)
+        detector.keep()
 
         seq = Sequence(frame, sys.maxint)
         seq.last_frame = frame
 
-        for frame in self.reader.iterframes(self.resolution):
-            blurred = frame.image.filter(self.frame_filter)
+        if self.coarse_step is None:
+            samples = self._samples(detector, first, last)
+        else:
+            samples = self._coarse_samples(detector, first, last)
 
-            score, passive_mode = self.detect_change(prev_blurred, blurred)
+        for frame, score in samples:
+            score, passive_mode = self.process_score(score)
 
             if score:
                 if passive_mode:
@@ -416,7 +994,7 @@ class VideoSegmenter(object):
                     seq = Sequence(frame, score)
 
                 # Always compare to the first frame of the sequence.
-                prev_blurred = blurred
+                detector.keep()
             else:
                 if seq.unstable:
                     # Save the score before yielding the object in order to
@@ -430,10 +1008,227 @@ class VideoSegmenter(object):
                     yield seq
                     seq = Sequence(first_frame, score)
 
-            prev_frame, seq.last_frame = seq.last_frame, frame
+            # The frame has to survive the decoding of the next sample, which
+            # tells whether it remains the last one of the sequence.
+            prev_frame, seq.last_frame = seq.last_frame, frame.retain()
 
         yield seq
 
+    def _analyze(self, detector, frame, start):
+        """
+        Compares the given frame, decoded since ``start``, to the reference
+        image of the ``detector``, records the timing of the analysis and
+        returns the ``(frame, score)`` tuple.
+        """
+        decoded = time.time()
+
+        detector.load(frame.data)
+        blurred = time.time()
+
+        score = detector.score()
+        compared = time.time()
+
+        self.timings.append(FrameTiming(frame.number, decoded - start,
+                                        blurred - decoded, compared - blurred))
+
+        return frame, score
+
+    def _samples(self, detector, first, last):
+        """
+        Generator of the ``(frame, score)`` tuples of every ``resolution``
+        frames of the given range.
+        """
+        frames = self.reader.iterframes(self.resolution, self.seek, first,
+                                        last)
+        start = time.time()
+
+        for frame in frames:
+            yield self._analyze(detector, frame, start)
+
+            # Do not account the time spent by the consumer of the samples
+            start = time.time()
+
+    def _read(self, detector, number):
+        return self._analyze(detector, self.reader.getframe(number),
+                             time.time())
+
+    def _stream_end(self, low, high):
+        """
+        Returns the last sampled frame number which can be read between
+        ``low`` (readable) and ``high`` (beyond the end of the stream).
+        """
+        step = self.resolution
+
+        while high - low > step:
+            middle = low + (high - low) // step // 2 * step
+            try:
+                self.reader.getframe(middle)
+            except IOError:
+                high = middle
+            else:
+                low = middle
+
+        return low
+
+    def _coarse_samples(self, detector, first, last):
+        """
+        Generator of the ``(frame, score)`` tuples of the frames of the given
+        range sampled as described by ``coarse_step``.
+
+        The samples at which a change is detected, and the ones preceding
+        them, are the same as the ones sampling every ``resolution`` frames
+        would give, provided that a slide does not come back within a coarse
+        step.
+        """
+        if last is None:
+            last = self.reader.framescount
+
+        step = self.resolution
+        coarse = max(step, self.coarse_step // step * step)
+        final = first + (last - 1 - first) // step * step
+        number = first
+
+        yield self._read(detector, number)
+
+        while number < final:
+            if self.changes_in_a_row:
+                # Sample finely until the images are stable again
+                try:
+                    sample = self._read(detector, number + step)
+                except IOError:
+                    return
+                number += step
+                yield sample
+                continue
+
+            target = min(number + coarse, final)
+
+            try:
+                frame, score = self._read(detector, target)
+            except IOError:
+                # The stream is shorter than its estimated frames count
+                final = self._stream_end(number, target)
+                continue
+
+            if not self.exceeds(score):
+                self.process_skipped(score, (target - number) // step - 1)
+                number = target
+                yield frame, score
+                continue
+
+            # Bisect down to the first sample differing from the reference
+            low, high = (None, None, number), (frame, score, target)
+
+            while high[2] - low[2] > step:
+                # The bounds are yielded after the next probes are decoded
+                for bound in (low[0], high[0]):
+                    if bound is not None:
+                        bound.retain()
+
+                middle = low[2] + (high[2] - low[2]) // step // 2 * step
+                probe = self._read(detector, middle) + (middle,)
+
+                if self.exceeds(probe[1]):
+                    high = probe
+                else:
+                    low = probe
+
+            if low[0] is not None:
+                self.process_skipped(low[1], (low[2] - number) // step - 1)
+                yield low[0], low[1]
+
+            # The change becomes the reference: load it again in the detector
+            detector.load(high[0].data)
+            number = high[2]
+            yield high[0], high[1]
+
+    def timing_summary(self):
+        """
+        Returns a ``FrameTiming`` holding the number of frames analyzed by the
+        last ``sequences`` run and the total time spent in each step.
+        """
+        if not self.timings:
+            return FrameTiming(0, 0.0, 0.0, 0.0)
+
+        _, decode, blur, diff = zip(*self.timings)
+
+        return FrameTiming(len(self.timings), sum(decode), sum(blur),
+                           sum(diff))
+
+
+def split_range(framescount, chunks, step, overlap):
+    """
+    Splits the frames of a video in ``chunks`` contiguous ranges to be
+    segmented independently (see ``segment_range``) and returns a list of
+    ``(warmup, first, last)`` tuples.
+
+    All the boundaries are aligned to the sampling ``step``, so that the same
+    frames are analyzed as by a serial run. Each range but the first one
+    starts analyzing ``overlap`` frames (at least one step) before its
+    ``first`` frame in order to warm up the segmenter state.
+    """
+    samples = len(xrange(1, framescount, step))
+    chunks = max(1, min(chunks, samples))
+    overlap = max(overlap, step)
+
+    ranges = []
+    for i in xrange(chunks):
+        first = 1 + samples * i // chunks * step
+        last = 1 + samples * (i + 1) // chunks * step
+        warmup = max(1, first - overlap // step * step)
+        ranges.append((warmup, first, min(last, framescount)))
+
+    return ranges
+
+
+def segment_range(segmenter, warmup, first, last):
+    """
+    Segments the ``[first, last)`` frames range of a video, after having run
+    the ``segmenter`` over the ``[warmup, first)`` frames to warm up its state.
+
+    Returns a ``(continuation, sequences)`` tuple: ``continuation`` is the
+    sequence which was in progress at the ``first`` frame (or ``None`` if the
+    range starts with a new sequence) and belongs to the previous range,
+    while ``sequences`` is the list of the sequences starting in the range.
+    Sequences ending in the warm-up are discarded.
+
+    The adaptive threshold state carried by ``adjust_threshold`` is
+    approximated by the warm-up: the threshold, the detection statistics and
+    the passive mode are rebuilt over the overlap instead of being inherited
+    from the previous range. Choose an overlap of a few
+    ``scd_adjust_interval``s for the threshold to converge to the serial one.
+    """
+    continuation = None
+    sequences = []
+
+    for seq in segmenter.sequences(warmup, last):
+        if seq.first_frame.number >= first:
+            sequences.append(seq)
+        elif seq.last_frame.number >= first:
+            continuation = seq
+
+    return continuation, sequences
+
+
+def stitch(chunks):
+    """
+    Stitches the ``(continuation, sequences)`` results of ``segment_range``
+    for contiguous ranges into a single list of sequences. Each continuation
+    extends the last sequence of the previous range.
+    """
+    result = []
+
+    for continuation, sequences in chunks:
+        if continuation is not None and result:
+            result[-1].last_frame = continuation.last_frame
+            result[-1].unstable = result[-1].unstable or continuation.unstable
+        elif continuation is not None:
+            result.append(continuation)
+
+        result.extend(sequences)
+
+    return result
+
 
 def main():
     """
@@ -0,0 +1,44 @@
+"""
+Default configuration for all analyzer modules.
+This configuration can be overridden in user defined settings files.
+"""
+
+
+from twisted.python import filepath
+
+
+# pylint: disable=C0103,W0105
+# Yes... it is a configuration file, and I want my values to be lowercase as
+# they are eventually read as instance properties.
+# And as epydoc recognizes docstrings for variables too, I provide them too 
+# here.
+
+
+feature_cache_root = filepath.FilePath('featurecache')
+"""
+Directory holding the features vectors already computed for slides and
+frames, so that the analysis of an unchanged slideshow or video does not have
+to compute them again. Set this to ``None`` to disable the cache.
+"""
+
+feature_cache_size = 256 * 1024 * 1024
+"""
+Maximum size (in bytes) of the features vectors cache; the least recently
+used vectors are evicted once it is exceeded.
+"""
+
+crop_convergence_samples = None
+"""
+Number of successive frames for which the border detected by the cropping
+must not change to stop analyzing the remaining frames, ``30`` for instance.
+All frames are analyzed if ``None``, which gives the most common border of
+the whole video.
+"""
+
+slide_analysis_size = None
+"""
+Size in which the slide images are fitted before extracting their features
+vectors, or ``None`` to analyze the slides at their full size. A size close
+to the one of the cropped video frames, such as ``(640, 480)``, makes the
+features vectors more comparable, as they depend on the scale of the images.
+"""
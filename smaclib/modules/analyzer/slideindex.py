@@ -0,0 +1,181 @@
+"""
+Nearest neighbours index over the features vectors of a slideshow.
+
+The alignment needs, for the end frame of each sequence, the slides whose
+difference score (see ``identification.get_diff_score``) is within a given
+relative margin of the best one, plus the second best score for the
+confidence. A ``SlideIndex`` built once over the features vectors of a
+slideshow answers these queries while computing the full difference score for
+only a small fraction of the slides.
+
+The features vectors are projected on their main principal components: as the
+projection is orthonormal, the distance between two projected vectors never
+exceeds the distance between the full ones. The slides are visited by
+increasing projected distance, and the search stops as soon as the projected
+distance of the next slide exceeds the margin of the best scores found so far,
+so that no slide within the margin is missed.
+
+Space partitioning trees (KD-trees, ball trees) were not retained: in the
+``identification.FEATURES_LENGTH`` (262) dimensions of the features vectors,
+and even in the projected space, their nodes hardly ever get pruned and they
+ended up visiting every slide.
+
+Indexes only hold arrays, and can thus be pickled to be sent to worker
+processes. The indexes of the last aligned slideshows are kept in memory (see
+``get_index``), so that aligning several videos to the same slideshow only
+builds its index once.
+"""
+
+
+import hashlib
+import threading
+import collections
+
+import numpy
+
+from smaclib.modules.analyzer import identification
+
+
+def _pair_scores(f1, f2, rows, columns):
+    """
+    Returns the difference scores between the vectors ``f1[rows]`` and
+    ``f2[columns]``, exactly as ``identification.get_diff_matrix`` computes
+    them.
+    """
+    diff = numpy.zeros(rows.shape, dtype=numpy.float64)
+    buf = numpy.empty_like(diff)
+
+    for j in xrange(f1.shape[1]):
+        numpy.subtract(f1[:, j][rows], f2[:, j][columns], buf)
+        numpy.power(buf, 2.0, buf)
+        diff += buf
+
+    return diff
+
+
+class SlideIndex(object):
+    """
+    An index over the features vectors of the slides of a slideshow.
+    """
+
+    dimensions = 32
+    """
+    Number of principal components on which the vectors are projected.
+    """
+
+    batch = 8
+    """
+    Number of slides for which the full scores are computed at once during the
+    first step of a search; the batch size doubles at each step.
+    """
+
+    def __init__(self, vectors, dimensions=None):
+        if dimensions is not None:
+            self.dimensions = dimensions
+
+        self.vectors = numpy.array(vectors, dtype=numpy.float64, ndmin=2)
+        """The indexed vectors, one per row."""
+
+        self.mean = self.vectors.mean(axis=0)
+        _, _, basis = numpy.linalg.svd(self.vectors - self.mean,
+                                       full_matrices=False)
+        self.basis = basis[:self.dimensions].T
+        self.projected = self.project(self.vectors)
+
+        self.computed = 0
+        """Number of full scores computed by the searches, for statistics."""
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def project(self, vectors):
+        """
+        Returns the projection of the given vectors on the principal
+        components of the indexed ones.
+        """
+        vectors = numpy.asarray(vectors, dtype=numpy.float64)
+        return numpy.dot(vectors - self.mean, self.basis)
+
+    def get_diff_matrix(self, queries, margin, nearest=2):
+        """
+        Returns the difference scores between each of the ``queries`` vectors
+        and the indexed ones, as ``identification.get_diff_matrix`` would,
+        but only for some of the indexed vectors: the other scores are
+        infinite.
+
+        The scores are computed at least for the ``nearest`` vectors and for
+        all the vectors whose score is within the relative ``margin`` of the
+        best one.
+        """
+        queries = numpy.array(queries, dtype=numpy.float64, ndmin=2)
+        count = len(self)
+
+        result = numpy.empty((len(queries), count), dtype=numpy.float64)
+        result.fill(numpy.inf)
+
+        if not count or not len(queries):
+            return result
+
+        lower = identification.get_diff_matrix(self.project(queries),
+                                               self.projected)
+        order = numpy.argsort(lower, axis=1)
+        nearest = min(nearest, count)
+
+        pending = numpy.arange(len(queries))
+        start, end = 0, min(max(self.batch, nearest), count)
+
+        while len(pending):
+            rows = numpy.repeat(pending[:, numpy.newaxis], end - start, axis=1)
+            columns = order[pending, start:end]
+            result[rows, columns] = _pair_scores(queries, self.vectors,
+                                                 rows, columns)
+            self.computed += rows.size
+
+            if end == count:
+                break
+
+            best = numpy.partition(result[pending], nearest - 1, axis=1)
+            bound = numpy.maximum(best[:, nearest - 1],
+                                  best[:, 0] * (1.0 + margin))
+
+            # Leave some room for the rounding errors of the projection.
+            following = lower[pending, order[pending, end]]
+            pending = pending[following <= bound * (1.0 + 1e-6)]
+
+            start, end = end, min(end * 2, count)
+
+        return result
+
+
+cache_size = 8
+"""
+Number of slideshow indexes kept in memory by ``get_index``.
+"""
+
+_indexes = collections.OrderedDict()
+_lock = threading.Lock()
+
+
+def get_index(vectors):
+    """
+    Returns the ``SlideIndex`` over the given features vectors, reusing the one
+    built for the same vectors by a previous call if still in memory.
+    """
+    vectors = numpy.array(vectors, dtype=numpy.float64, ndmin=2)
+    key = hashlib.sha1(repr(vectors.shape))
+    key.update(numpy.ascontiguousarray(vectors))
+    key = key.hexdigest()
+
+    with _lock:
+        index = _indexes.pop(key, None)
+
+    if index is None:
+        index = SlideIndex(vectors)
+
+    with _lock:
+        _indexes[key] = index
+
+        while len(_indexes) > cache_size:
+            _indexes.popitem(last=False)
+
+    return index
@@ -0,0 +1,320 @@
+"""
+Parameter sweeps of the slides alignment
+----------------------------------------
+
+Tuning the thresholds of ``alignment.Sequence`` used to mean running the whole
+alignment once per configuration, the distances between the sequences and the
+slides being computed again each time although they do not depend on the
+thresholds. A ``ParameterSweep`` computes the distance matrix of a lecture
+once, then evaluates each configuration of a grid of thresholds in the worker
+processes of a ``smaclib.workers.WorkerPool``: the matrix is saved to a
+temporary file which the workers map in memory, so that only the
+configurations and the frame numbers of the sequences are sent to them.
+
+Each configuration is scored against a reference alignment (a checked
+``alignment.xml`` output, see ``read_alignment``) by the fraction of the
+frames it assigns to the same slide (see ``accuracy``).
+"""
+
+
+import os
+import tempfile
+import itertools
+
+import numpy
+
+from lxml import etree
+
+from twisted.internet import defer
+from smaclib import tasks
+from smaclib import workers
+from smaclib.modules.analyzer import alignment
+
+from zope.interface import implements
+
+
+THRESHOLDS = (
+    'trailling_seq_min_duration',
+    'dupl_seq_max_var',
+    'dupl_seq_conf_thsld',
+    'missing_max_confidence',
+    'min_confidence',
+    'max_nb_of_candidates',
+    'remnant_seq_min_conf',
+    'off_seq_min_conf',
+    'off_seq_min_duration',
+)
+"""
+The ``alignment.Sequence`` thresholds a sweep can vary.
+"""
+
+
+def read_alignment(source):
+    """
+    Returns the ``(slide_id, first_frame, last_frame)`` segments of the
+    alignment read from ``source`` (a filename or a file object), an XML
+    document made of the ``alignment.Match.toxml`` elements of the matches.
+    """
+    root = etree.parse(source).getroot()
+    result = []
+
+    for sequence in root.xpath('sequence'):
+        result.append((int(sequence.get('slide-num')),
+                       int(sequence.xpath('first-frame/@number')[0]),
+                       int(sequence.xpath('last-frame/@number')[0])))
+
+    return sorted(result, key=lambda segment: segment[1:])
+
+
+def segments(matches):
+    """
+    Returns the ``(slide_id, first_frame, last_frame)`` segments of the given
+    matches, as ``read_alignment`` reads them from their XML serialization.
+    """
+    result = [(match.slide.id, match.sequence.start_frame.num,
+               match.sequence.end_frame.num) for match in matches]
+
+    return sorted(result, key=lambda segment: segment[1:])
+
+
+def accuracy(segments, reference):
+    """
+    Returns the fraction of the frames of the ``reference`` segments which
+    the given segments assign to the same slide.
+
+    Both lists hold non overlapping ``(slide_id, first_frame, last_frame)``
+    segments ordered by frame. A segment spans from its first frame included
+    to its last frame excluded, as the consecutive matches of an alignment
+    share their boundary frame (see
+    ``Identification.assign_orphan_sequences``).
+    """
+    total = sum(last - first for _, first, last in reference)
+
+    if not total:
+        return 0.0
+
+    correct = 0
+    start = 0
+
+    for slide, first, last in reference:
+        # Skip the segments ending before this reference segment
+        while start < len(segments) and segments[start][2] <= first:
+            start += 1
+
+        for other, other_first, other_last in segments[start:]:
+            if other_first >= last:
+                break
+
+            if other == slide:
+                correct += min(last, other_last) - max(first, other_first)
+
+    return float(correct) / total
+
+
+def configurations(grid):
+    """
+    Returns the configurations of the given grid, a mapping of threshold
+    names (see ``THRESHOLDS``) to the sequence of the values to try: a
+    dictionary of threshold values for each of their combinations.
+    """
+    unknown = set(grid) - set(THRESHOLDS)
+
+    if unknown:
+        raise ValueError("Unknown alignment thresholds: {0}".format(
+                ', '.join(sorted(unknown))))
+
+    names = sorted(grid)
+
+    return [dict(zip(names, values))
+            for values in itertools.product(*[grid[name] for name in names])]
+
+
+def sequence_class(parameters):
+    """
+    Returns a subclass of ``alignment.Sequence`` whose thresholds are
+    overridden by the given configuration.
+    """
+    attributes = dict(parameters)
+    attributes['__slots__'] = ()
+
+    return type('Sequence', (alignment.Sequence,), attributes)
+
+
+class ParameterSweep(object):
+    """
+    Evaluates each configuration of the ``grid`` of thresholds (see
+    ``configurations``) on the alignment of the given sequences and slides,
+    against the ``reference`` segments (see ``read_alignment``).
+
+    The task fires with a dictionary for each configuration, holding its
+    ``parameters``, the ``accuracy`` of its alignment and the number of its
+    ``matches``, the most accurate configurations first.
+    """
+
+    implements(tasks.ICancelableTaskRunner)
+
+    chunksize = 4
+    """
+    Number of configurations sent at once to a worker process.
+    """
+
+    coarse_candidates = None
+    """
+    Number of slides, ranked on their coarse features vectors, whose full
+    distance to each sequence is computed (see
+    ``Identification.coarse_candidates``). All the distances are computed by
+    default, as the thresholds being tuned select the candidates among them.
+    """
+
+    def __init__(self, sequences, slides, reference, grid, pool=None):
+        """
+        The sequences and the slides are left untouched, the alignments run
+        on copies of them.
+        """
+        self.task = tasks.Task("Alignment parameter sweep", self)
+        self.sequences = sorted(sequences)
+        self.slides = list(slides)
+        self.reference = reference
+        self.configurations = configurations(grid)
+        self.pool = pool
+        """The worker pool to use, defaults to ``workers.get_pool()``."""
+
+        self.evaluated = 0
+        self.job = None
+
+    @property
+    def lecture(self):
+        """
+        The picklable description of the sequences and the slides sent to
+        the worker processes, with the rows and the columns of the distance
+        matrix in the same order.
+        """
+        framerate = 25.
+
+        if self.sequences:
+            framerate = self.sequences[0].end_frame.framerate
+
+        return (
+            numpy.array([seq.start_frame.num for seq in self.sequences]),
+            numpy.array([seq.end_frame.num for seq in self.sequences]),
+            numpy.array([seq.unstable for seq in self.sequences], dtype=bool),
+            framerate,
+            [slide.id for slide in self.slides],
+        )
+
+    def getTask(self):
+        return self.task
+
+    @defer.inlineCallbacks
+    def start(self):
+        self.task.statustext = "Computing the distance matrix..."
+
+        pool = self.pool or workers.get_pool()
+        features = [slide.features for slide in self.slides]
+        frames = (seq.end_frame.features for seq in self.sequences)
+
+        self.job = pool.submit(alignment._diff_rows, frames,
+                               args=(features, self.coarse_candidates),
+                               chunksize=alignment.Identification.chunksize)
+
+        try:
+            scores = yield self.job
+        except defer.CancelledError:
+            return
+
+        fd, filename = tempfile.mkstemp(prefix='smac-', suffix='-scores.npy')
+
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                numpy.save(fh, numpy.array(scores))
+            del scores
+
+            self.update()
+            self.job = pool.submit(_evaluate, self.configurations,
+                                   args=(self.lecture, filename,
+                                         self.reference),
+                                   chunksize=self.chunksize,
+                                   progress=self.evaluated_chunk)
+
+            results = yield self.job
+        except defer.CancelledError:
+            return
+        finally:
+            os.remove(filename)
+
+        results = [dict(result, parameters=parameters) for parameters, result
+                   in itertools.izip(self.configurations, results)]
+        results.sort(key=lambda result: -result['accuracy'])
+
+        status = "Sweep completed ({0} configurations evaluated)".format(
+                len(results))
+        self.task.callback(results, status)
+
+    def cancel(self):
+        if self.job is not None:
+            self.job.cancel()
+
+    def evaluated_chunk(self, start, results):
+        self.evaluated += len(results)
+        self.update()
+
+    def update(self):
+        self.task.statustext = "Evaluating configuration {0} of {1}...".format(
+                min(self.evaluated + 1, len(self.configurations)),
+                len(self.configurations))
+        self.task.completed = 1. * self.evaluated / len(self.configurations)
+
+    def evaluate(self, parameters, scores):
+        """
+        Evaluates the given configuration in this process, with the given
+        distance matrix between the sequences and the slides.
+        """
+        return _evaluate_one(self.lecture, scores, parameters, self.reference)
+
+
+class _Identification(alignment.Identification):
+    """
+    An ``Identification`` running outside of the reactor thread, in a worker
+    process where no reactor runs.
+    """
+
+    def updateTask(self, statustext):
+        pass
+
+
+def _evaluate_one(lecture, scores, parameters, reference):
+    firsts, lasts, unstable, framerate, slide_ids = lecture
+
+    sequences = alignment.sequences_fromtables(
+        alignment.FrameTable(firsts, framerate=framerate),
+        alignment.FrameTable(lasts, framerate=framerate),
+        unstable,
+        sequence_class(parameters)
+    )
+    slides = [alignment.Slide(slide_id) for slide_id in slide_ids]
+
+    for sequence, row in itertools.izip(sequences, scores):
+        sequence.set_scores(slides, row)
+
+    if any(sequence.keep() for sequence in sequences):
+        matches = _Identification(sequences, slides).identify(scores)
+    else:
+        # No sequence is confident enough, the alignment is empty
+        matches = []
+
+    return {
+        'accuracy': accuracy(segments(matches), reference),
+        'matches': len(matches),
+    }
+
+
+def _evaluate(chunk, lecture, filename, reference):
+    """
+    Worker process function for ``ParameterSweep``, returning the evaluation
+    of each configuration of the chunk with the distance matrix saved in
+    ``filename``.
+    """
+    scores = numpy.load(filename, mmap_mode='r')
+
+    return [_evaluate_one(lecture, scores, parameters, reference)
+            for parameters in chunk]
@@ -1,29 +1,55 @@
 import os
 import sys
 import functools
-import tempfile
+
+import numpy
+import Image
 
 from smaclib.modules.analyzer import segmentation
 from smaclib.modules.analyzer import cropping
+from smaclib.modules.analyzer import identification
+from smaclib.modules.analyzer import framestore
+from smaclib.modules.analyzer import imaging
 from smaclib import tasks
 from smaclib import utils
+from smaclib import workers
 
 from zope.interface import implements
+from twisted.internet import defer
 from twisted.internet import reactor
 from twisted.internet import threads
+from twisted.python import log
 
 
 class VideoCroppingTask(object):
-    implements(tasks.ITaskRunner)
+    implements(tasks.ICancelableTaskRunner)
 
     analyzing = "Analyzing frame {current}/{tot}..."
     cropping = "Cropping frame {current}/{tot}..."
 
-
-    def __init__(self, sequences=None):
+    convergence_samples = None
+    """
+    Number of successive frames for which the computed border must not change
+    to stop analyzing the remaining frames (see
+    ``cropping.BorderCropper.convergence_samples``), or ``None`` to analyze
+    all frames. The border found after an early stop may differ from the one
+    of all the frames.
+    """
+
+    chunksize = 4
+    """
+    Number of frames sent at once to a worker process to detect their border.
+    """
+
+    def __init__(self, sequences=None, pool=None):
         self.sequences = sequences
+        self.pool = pool
+        """The worker pool to use, defaults to ``workers.get_pool()``."""
+
         self.analyzed = 0
         self.cropped = 0
+        self.cropper = None
+        self.job = None
         self.task = tasks.Task("Border cropping", self)
 
     def getTask(self):
@@ -34,25 +60,35 @@ class VideoCroppingTask(object):
             current=1,
             tot=len(self.sequences)
         )
-        d = threads.deferToThread(self.crop)
-        d.addCallback(self.cropping_completed)
 
-    def crop(self):
-        cropper = cropping.BorderCropper()
+        self.cropper = cropping.BorderCropper()
+        self.cropper.convergence_samples = self.convergence_samples
 
-        for seq in self.sequences:
-            frame = seq.last_frame
-            reactor.callFromThread(self.frame_processed)
-            cropper.process(frame.image)
-            frame.close()
+        # Sample the frames evenly over the whole video, so that the border
+        # converges to the most common one and not to the one of the first
+        # minutes.
+        frames = interleave(self.sequences)
+        frames = (_frame_data(seq.last_frame) for seq in frames)
 
-        border = cropper.compute_border()
+        pool = self.pool or workers.get_pool()
+        self.job = pool.submit(_detect_borders, frames,
+                               chunksize=self.chunksize,
+                               progress=self.frames_processed)
+        self.job.addErrback(self.analysis_stopped)
+        self.job.addCallback(lambda _: threads.deferToThread(self.crop))
+        self.job.addCallbacks(self.cropping_completed, self.cropping_failed)
+
+    def cancel(self):
+        self.job.cancel()
+
+    def crop(self):
+        border = self.cropper.compute_border()
 
         for seq in self.sequences:
             frame = seq.last_frame
             reactor.callFromThread(self.frame_cropped)
             frame.image = frame.image.crop(border)
-            frame.save()
+            frame.keep()
 
     def update_completion(self):
         # Approximate a linear task completion time
@@ -64,6 +100,15 @@ class VideoCroppingTask(object):
 
         self.task.completed =  completed / len(self.sequences)
 
+    def frames_processed(self, start, borders):
+        for border, size in borders:
+            self.frame_processed()
+            self.cropper.add_border(border, size)
+
+            if self.cropper.converged:
+                self.job.cancel()
+                break
+
     def frame_processed(self):
         self.task._statustext = self.analyzing.format(
             current=self.analyzed + 1,
@@ -72,6 +117,15 @@ class VideoCroppingTask(object):
         self.update_completion()
         self.analyzed += 1
 
+    def analysis_stopped(self, failure):
+        failure.trap(defer.CancelledError)
+
+        if not self.cropper.converged:
+            return failure
+
+        self.analyzed = len(self.sequences)
+        self.update_completion()
+
     def frame_cropped(self):
         self.task._statustext = self.cropping.format(
             current=self.cropped + 1,
@@ -86,17 +140,60 @@ class VideoCroppingTask(object):
         )
         self.task.callback(self.sequences, status)
 
+    def cropping_failed(self, failure):
+        if not self.task.called:
+            self.task.errback(failure, "Border cropping failed")
+        elif not failure.check(defer.CancelledError):
+            return failure
+
 
 class VideoSegmentationTask(object):
-    implements(tasks.ITaskRunner)
+    implements(tasks.ICancelableTaskRunner)
 
     title = "Segmenting video '{path}', {sequences} sequences found"
 
-    def __init__(self, video_file=None):
+    workers = 1
+    """
+    Number of ranges in which the video is split, each range being segmented
+    by a worker process of the pool. With a single range the video is
+    segmented by a thread of the current process.
+    """
+
+    chunk_overlap = 1500
+    """
+    Number of frames each chunk of the video but the first one starts to be
+    analyzed before its own range when segmenting in parallel, in order to
+    warm up the segmenter state (see ``segmentation.segment_range``).
+    """
+
+    restrict_region = False
+    """
+    Whether the change detection is restricted to the region of the frames
+    showing the slides, estimated before the segmentation (see
+    ``segmentation.VideoSegmenter.estimate_region``).
+    """
+
+    reader_class = segmentation.VideoReader
+    """
+    The class of the video readers, instantiated with the path of the video.
+    """
+
+    def __init__(self, video_file=None, store=None, pool=None):
         if video_file is not None:
             self.video_file = video_file
+        self.region = None
+        """The region of the frames on which the changes are detected."""
+
         self.sequences = []
+        self.progress = []
+        self.store = store if store is not None else framestore.FrameStore()
+        """The store in which the last frame of each sequence is kept."""
 
+        self.pool = pool
+        """The worker pool to use, defaults to ``workers.get_pool()``."""
+
+        self.cancelled = False
+        self.job = None
         self.task = tasks.Task("Video segmentation", self)
 
     @property
@@ -116,28 +213,101 @@ class VideoSegmentationTask(object):
             path=self.path,
             sequences=len(self.sequences)
         )
-        d = threads.deferToThread(self.segment)
-        d.addCallback(self.segmentation_completed)
+        self.job = threads.deferToThread(self.segment)
+        self.job.addCallback(self.segment_parallel)
+        self.job.addCallbacks(self.segmentation_completed,
+                              self.segmentation_failed)
+
+    def cancel(self):
+        # Stops the serial segmentation thread or the parallel job
+        self.cancelled = True
+        self.job.cancel()
 
     def segment(self):
+        """
+        Segments the video in this thread if a single range is requested, or
+        returns the ranges to be segmented in parallel.
+        """
         callback = functools.partial(reactor.callFromThread,
                                      self.segmentation_advanced)
 
         with utils.discard(sys.stderr, 2):
             with utils.discard(1):
                 reader = ObservableVideoReader(
-                    video_path=self.video_file,
-                    callback=callback
+                    self.reader_class(video_path=self.video_file),
+                    callback
                 )
             self.framescount = reader.framescount
             self.duration = reader.duration
             self.framerate = reader.framerate
+
             segmenter = segmentation.VideoSegmenter(reader)
 
+            if self.restrict_region:
+                self.region = segmenter.estimate_region()
+
+            if self.workers > 1:
+                return segmentation.split_range(
+                    self.framescount,
+                    self.workers,
+                    segmentation.VideoSegmenter.resolution,
+                    self.chunk_overlap
+                )
+
             for sequence in segmenter.sequences():
+                if self.cancelled:
+                    return None
                 reactor.callFromThread(self.sequence_found, sequence)
 
+        frames, decode, blur, diff = segmenter.timing_summary()
+        log.msg("Segmented {0} frames of '{1}': {2:.1f}s decoding, {3:.1f}s "
+                "filtering, {4:.1f}s comparing".format(frames, self.path,
+                                                       decode, blur, diff))
+
+    @defer.inlineCallbacks
+    def segment_parallel(self, ranges):
+        """
+        Segments each of the given ranges in a worker process of the pool and
+        stitches the results together.
+        """
+        if ranges is None or self.cancelled:
+            return
+
+        self.ranges = ranges
+        self.progress = [(0, last - warmup) for warmup, _, last in ranges]
+
+        pool = self.pool or workers.get_pool()
+        self.job = pool.submit(_segment_chunk, ranges,
+                               args=(self.video_file, self.store.directory,
+                                     self.region, self.reader_class),
+                               progress=self.chunk_completed)
+        chunks = yield self.job
+
+        kept = set()
+        loaded = []
+
+        for continuation, sequences in chunks:
+            if continuation is not None:
+                continuation = _load_sequence(continuation, self.store)
+                kept.add(continuation.last_frame.key)
+            sequences = [_load_sequence(seq, self.store) for seq in sequences]
+            kept.update(seq.last_frame.key for seq in sequences)
+            loaded.append((continuation, sequences))
+
+        sequences = segmentation.stitch(loaded)
+
+        # Remove the frames replaced by a continuation while stitching
+        for key in kept - set(s.last_frame.key for s in sequences):
+            self.store.remove(key)
+
+        for sequence in sequences:
+            self.sequence_found(sequence)
+
     def segmentation_completed(self, result):
+        if self.task.called:
+            # Cancelled
+            return
+
         status = u"Segmentation of '{path}' done, {sequences} sequences found"
         status = status.format(path=self.path, sequences=len(self.sequences))
 
@@ -145,14 +315,28 @@ class VideoSegmentationTask(object):
 
         self.task.callback(res, status)
 
+    def segmentation_failed(self, failure):
+        if not self.task.called:
+            self.task.errback(failure, "Segmentation of '{0}' failed".format(
+                    self.path))
+        elif not failure.check(defer.CancelledError):
+            return failure
+
     def segmentation_advanced(self, frame):
         self.task.completed =  1. * frame.number / self.framescount
 
+    def chunk_completed(self, index, results):
+        warmup, _, last = self.ranges[index]
+        self.progress[index] = last - warmup, last - warmup
+
+        analyzed = sum(p[0] for p in self.progress)
+        total = sum(p[1] for p in self.progress)
+        self.task.completed = min(1., 1. * analyzed / total)
+
     def sequence_found(self, sequence):
         self.sequences.append(sequence)
-        fd, name = tempfile.mkstemp(suffix='-frame-{0:09d}.png'.format(sequence.last_frame.number))
-        os.close(fd)
-        sequence.last_frame.save(name)
+        if sequence.last_frame.store is None:
+            sequence.last_frame.keep(self.store)
         sequence.first_frame.image = None
         self.task.statustext = self.title.format(
             path=self.path,
@@ -161,13 +345,40 @@ class VideoSegmentationTask(object):
 
 
 class SlideAnalysisTask(object):
-    implements(tasks.ITaskRunner)
+    implements(tasks.ICancelableTaskRunner)
 
     title = "Analyzing slide {current}/{tot}..."
 
-    def __init__(self, slides=None):
+    chunksize = 8
+    """
+    Number of slides sent at once to a worker process to extract their
+    features vectors (see ``identification.gen_feature_vects``).
+    """
+
+    batch_memory = 64 * 1024 * 1024
+    """
+    Maximum amount of memory (in bytes) the slides of a single feature
+    extraction batch may use. The slides of a chunk are split in several
+    batches if needed (see ``identification.iterbatches``).
+    """
+
+    analysis_size = segmentation.Slide.analysis_size
+    """
+    Size in which the slide images are fitted before extracting their
+    features vectors (see ``segmentation.load_slide``), or ``None`` to
+    analyze the slides at their full size.
+    """
+
+    def __init__(self, slides=None, pool=None, cache=None):
         self.slides = slides
+        self.pool = pool
+        """The worker pool to use, defaults to ``workers.get_pool()``."""
+
+        self.cache = cache
+        """The ``featurecache.FeatureCache`` to use, if any."""
+
         self.analyzed = 0
+        self.job = None
         self.task = tasks.Task("Feature vector generation", self)
 
     def getTask(self):
@@ -178,14 +389,32 @@ class SlideAnalysisTask(object):
             current=1,
             tot=len(self.slides)
         )
-        d = threads.deferToThread(self.analyze)
-        d.addCallback(self.analysis_completed)
-
-    def analyze(self):
-        for slide in self.slides:
-            reactor.callFromThread(self.slide_processed)
-            # Trigger generation
-            features = slide.features
+        self.slides = list(self.slides)
+
+        pool = self.pool or workers.get_pool()
+        self.job = pool.submit(_slide_features,
+                               (slide.image_file for slide in self.slides),
+                               args=(self.cache, self.analysis_size,
+                                     self.batch_memory),
+                               chunksize=self.chunksize,
+                               progress=self.slides_processed)
+        self.job.addCallback(self.trim_cache)
+        self.job.addCallbacks(self.analysis_completed, self.analysis_failed)
+
+    def cancel(self):
+        self.job.cancel()
+
+    def trim_cache(self, result):
+        if self.cache is None:
+            return result
+        d = threads.deferToThread(self.cache.trim)
+        d.addCallback(lambda _: result)
+        return d
+
+    def slides_processed(self, start, features):
+        for slide, vector in zip(self.slides[start:], features):
+            slide.features = vector
+            self.slide_processed()
 
     def slide_processed(self):
         self.analyzed += 1
@@ -201,15 +430,54 @@ class SlideAnalysisTask(object):
         )
         self.task.callback(self.slides, status)
 
+    def analysis_failed(self, failure):
+        if not self.task.called:
+            self.task.errback(failure, "Slide analysis failed")
+        elif not failure.check(defer.CancelledError):
+            return failure
+
 
 class FrameAnalysisTask(object):
-    implements(tasks.ITaskRunner)
+    implements(tasks.ICancelableTaskRunner)
+
+    title = "Analyzing frame {current}/{tot} ({hits} duplicates)..."
+
+    chunksize = 16
+    """
+    Number of frames sent at once to a worker process to extract their
+    features vectors (see ``identification.gen_feature_vects``).
+    """
+
+    batch_memory = 64 * 1024 * 1024
+    """
+    Maximum amount of memory (in bytes) the frames of a single feature
+    extraction batch may use. The frames of a chunk are split in several
+    batches if needed (see ``identification.iterbatches``).
+    """
+
+    duplicate_distance = None
+    """
+    Maximum distance between the signatures (see ``imaging.signature``) of a
+    frame and of an already analyzed one for the features vector of the
+    latter to be reused, ``0.25`` telling apart the frames of a slide from
+    the ones with an additional text line for instance. Frames farther from
+    all the analyzed ones, including the ambiguous near duplicates, are fully
+    analyzed. All frames are analyzed by default.
+    """
+
+    def __init__(self, sequences=None, pool=None, cache=None):
+        self.sequences = sequences
+        self.pool = pool
+        """The worker pool to use, defaults to ``workers.get_pool()``."""
 
-    title = "Analyzing frame {current}/{tot}..."
+        self.cache = cache
+        """The ``featurecache.FeatureCache`` to use, if any."""
 
-    def __init__(self, sequences=None):
-        self.sequences = sequences
         self.analyzed = 0
+        self.hits = 0
+        """Number of frames whose features vector was reused."""
+
+        self.job = None
         self.task = tasks.Task("Feature vector generation", self)
 
     def getTask(self):
@@ -218,45 +486,321 @@ class FrameAnalysisTask(object):
     def start(self):
         self.task._statustext = self.title.format(
             current=1,
-            tot=len(self.sequences)
+            tot=len(self.sequences),
+            hits=0
         )
-        d = threads.deferToThread(self.analyze)
-        d.addCallback(self.analysis_completed)
-
-    def analyze(self):
+        self.pending = []
+        self.signatures = {}
+        """
+        The ``(signature, index, sequence)`` tuples of the analyzed frames, by
+        ``imaging.signature_key``, ``index`` being their analysis order.
+        """
+        self.features = {}
+        self.duplicates = {}
+
+        pool = self.pool or workers.get_pool()
+        self.job = pool.submit(_frame_features, self.frames(),
+                               args=(self.cache, self.batch_memory),
+                               chunksize=self.chunksize,
+                               progress=self.frames_processed)
+        self.job.addCallback(self.trim_cache)
+        self.job.addCallbacks(self.analysis_completed, self.analysis_failed)
+
+    def cancel(self):
+        self.job.cancel()
+
+    def frames(self):
+        """
+        Generator of the image arrays of the frames to analyze, skipping the
+        duplicates of the frames already yielded.
+        """
         for seq in self.sequences:
-            frame = seq.last_frame
-            reactor.callFromThread(self.frame_processed)
-            # Trigger generation
-            seq.features = frame.features
-            frame.close()
-            frame.delete()
+            data = _frame_data(seq.last_frame)
+
+            if self.duplicate_distance is not None:
+                signature = imaging.signature(data)
+                source = self.find_duplicate(signature)
+
+                if source is not None:
+                    self.duplicate_found(seq, source)
+                    continue
+
+                key = imaging.signature_key(signature,
+                                            self.duplicate_distance)
+                self.signatures.setdefault(key, []).append(
+                    (signature, len(self.pending), seq))
+
+            self.pending.append(seq)
+            yield data
+
+    def find_duplicate(self, signature):
+        """
+        Returns the sequence of the analyzed frame whose signature is the
+        nearest to the given one, if within ``duplicate_distance``. Only the
+        signatures of the neighbouring buckets are compared (see
+        ``imaging.signature_neighbours``), the first analyzed frame winning
+        the ties.
+        """
+        best, source = None, None
+        key = imaging.signature_key(signature, self.duplicate_distance)
+
+        for neighbour in imaging.signature_neighbours(key):
+            for other, index, seq in self.signatures.get(neighbour, ()):
+                distance = imaging.signature_distance(signature, other)
+                if distance > self.duplicate_distance:
+                    continue
+
+                if best is None or (distance, index) < best:
+                    best, source = (distance, index), seq
+
+        return source
+
+    def duplicate_found(self, seq, source):
+        seq.last_frame.delete()
+        self.hits += 1
+
+        if id(source) in self.features:
+            seq.features = self.features[id(source)]
+        else:
+            self.duplicates.setdefault(id(source), []).append(seq)
+
+        self.frame_processed()
+
+    def trim_cache(self, result):
+        if self.cache is None:
+            return result
+        d = threads.deferToThread(self.cache.trim)
+        d.addCallback(lambda _: result)
+        return d
+
+    def frames_processed(self, start, features):
+        for seq, vector in zip(self.pending[start:], features):
+            seq.features = vector
+            seq.last_frame.delete()
+            self.features[id(seq)] = vector
+
+            for duplicate in self.duplicates.pop(id(seq), []):
+                duplicate.features = vector
+
+            self.frame_processed()
 
     def frame_processed(self):
         self.analyzed += 1
         self.task._statustext = self.title.format(
             current=self.analyzed,
-            tot=len(self.sequences)
+            tot=len(self.sequences),
+            hits=self.hits
         )
         self.task.completed =  (self.analyzed - 1.) / len(self.sequences)
 
     def analysis_completed(self, features):
-        status = "Frame analysis completed ({tot} frames processed)".format(
-            tot=len(self.sequences)
-        )
+        status = "Frame analysis completed ({tot} frames processed, {hits} " \
+                 "duplicates reused)".format(tot=len(self.sequences),
+                                             hits=self.hits)
         self.task.callback(self.sequences, status)
 
+    def analysis_failed(self, failure):
+        if not self.task.called:
+            self.task.errback(failure, "Frame analysis failed")
+        elif not failure.check(defer.CancelledError):
+            return failure
+
 
-class ObservableVideoReader(segmentation.VideoReader):
+class ObservableVideoReader(object):
+    """
+    Wraps a video reader to call ``callback`` with each frame it reads.
+    """
 
-    def __init__(self, callback, *args, **kwargs):
-        super(ObservableVideoReader, self).__init__(*args, **kwargs)
+    def __init__(self, reader, callback):
+        self.reader = reader
         self.callback = callback
 
-    def iterframes(self, *args, **kwargs):
-        iterator = super(ObservableVideoReader, self).iterframes(*args, **kwargs)
+    def __getattr__(self, name):
+        return getattr(self.reader, name)
 
-        for frame in iterator:
+    def iterframes(self, *args, **kwargs):
+        for frame in self.reader.iterframes(*args, **kwargs):
             self.callback(frame)
             yield frame
 
+    def getframe(self, number):
+        frame = self.reader.getframe(number)
+        self.callback(frame)
+        return frame
+
+
+def interleave(items):
+    """
+    Generator yielding all the items of the given list in an order spreading
+    them evenly: the first and middle items, then the quarters, the eighths,
+    and so on.
+    """
+    count = len(items)
+    step = 1
+
+    while step < count:
+        step *= 2
+
+    seen = set()
+
+    while step:
+        for i in xrange(0, count, step):
+            if i not in seen:
+                seen.add(i)
+                yield items[i]
+        step //= 2
+
+
+def _frame_data(frame):
+    """
+    Returns the image of the given frame as an array which can be sent to a
+    worker process, and closes the frame.
+    """
+    data = frame.data
+    frame.close()
+    return data
+
+
+def _detect_borders(images):
+    """
+    Worker process function for ``VideoCroppingTask``, returning the border
+    and the size of each of the given images data.
+    """
+    cropper = cropping.BorderCropper()
+    images = [Image.fromarray(data) for data in images]
+    return [(cropper.detect(image), image.size) for image in images]
+
+
+def _slide_features(filenames, cache=None, size=None, memory=None):
+    """
+    Worker process function for ``SlideAnalysisTask``, returning the features
+    vector of each of the given slide image files, fitted in ``size``. The
+    images are analyzed in batches using at most ``memory`` bytes if given.
+    """
+    def content(filename):
+        filenames = [filename]
+
+        # The vector of a fitted slide depends on its analysis copy too
+        copy = segmentation.analysis_copy(filename)
+        if size is not None and os.path.exists(copy):
+            filenames.append(copy)
+
+        contents = []
+        for name in filenames:
+            with open(name, 'rb') as fh:
+                contents.append(fh.read())
+        return contents
+
+    def load(filename):
+        return segmentation.load_slide(filename, size)
+
+    return _features(filenames, content, load, False, cache, memory, size)
+
+
+def _frame_features(images, cache=None, memory=None):
+    """
+    Worker process function for ``FrameAnalysisTask``, returning the features
+    vector of each of the given frame images data. The images are analyzed in
+    batches using at most ``memory`` bytes if given.
+    """
+    def content(data):
+        return repr(data.shape), numpy.ascontiguousarray(data)
+
+    # The features are extracted from the arrays directly
+    return _features(images, content, lambda data: data, True, cache, memory)
+
+
+def _features(items, content, load, low_quality, cache, memory=None,
+              size=None):
+    """
+    Returns the features vectors of the images loaded from ``items`` by the
+    ``load`` function, which fits them in ``size`` if given. The vectors
+    found in the cache (if any) under the key of the image ``content`` are
+    not computed again, and the computed ones are added to it.
+
+    The images are loaded as they are analyzed, in batches using at most
+    ``memory`` bytes (see ``identification.iterbatches``).
+    """
+    vectors = [None] * len(items)
+
+    if cache is not None:
+        keys = [cache.key(low_quality, size, *content(item))
+                for item in items]
+        vectors = [cache.get(key) for key in keys]
+
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+
+    loaded = ((i, load(items[i])) for i in missing)
+    size = lambda (i, image): identification.image_size(image)
+
+    for batch in identification.iterbatches(loaded, memory, size):
+        indexes, images = zip(*batch)
+        features = identification.gen_feature_vects(images, low_quality)
+        del images, batch
+
+        for i, vector in zip(indexes, features.tolist()):
+            vectors[i] = vector
+            if cache is not None:
+                cache.put(keys[i], vector)
+
+    return vectors
+
+
+def _dump_sequence(sequence):
+    """
+    Converts a sequence whose last frame was spilled to a raw file by a
+    ``FrameStore`` to a tuple which can be sent back from a worker process.
+    """
+    first, last = sequence.first_frame, sequence.last_frame
+    return (first.number, first.timestamp, last.number, last.timestamp,
+            last.store.spilled(last.key), sequence.score, sequence.unstable)
+
+
+def _load_sequence(dump, store):
+    """
+    Rebuilds a sequence from the output of ``_dump_sequence``, moving its last
+    frame to the given store.
+    """
+    first_num, first_ts, last_num, last_ts, spilled, score, unstable = dump
+
+    sequence = segmentation.Sequence(
+        segmentation.Frame(first_num, first_ts, None),
+        score
+    )
+    sequence.last_frame = segmentation.Frame.fromstore(last_num, last_ts,
+                                                       store,
+                                                       store.adopt(*spilled))
+    sequence.unstable = unstable
+
+    return sequence
+
+
+def _segment_chunk(ranges, video_file, directory, region, reader_class):
+    """
+    Worker process function for ``VideoSegmentationTask.segment_parallel``.
+    Segments a single range of the video, spills the last frame of each
+    retained sequence to a raw file in ``directory`` and returns them in the
+    format of ``segmentation.segment_range``, with each sequence encoded by
+    ``_dump_sequence``. The change detection is restricted to ``region`` if
+    given.
+    """
+    frames_range, = ranges
+
+    with utils.discard(sys.stderr, 2):
+        with utils.discard(1):
+            reader = reader_class(video_path=video_file)
+        segmenter = segmentation.VideoSegmenter(reader)
+        segmenter.region = region
+        continuation, sequences = segmentation.segment_range(segmenter,
+                                                             *frames_range)
+
+    store = framestore.FrameStore(memory=0, directory=directory)
+
+    if continuation is not None:
+        continuation.last_frame.keep(store)
+        continuation = _dump_sequence(continuation)
+
+    for sequence in sequences:
+        sequence.last_frame.keep(store)
+
+    return [(continuation, [_dump_sequence(seq) for seq in sequences])]
@@ -0,0 +1,452 @@
+"""
+Test suite for the slides alignment of the smaclib.modules.analyzer.alignment
+module.
+"""
+
+
+import itertools
+
+import blist
+import numpy
+
+from twisted.internet import defer
+from twisted.internet import reactor
+from twisted.internet import threads
+from twisted.trial import unittest
+
+from smaclib import workers
+from smaclib.modules.analyzer import alignment
+from smaclib.modules.analyzer import identification
+from smaclib.modules.analyzer import slideindex
+from smaclib.modules.analyzer.benchmarks import synthetic
+
+
+class CandidatesTest(unittest.TestCase):
+
+    def reference_candidates(self, sequence, slides):
+        """
+        Ranks the candidates of a sequence as the per-pair implementation did.
+        """
+        scores = [(identification.get_diff_score(slide.features,
+                                                 sequence.end_frame.features),
+                   slide) for slide in slides]
+        scores.sort(key=lambda c: c[0])
+
+        best, second_best = scores[0][0], scores[1][0]
+        take = lambda c: (c[0] - best) / best \
+                         <= sequence.missing_max_confidence
+        candidates = [s for _, s in itertools.takewhile(take, scores)]
+
+        return candidates, (second_best - best) / best, best
+
+    def test_get_sequences(self):
+        for noise in (0.5, 2.0, 5.0):
+            sequences, slides = synthetic.lecture(noise=noise)
+            ident = alignment.Identification(sequences, slides)
+
+            for sequence in ident.get_sequences(sequences, slides):
+                candidates, confidence, best = self.reference_candidates(
+                    sequence, slides)
+
+                self.assertEqual(sequence.candidates, candidates)
+                self.assertEqual(sequence.confidence, confidence)
+                self.assertEqual(sequence.best_score, best)
+
+    def test_get_sequences_index(self):
+        for noise in (0.5, 2.0, 5.0):
+            sequences, slides = synthetic.lecture(noise=noise)
+            index = slideindex.SlideIndex([s.features for s in slides])
+            ident = alignment.Identification(sequences, slides, index=index)
+
+            for sequence in ident.get_sequences(sequences, slides):
+                candidates, confidence, best = self.reference_candidates(
+                    sequence, slides)
+
+                self.assertEqual(sequence.candidates, candidates)
+                self.assertEqual(sequence.confidence, confidence)
+                self.assertEqual(sequence.best_score, best)
+
+    def test_get_sequences_index_margin(self):
+        """
+        The index search covers the candidates margin of the sequences
+        actually aligned, which a subclass may widen.
+        """
+        class WideSequence(alignment.Sequence):
+            __slots__ = ()
+            missing_max_confidence = 0.6
+
+        class RecordingIndex(slideindex.SlideIndex):
+            def get_diff_matrix(self, queries, margin, nearest=2):
+                margins.append(margin)
+                return slideindex.SlideIndex.get_diff_matrix(
+                    self, queries, margin, nearest)
+
+        margins = []
+        sequences, slides = synthetic.lecture(noise=2.0)
+        sequences = [WideSequence(seq.start_frame, seq.end_frame)
+                     for seq in sequences]
+        index = RecordingIndex([s.features for s in slides])
+
+        ident = alignment.Identification(sequences, slides, index=index)
+        ident.get_sequences(sequences, slides)
+
+        online = alignment.OnlineIdentification(slides, ident)
+        online.add(sequences[0])
+
+        self.assertEqual(margins, [0.6, 0.6])
+
+    def test_get_sequences_band(self):
+        for noise in (0.5, 2.0, 5.0):
+            sequences, slides = synthetic.lecture(200, 600, noise=noise)
+
+            ident = alignment.Identification(sequences, slides)
+            ident.get_sequences(sequences, slides)
+            expected = [(seq.candidates[0], seq.best_score)
+                        for seq in sequences]
+
+            # The confidences differ as the second best slide may lie outside
+            # the band, the best matches do not.
+            ident.band = 3
+            ident.get_sequences(sequences, slides)
+
+            self.assertEqual([(seq.candidates[0], seq.best_score)
+                              for seq in sequences], expected)
+
+            computed = numpy.isfinite([seq._scores for seq in sequences])
+            self.assertTrue(computed.mean() < 0.1)
+
+    def test_exact_match(self):
+        """
+        Tests that a null best score makes an infinitely confident match,
+        unless another slide matches exactly too.
+        """
+        sequences, slides = synthetic.lecture(noise=0.0)
+        slides = list(slides)
+
+        with numpy.errstate(all='raise'):
+            ident = alignment.Identification(sequences, slides)
+            ident.get_sequences(sequences, slides)
+
+            for sequence in sequences:
+                self.assertEqual(sequence.confidence, numpy.inf)
+                self.assertEqual(len(sequence.candidates), 1)
+                self.assertEqual(sequence.best_score, 0.0)
+                self.assertTrue(sequence.keep())
+
+            matches = ident.identify()
+
+        self.assertTrue(len(matches))
+
+        sequence = list(sequences)[0]
+        scores = numpy.array([0.0, 0.0, 5.0])
+        sequence.set_scores(slides[:3], scores)
+
+        self.assertEqual(sequence.confidence, 0.0)
+        self.assertEqual(sequence.candidates, slides[:2])
+
+
+class IdentificationTaskTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = workers.WorkerPool(1)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_cancel_before_start(self):
+        ident = alignment.Identification(*synthetic.lecture(), pool=self.pool)
+        task = ident.getTask()
+        task.cancel()
+
+        return self.assertFailure(task, defer.CancelledError)
+
+    def test_cancel_while_identifying(self):
+        sequences, slides = synthetic.lecture()
+        ident = alignment.Identification(sequences, slides, self.pool)
+        identify = ident.identify
+
+        def cancel(scores):
+            threads.blockingCallFromThread(reactor, ident.getTask().cancel)
+            return identify(scores)
+
+        ident.identify = cancel
+
+        # The runner has to complete quietly, the task being already fired
+        started = ident.start()
+        cancelled = self.assertFailure(ident.getTask(), defer.CancelledError)
+
+        return defer.gatherResults([started, cancelled])
+
+
+class BaseMatchesTest(unittest.TestCase):
+
+    def reference_path(self, sequences):
+        """
+        The original memoized recursive search of the best path, with ties
+        broken in favour of the first sequence and of the best candidate.
+        """
+        results = {}
+        sequences = list(sequences)
+
+        def get_path(index, slide):
+            if (index, slide.id) in results:
+                return results[index, slide.id]
+
+            max_confidence = 0
+            best_moves = []
+
+            for test_index in xrange(index + 1, len(sequences)):
+                for test_slide in sequences[test_index].candidates:
+                    if test_slide.id <= slide.id:
+                        continue
+
+                    confidence, moves = get_path(test_index, test_slide)
+
+                    if confidence > max_confidence:
+                        max_confidence = confidence
+                        best_moves = moves
+
+            moves = [(sequences[index].id, slide.id)] + best_moves
+            confidence = max_confidence + sequences[index].confidence
+            results[index, slide.id] = (confidence, moves)
+
+            return results[index, slide.id]
+
+        best = None
+        for index, sequence in enumerate(sequences):
+            for slide in sequence.candidates:
+                path = get_path(index, slide)
+                if best is None or path[0] > best[0]:
+                    best = path
+
+        return best[1]
+
+    def test_same_path(self):
+        for seed in xrange(4):
+            for noise in (1.0, 4.0, 8.0):
+                sequences, slides = synthetic.lecture(sequences_count=60,
+                                                      noise=noise, seed=seed)
+                ident = alignment.Identification(sequences, slides)
+                sequences = ident.get_sequences(sequences, slides)
+
+                expected = self.reference_path(sequences)
+                matches = ident.get_base_matches(sequences)
+
+                self.assertEqual([(m.sequence.id, m.slide.id)
+                                  for m in matches], expected)
+
+                for match in matches:
+                    self.assertIdentical(match.sequence.assigned_slide,
+                                         match.slide)
+                    self.assertIdentical(match.slide.assigned_to,
+                                         match.sequence)
+
+
+class MergeRemnantTest(unittest.TestCase):
+
+    def setUp(self):
+        self.slides = [alignment.Slide(i) for i in xrange(4)]
+        self.ident = alignment.Identification()
+
+    def match(self, first, last, slide, base=True):
+        sequence = alignment.Sequence(alignment.Frame(first),
+                                      alignment.Frame(last))
+        return alignment.Match(sequence, self.slides[slide], base)
+
+    def merge(self, matches, extra_matches):
+        matches = blist.sortedset(matches)
+        self.ident.merge_remnant_sequences(matches,
+                                           blist.sortedset(extra_matches))
+        return [(m.sequence.start_frame.num, m.slide.id) for m in matches]
+
+    def test_inserted(self):
+        """
+        The remnant matches showing the slide of a neighbouring match are
+        added to the sorted set of matches.
+        """
+        matches = [self.match(1, 100, 1), self.match(201, 300, 2),
+                   self.match(401, 500, 3)]
+        extra = [self.match(101, 200, 2, False),
+                 self.match(301, 400, 0, False),
+                 self.match(501, 600, 3, False)]
+
+        self.assertEqual(self.merge(matches, extra),
+                         [(1, 1), (101, 2), (201, 2), (401, 3), (501, 3)])
+
+    def test_before_first(self):
+        matches = [self.match(101, 200, 1), self.match(201, 300, 2)]
+        extra = [self.match(1, 100, 1, False), self.match(21, 50, 3, False)]
+
+        self.assertEqual(self.merge(matches, extra),
+                         [(1, 1), (101, 1), (201, 2)])
+
+    def test_overlapping(self):
+        """
+        The remnant matches ending before the end of the extended previous
+        match are ignored, whatever the memory addresses of the frames.
+        """
+        for _ in xrange(10):
+            matches = [self.match(1, 100, 1), self.match(401, 500, 2)]
+            matches[0].extended = alignment.Frame(300)
+            extra = [self.match(101, 300, 2, False),
+                     self.match(301, 400, 2, False)]
+
+            self.assertEqual(self.merge(matches, extra),
+                             [(1, 1), (301, 2), (401, 2)])
+
+
+class FrameTableTest(unittest.TestCase):
+
+    def setUp(self):
+        random = numpy.random.RandomState(0)
+        self.features = random.rand(5, identification.FEATURES_LENGTH)
+        self.firsts = alignment.FrameTable([1, 51, 26, 76, 101], framerate=5.)
+        self.lasts = alignment.FrameTable([50, 75, 25, 100, 120],
+                                          self.features, 5.)
+
+    def test_views(self):
+        frame = self.lasts.frame(2)
+
+        self.assertEqual(frame.num, 25)
+        self.assertEqual(frame.timestamp,
+                         alignment.Frame(25, None, 5.).timestamp)
+        self.assertEqual(frame.timestamp, self.lasts.timestamps[2])
+        self.assertEqual(frame.features.tolist(), self.features[2].tolist())
+        self.assertTrue(numpy.may_share_memory(frame.features,
+                                               self.lasts.features))
+
+        self.assertIdentical(self.firsts.frame(0).features, None)
+
+        frame.features = [1.0, 2.0]
+        self.assertEqual(frame.features, [1.0, 2.0])
+        self.assertEqual(self.lasts.features[2].tolist(),
+                         self.features[2].tolist())
+
+    def test_sequences(self):
+        sequences = alignment.sequences_fromtables(
+            self.firsts, self.lasts, [False, True, False, False, True])
+
+        self.assertEqual([seq.id for seq in sequences], [25, 50, 75, 100, 120])
+        self.assertEqual([seq.start_frame.num for seq in sequences],
+                         [26, 1, 51, 76, 101])
+        self.assertEqual([seq.unstable for seq in sequences],
+                         [False, False, True, False, True])
+        self.assertEqual(sequences[0].end_frame.features.tolist(),
+                         self.features[2].tolist())
+
+    def test_sub(self):
+        frame = self.lasts.frame(2)
+
+        self.assertEqual((frame - 5).num, 20)
+        self.assertEqual((frame - self.firsts.frame(0)).num, 24)
+        self.assertEqual((frame - 5).framerate, 5.)
+        self.assertIdentical((frame - 5).features, None)
+
+    def test_slots(self):
+        sequence = alignment.Sequence(self.firsts.frame(0),
+                                      self.lasts.frame(0))
+        self.assertRaises(AttributeError, setattr, sequence, 'extra', None)
+        self.assertRaises(AttributeError, setattr, sequence.end_frame,
+                          'extra', None)
+
+
+class OnlineIdentificationTest(unittest.TestCase):
+
+    def pairs(self, matches):
+        return [(m.sequence.id, m.slide.id) for m in matches]
+
+    def batch(self, seed, noise, count=80):
+        sequences, slides = synthetic.lecture(sequences_count=count,
+                                              noise=noise, seed=seed)
+        ident = alignment.Identification(sequences, slides)
+        base = ident.get_base_matches(ident.get_sequences(sequences, slides))
+        base = self.pairs(base)
+
+        sequences, slides = synthetic.lecture(sequences_count=count,
+                                              noise=noise, seed=seed)
+        ident = alignment.Identification(sequences, slides)
+        final = [(m.sequence.id, m.slide.id, m.sequence.start_frame.num,
+                  m.sequence.end_frame.num) for m in ident.identify()]
+
+        return base, final
+
+    def test_converges(self):
+        for seed in xrange(4):
+            for noise in (1.0, 4.0, 8.0):
+                base, final = self.batch(seed, noise)
+
+                sequences, slides = synthetic.lecture(noise=noise, seed=seed)
+                online = alignment.OnlineIdentification(slides)
+
+                for sequence in sequences:
+                    matches = online.add(sequence)
+
+                self.assertEqual(self.pairs(matches), base)
+                self.assertEqual([(m.sequence.id, m.slide.id,
+                                   m.sequence.start_frame.num,
+                                   m.sequence.end_frame.num)
+                                  for m in online.finish()], final)
+
+    def test_ties(self):
+        """
+        Equally confident chains are broken in favour of the first sequence,
+        as in the batch base matches.
+        """
+        def lecture():
+            sequences, slides = synthetic.lecture(sequences_count=2)
+            first, second = sequences
+            second.end_frame.features = numpy.array(first.end_frame.features)
+            return sequences, slides
+
+        sequences, slides = lecture()
+        ident = alignment.Identification(sequences, slides)
+        base = ident.get_base_matches(ident.get_sequences(sequences, slides))
+
+        sequences, slides = lecture()
+        online = alignment.OnlineIdentification(slides)
+
+        for sequence in sequences:
+            matches = online.add(sequence)
+
+        self.assertEqual(sequences[0].confidence, sequences[1].confidence)
+        self.assertEqual(self.pairs(matches), self.pairs(base))
+        self.assertEqual([m.sequence.id for m in matches], [sequences[0].id])
+
+    def test_provisional(self):
+        """
+        The provisional matches are the base matches of the sequences added
+        so far.
+        """
+        sequences, slides = synthetic.lecture(noise=4.0, seed=1)
+        online = alignment.OnlineIdentification(slides)
+
+        for count, sequence in enumerate(sequences, 1):
+            matches = online.add(sequence)
+
+            if count % 20:
+                continue
+
+            base, _ = self.batch(1, 4.0, count)
+            self.assertEqual(self.pairs(matches), base)
+
+            for match in matches:
+                self.assertIdentical(match.sequence.assigned_slide, None)
+
+    def test_index(self):
+        sequences, slides = synthetic.lecture(noise=2.0)
+        index = slideindex.SlideIndex([s.features for s in slides])
+        ident = alignment.Identification(index=index)
+        online = alignment.OnlineIdentification(slides, ident)
+
+        for sequence in sequences:
+            matches = online.add(sequence)
+
+        self.assertEqual(self.pairs(matches), self.batch(0, 2.0)[0])
+
+    def test_order(self):
+        sequences, slides = synthetic.lecture(sequences_count=3)
+        online = alignment.OnlineIdentification(slides)
+
+        online.add(sequences[1])
+        self.assertRaises(ValueError, online.add, sequences[0])
+        self.assertRaises(ValueError, online.add, sequences[1])
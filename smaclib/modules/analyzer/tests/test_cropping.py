@@ -0,0 +1,87 @@
+"""
+Test suite for the border detection of the smaclib.modules.analyzer.cropping
+module.
+"""
+
+
+import numpy
+import Image
+
+from twisted.trial import unittest
+
+from smaclib.modules.analyzer import cropping
+
+
+def bordered_frame(border, size=(160, 120), seed=0):
+    """
+    Returns a noisy dark frame whose ``(left, top, right, bottom)`` area is
+    filled with bright content.
+    """
+    random = numpy.random.RandomState(seed)
+    data = random.randint(0, 20, (size[1], size[0], 3))
+
+    left, top, right, bottom = border
+    area = data[top:bottom + 1, left:right + 1]
+    area[...] = random.randint(120, 256, area.shape)
+
+    return Image.fromarray(data.astype(numpy.uint8))
+
+
+class BorderCropperTest(unittest.TestCase):
+
+    def reference_border(self, cropper, image):
+        """
+        Border found by walking the pixels from each side.
+        """
+        image = image.filter(cropper.image_filter)
+        pixels = image.load()
+
+        top = cropper.process_side(pixels, image.size, cropping.TOP_DOWN)[1]
+        bottom = cropper.process_side(pixels, image.size,
+                                      cropping.BOTTOM_UP)[1]
+
+        if top > bottom:
+            return None
+
+        left = cropper.process_side(pixels, image.size, cropping.LTR)[0]
+        right = cropper.process_side(pixels, image.size, cropping.RTL)[0]
+
+        return left, top, right, bottom
+
+    def test_same_as_pixel_walk(self):
+        cropper = cropping.BorderCropper()
+        borders = [(15, 8, 144, 111), (0, 0, 159, 119), (20, 15, 100, 60)]
+
+        for seed, border in enumerate(borders):
+            image = bordered_frame(border, seed=seed)
+            self.assertEqual(cropper.process(image),
+                             self.reference_border(cropper, image))
+
+    def test_black_frame(self):
+        cropper = cropping.BorderCropper()
+        image = Image.new('RGB', (160, 120))
+
+        self.assertEqual(cropper.process(image), None)
+        self.assertEqual(self.reference_border(cropper, image), None)
+        self.assertEqual(len(cropper.borders), 0)
+
+    def test_convergence(self):
+        cropper = cropping.BorderCropper()
+        cropper.convergence_samples = 5
+
+        for seed in xrange(4):
+            cropper.process(bordered_frame((15, 8, 144, 111), seed=seed))
+            self.assertFalse(cropper.converged)
+
+        cropper.process(bordered_frame((15, 8, 144, 111), seed=5))
+
+        self.assertTrue(cropper.converged)
+        self.assertEqual(cropper.compute_border(), (15, 8, 144, 111))
+
+    def test_never_converges(self):
+        cropper = cropping.BorderCropper()
+
+        for seed in xrange(10):
+            cropper.process(bordered_frame((15, 8, 144, 111), seed=seed))
+
+        self.assertFalse(cropper.converged)
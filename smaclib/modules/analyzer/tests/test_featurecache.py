@@ -0,0 +1,200 @@
+"""
+Test suite for the features vectors cache of the
+smaclib.modules.analyzer.featurecache module.
+"""
+
+
+import os
+
+import numpy
+
+from twisted.trial import unittest
+
+from smaclib.modules.analyzer import featurecache
+from smaclib.modules.analyzer import identification
+from smaclib.modules.analyzer import segmentation
+from smaclib.modules.analyzer import tasks
+from smaclib.modules.analyzer.tests.test_identification import synthetic_image
+
+
+def vector(seed):
+    random = numpy.random.RandomState(seed)
+    return random.rand(identification.FEATURES_LENGTH).tolist()
+
+
+class FeatureCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = featurecache.FeatureCache(self.mktemp())
+
+    def test_key(self):
+        key = self.cache.key(False, None, 'content')
+
+        self.assertEqual(key, self.cache.key(False, None, 'content'))
+        self.assertNotEqual(key, self.cache.key(True, None, 'content'))
+        self.assertNotEqual(key, self.cache.key(False, None, 'other content'))
+        self.assertNotEqual(key, self.cache.key(False, (640, 480), 'content'))
+        self.assertEqual(self.cache.key(False, [640, 480], 'content'),
+                         self.cache.key(False, (640, 480), 'content'))
+
+        self.patch(identification, 'GRADIENT_THRESOLD',
+                   identification.GRADIENT_THRESOLD + 1)
+        self.assertNotEqual(key, self.cache.key(False, None, 'content'))
+
+    def test_version(self):
+        key = self.cache.key(False, None, 'content')
+
+        self.patch(identification, 'FEATURES_VERSION',
+                   identification.FEATURES_VERSION + 1)
+        self.assertNotEqual(key, self.cache.key(False, None, 'content'))
+
+    def test_get_put(self):
+        key = self.cache.key(False, None, 'content')
+
+        self.assertEqual(self.cache.get(key), None)
+
+        self.cache.put(key, vector(0))
+        self.assertEqual(self.cache.get(key), vector(0))
+
+        self.cache.put(key, vector(1))
+        self.assertEqual(self.cache.get(key), vector(1))
+
+    def test_trim(self):
+        """
+        Tests that the least recently used vectors are evicted first.
+        """
+        keys = [self.cache.key(False, None, str(i)) for i in xrange(4)]
+
+        for i, key in enumerate(keys):
+            self.cache.put(key, vector(i))
+            os.utime(self.cache.path(key), (i, i))
+
+        # Reading an entry marks it as recently used
+        self.cache.get(keys[0])
+
+        self.cache.size = identification.FEATURES_LENGTH * 8 * 2
+        self.cache.trim()
+
+        self.assertEqual(self.cache.get(keys[0]), vector(0))
+        self.assertEqual(self.cache.get(keys[1]), None)
+        self.assertEqual(self.cache.get(keys[2]), None)
+        self.assertEqual(self.cache.get(keys[3]), vector(3))
+
+    def test_trim_pending_writes(self):
+        """
+        Tests that the files still being written by ``put`` are not evicted.
+        """
+        key = self.cache.key(False, None, 'content')
+        self.cache.put(key, vector(0))
+
+        directory = os.path.dirname(self.cache.path(key))
+        temp = os.path.join(directory, self.cache.temp_prefix + 'pending')
+        numpy.asarray(vector(1)).tofile(temp)
+        os.utime(temp, (0, 0))
+
+        self.cache.size = 0
+        self.cache.trim()
+
+        self.assertTrue(os.path.exists(temp))
+        self.assertEqual(self.cache.get(key), None)
+
+        os.rename(temp, self.cache.path(key))
+        self.assertEqual(self.cache.get(key), vector(1))
+
+
+
+class CachedFeaturesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = featurecache.FeatureCache(self.mktemp())
+        self.images = [numpy.asarray(synthetic_image(64, 48, seed))
+                       for seed in xrange(3)]
+
+    def test_batches(self):
+        """
+        Tests that the images of a chunk analyzed in memory bounded batches
+        get the same features vectors as when analyzed at once.
+        """
+        expected = tasks._frame_features(self.images)
+        memory = identification.batch_memory((64, 48)) * 2
+
+        self.patch(identification, 'gen_feature_vects',
+                   self.counted(identification.gen_feature_vects))
+        self.assertEqual(tasks._frame_features(self.images, None, memory),
+                         expected)
+        self.assertEqual(self.batches, [2, 1])
+
+    def counted(self, function):
+        self.batches = []
+
+        def wrapper(images, *args):
+            self.batches.append(len(images))
+            return function(images, *args)
+
+        return wrapper
+
+    def test_frame_features(self):
+        """
+        Tests that cached vectors are not computed again.
+        """
+        expected = tasks._frame_features(self.images)
+
+        self.assertEqual(tasks._frame_features(self.images, self.cache),
+                         expected)
+
+        def fail(images, low_quality):
+            self.fail("Features vectors computed again")
+
+        self.patch(identification, 'gen_feature_vects', fail)
+
+        self.assertEqual(tasks._frame_features(self.images, self.cache),
+                         expected)
+
+    def test_quality(self):
+        """
+        Tests that the vectors of slides and frames are cached separately.
+        """
+        frames = tasks._frame_features(self.images, self.cache)
+
+        filenames = []
+
+        for i, data in enumerate(self.images):
+            filenames.append(self.mktemp() + '.png')
+            synthetic_image(64, 48, i).save(filenames[-1])
+
+        slides = tasks._slide_features(filenames, self.cache)
+
+        self.assertNotEqual(slides, frames)
+        self.assertEqual(slides, tasks._slide_features(filenames))
+
+    def test_analysis_size(self):
+        """
+        Tests that the vectors of slides fitted in different sizes are cached
+        separately.
+        """
+        filenames = []
+
+        for i, data in enumerate(self.images):
+            filenames.append(self.mktemp() + '.png')
+            synthetic_image(64, 48, i).save(filenames[-1])
+
+        full = tasks._slide_features(filenames, self.cache)
+        fitted = tasks._slide_features(filenames, self.cache, (32, 24))
+
+        self.assertNotEqual(fitted, full)
+        self.assertEqual(fitted, tasks._slide_features(filenames, None,
+                                                       (32, 24)))
+
+        # A new analysis copy is decoded instead of the cached full image
+        for i, filename in enumerate(filenames):
+            copy = segmentation.analysis_copy(filename)
+            if not os.path.isdir(os.path.dirname(copy)):
+                os.makedirs(os.path.dirname(copy))
+            synthetic_image(32, 24, i + 1).save(copy)
+
+        copies = tasks._slide_features(filenames, self.cache, (32, 24))
+
+        self.assertNotEqual(copies, fitted)
+        self.assertEqual(copies, tasks._slide_features(filenames, None,
+                                                       (32, 24)))
+        self.assertEqual(full, tasks._slide_features(filenames, self.cache))
@@ -0,0 +1,126 @@
+"""
+Test suite for the smaclib.modules.analyzer.framestore module.
+"""
+
+
+import os
+
+import numpy
+import Image
+
+from twisted.trial import unittest
+
+from smaclib.modules.analyzer import framestore
+from smaclib.modules.analyzer import segmentation
+
+
+def image(seed, size=(64, 48), mode='RGB'):
+    random = numpy.random.RandomState(seed)
+    shape = (size[1], size[0], 3) if mode == 'RGB' else (size[1], size[0])
+    return Image.fromarray(random.randint(0, 256, shape).astype(numpy.uint8))
+
+
+class FrameStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        # Room for two 64x48 RGB images
+        self.store = framestore.FrameStore(memory=2 * 64 * 48 * 3)
+
+    def tearDown(self):
+        self.store.clear()
+
+    def assertSameImage(self, actual, expected):
+        self.assertEqual(actual.mode, expected.mode)
+        self.assertEqual(actual.size, expected.size)
+        self.assertTrue(numpy.array_equal(numpy.asarray(actual),
+                                          numpy.asarray(expected)))
+
+    def test_memory_and_spill(self):
+        images = [image(i) for i in xrange(4)]
+        keys = [self.store.put(img) for img in images]
+
+        self.assertEqual(len(self.store), 4)
+        self.assertEqual(self.store.used, 2 * 64 * 48 * 3)
+        self.assertEqual(self.store.spilled(keys[0]), None)
+        self.assertNotEqual(self.store.spilled(keys[3]), None)
+
+        for key, img in zip(keys, images):
+            self.assertSameImage(self.store.get(key), img)
+
+    def test_grayscale(self):
+        self.store.memory = 0
+        img = image(0, mode='L')
+        self.assertSameImage(self.store.get(self.store.put(img)), img)
+
+    def test_lazy_image(self):
+        """
+        An image opened from a file is loaded when stored, so that the stored
+        image does not depend on its source anymore.
+        """
+        filename = self.mktemp()
+        image(0).save(filename, 'PNG')
+        img = Image.open(filename)
+        key = self.store.put(img)
+
+        image(1, size=(8, 8)).save(filename, 'PNG')
+
+        self.assertSameImage(self.store.get(key), image(0))
+        self.assertEqual(self.store.used, 64 * 48 * 3)
+
+    def test_replace_and_remove(self):
+        key = self.store.put(image(0))
+        self.store.put(image(1), key)
+
+        self.assertEqual(len(self.store), 1)
+        self.assertSameImage(self.store.get(key), image(1))
+
+        self.store.remove(key)
+
+        self.assertEqual(len(self.store), 0)
+        self.assertEqual(self.store.used, 0)
+        self.assertFalse(key in self.store)
+
+    def test_adopt(self):
+        worker = framestore.FrameStore(memory=0,
+                                       directory=self.store.directory)
+        spilled = worker.spilled(worker.put(image(0)))
+
+        key = self.store.adopt(*spilled)
+
+        self.assertSameImage(self.store.get(key), image(0))
+
+        self.store.remove(key)
+        self.assertFalse(os.path.exists(spilled[0]))
+
+    def test_clear(self):
+        self.store.memory = 0
+        self.store.put(image(0))
+        directory = self.store.directory
+
+        self.store.clear()
+
+        self.assertEqual(len(self.store), 0)
+        self.assertFalse(os.path.exists(directory))
+
+
+class StoredFrameTest(unittest.TestCase):
+
+    def test_keep(self):
+        store = framestore.FrameStore(memory=0)
+        self.addCleanup(store.clear)
+
+        frame = segmentation.Frame(1, 0.0, image(0))
+        frame.keep(store)
+
+        self.assertEqual(len(store), 1)
+        self.assertEqual(frame.image.size, (64, 48))
+
+        frame.image = frame.image.crop((0, 0, 32, 24))
+        frame.keep()
+
+        self.assertEqual(len(store), 1)
+        frame.close()
+        self.assertEqual(frame.image.size, (32, 24))
+
+        frame.delete()
+        self.assertEqual(len(store), 0)
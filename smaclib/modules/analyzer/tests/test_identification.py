@@ -0,0 +1,365 @@
+"""
+Test suite for the feature vector extraction of the
+smaclib.modules.analyzer.identification module.
+"""
+
+
+import numpy
+import Image
+import ImageFilter
+from convolve import convolve2d
+
+from twisted.trial import unittest
+
+from smaclib.modules.analyzer import identification
+
+
+def synthetic_image(width, height, seed=0):
+    """
+    Builds a deterministic RGB image made of noise and a few solid shapes, so
+    that both horizontal and vertical edges are present.
+    """
+    random = numpy.random.RandomState(seed)
+    data = (random.rand(height, width, 3) * 64).astype(numpy.uint8)
+    data[height // 5:height // 3, width // 8:width // 2] = 255
+    data[height // 2:, width // 2:width // 2 + 7] = 200
+    return Image.fromarray(data)
+
+
+def filter_edges(hm, vm, directions, edges, index, width, height):
+    """
+    Drops the edge at the ``index`` linearized pixel position from ``edges``
+    if its magnitude is below the gradient threshold.
+    """
+    # Get the edge direction.
+    dir = directions[index]
+    # Translate the index into polar coordinates.
+    x = index % width
+    y = index / width
+    # If the edge magnitude is superior to the gradient thresold:
+    if((not dir and hm[y][x] < identification.GRADIENT_THRESOLD) or (dir and
+            vm[y][x] < identification.GRADIENT_THRESOLD)):
+        edges[index] = False
+
+
+def gen_feature_vect_loop(img, low_quality=False):
+    """
+    Original, pixel by pixel, implementation of
+    ``identification.gen_feature_vect``, used as the reference of the golden
+    output test and by the features benchmark.
+    """
+    # If the image is from a low-quality source, we first try to sharpen its
+    # its edges.
+    if low_quality:
+        img = img.filter(ImageFilter.SHARPEN)
+
+    # Convert to grayscale with respect to the image luminosity, by doing a
+    # Luma conversion.
+    # See: http://www.pythonware.com/library/pil/handbook/image.htm
+    img = img.convert("L")
+    width = img.size[0]
+    height = img.size[1]
+    # The image nb of pixels.
+    pixel_nb  = width * height
+    # The data structure returned by the Image module is a 1-D shape, we
+    # have to transform it to a 2D-matrix.
+    m = numpy.reshape(img.getdata(), (height, width))
+    # Proceed with the convolution to extract edge magnitues.
+    hm = convolve2d(m, identification.gx).tolist()
+    vm = convolve2d(m, identification.gy).tolist()
+    # This boolean matrix will describe edge direction for each pixel. True
+    # means a vertical edge, and False a horizontal edge.
+    directions = [False] * pixel_nb
+    # This boolean matrix describe which pixels are considered as edge (True
+    # if it's the case, false otherwise). At the beginning, we consider that
+    # ALL pixels are potential edges.
+    edges = [True] * pixel_nb
+    # Variable representing a linarized version of polar coordinates.
+    index = 0
+
+    # We first define the edge direction for every pixel in the image.
+    for y in xrange(0, height):
+      for x in xrange(0, width):
+        index = y * width + x
+        # The greather (vertical or horizontal) edge magnitude defines the
+        # edge direction.
+        if(hm[y][x] < vm[y][x]):
+            directions[index] = True
+        continue
+
+    # Filter the edges.
+    for index in xrange(0, pixel_nb):
+        filter_edges(hm, vm, directions, edges, index, width, height)
+
+    # Width of partitionned columns.
+    cell_w = width / identification.N
+
+    # Height of partitionned lines.
+    cell_h = height / identification.M
+
+    # Contains the sum of the vertical edge magnitudes from the partitionned
+    # image.
+    vert_em = []
+    # For every cell of the partitionned image:
+    for m in range(0, identification.M):
+        # Temporary variable. Used to build each line of vert_em.
+        em_entry = []
+        for n in range(0, identification.N):
+            # Compute the sum of the edge magnitudes.
+            total_em = 0
+            for y in xrange(m * cell_h, m * cell_h + cell_h):
+                for x in xrange(n * cell_w, n * cell_w + cell_w):
+                    index = y * width + x
+                    if(directions[index] and edges[index]):
+                        total_em += vm[y][x]
+            # Append the normalized sum to the result.
+            em_entry.append((1.0/(cell_w *  cell_h)) * total_em)
+        vert_em.append(em_entry)
+
+    # Contains the sum of the horizontal edge magnitudes from the partitionned
+    # image.
+    hor_em = []
+    # For every cell of the partitionned image:
+    for m in range(0, identification.M):
+        # Temporary variable. Used to build each line of hor_em.
+        em_entry = []
+        for n in range(0, identification.N):
+            # Compute the sum of the edge magnitudes.
+            total_em = 0
+            for y in xrange(m * cell_h, m * cell_h + cell_h):
+                for x in xrange(n * cell_w, n * cell_w + cell_w):
+                    index = y * width + x
+                    if (not directions[index]) and edges[index]:
+                        total_em += hm[y][x]
+            # Append the normalized sum to the result.
+            em_entry.append((1.0/(cell_w * cell_h)) * total_em)
+        hor_em.append(em_entry)
+
+    # The feature vector of the image.
+    F = []
+    # The two global feature (the sum of all edge magnitudes).
+    vert_gm = 0
+    hor_gm = 0
+    for m in range(0, identification.M):
+        for n in range(0, identification.N):
+            hm = hor_em[m][n]
+            vm = vert_em[m][n]
+            vert_gm += vm
+            hor_gm += hm
+            F.append(hm)
+            F.append(vm)
+    factor = 1.0/(identification.M*identification.N)
+    # Normalize the global features and add them to the vector.
+    F.append(hor_gm * factor)
+    F.append(vert_gm * factor)
+    # Return the feature vector.
+    return F
+
+
+class FeatureVectorTest(unittest.TestCase):
+
+    sizes = [(130, 97), (333, 250), (640, 480)]
+
+    def test_length(self):
+        features = identification.gen_feature_vect(synthetic_image(320, 240))
+        self.assertEqual(len(features), identification.N * identification.M
+                                        * 2 + 2)
+
+    def test_blank_image(self):
+        image = Image.new('RGB', (320, 240), (255, 255, 255))
+        features = identification.gen_feature_vect(image)
+        self.assertEqual(features, [0.0] * len(features))
+
+    def test_golden_output(self):
+        """
+        The vectorized implementation has to return the same feature vector as
+        the reference pixel by pixel implementation.
+        """
+        for seed, (width, height) in enumerate(self.sizes):
+            image = synthetic_image(width, height, seed)
+
+            for low_quality in (False, True):
+                expected = gen_feature_vect_loop(image, low_quality)
+                actual = identification.gen_feature_vect(image, low_quality)
+
+                self.assertEqual(len(actual), len(expected))
+                for a, e in zip(actual, expected):
+                    self.assertAlmostEqual(a, e, places=7)
+
+
+class BatchFeatureVectorTest(unittest.TestCase):
+
+    def test_same_as_single(self):
+        """
+        Batched extraction of images of mixed sizes returns, row by row and in
+        the original order, the same vectors as the single image extraction.
+        """
+        images = [synthetic_image(160, 120, 1), synthetic_image(200, 150, 2),
+                  synthetic_image(160, 120, 3)]
+
+        for low_quality in (False, True):
+            features = identification.gen_feature_vects(images, low_quality)
+
+            self.assertEqual(features.shape, (len(images),
+                                              identification.FEATURES_LENGTH))
+
+            for image, row in zip(images, features):
+                expected = identification.gen_feature_vect(image, low_quality)
+                for a, e in zip(row, expected):
+                    self.assertAlmostEqual(a, e, places=7)
+
+    def test_arrays(self):
+        """
+        Image arrays give the same vectors as the images they were taken from.
+        """
+        images = [synthetic_image(160, 120, 1), synthetic_image(200, 150, 2)]
+        arrays = [numpy.asarray(image) for image in images]
+
+        for low_quality in (False, True):
+            self.assertEqual(
+                identification.gen_feature_vects(arrays, low_quality).tolist(),
+                identification.gen_feature_vects(images, low_quality).tolist()
+            )
+            self.assertEqual(
+                identification.gen_feature_vect(arrays[0], low_quality),
+                identification.gen_feature_vect(images[0], low_quality)
+            )
+
+    def test_empty(self):
+        features = identification.gen_feature_vects([])
+        self.assertEqual(features.shape, (0, identification.FEATURES_LENGTH))
+
+    def test_iterbatches(self):
+        size = lambda item: (item, 1)
+        memory = identification.batch_memory((10, 1))
+
+        batches = list(identification.iterbatches([4, 4, 4, 12, 1], memory,
+                                                  size))
+
+        self.assertEqual(batches, [[4, 4], [4], [12], [1]])
+
+        batches = list(identification.iterbatches([4, 4, 4, 12, 1], None,
+                                                  size))
+        self.assertEqual(batches, [[4, 4, 4, 12, 1]])
+        self.assertEqual(list(identification.iterbatches([], None, size)), [])
+
+
+class DiffMatrixTest(unittest.TestCase):
+
+    def test_same_as_diff_score(self):
+        """
+        The difference matrix has to contain exactly (not only within float
+        tolerance) the scores returned by get_diff_score.
+        """
+        random = numpy.random.RandomState(0)
+        f1 = random.rand(20, identification.FEATURES_LENGTH) * 50
+        f2 = random.rand(7, identification.FEATURES_LENGTH) * 50
+
+        matrix = identification.get_diff_matrix(f1, f2)
+
+        self.assertEqual(matrix.shape, (20, 7))
+
+        for i, a in enumerate(f1.tolist()):
+            for j, b in enumerate(f2.tolist()):
+                self.assertEqual(matrix[i, j],
+                                 identification.get_diff_score(a, b))
+
+
+class CoarseMatchingTest(unittest.TestCase):
+
+    def setUp(self):
+        random = numpy.random.RandomState(0)
+        self.f1 = random.rand(20, identification.FEATURES_LENGTH) * 50
+        self.f2 = random.rand(60, identification.FEATURES_LENGTH) * 50
+
+    def test_coarse_features(self):
+        coarse = identification.coarse_features(self.f1)
+
+        self.assertEqual(coarse.shape, (20, identification.COARSE_LENGTH))
+
+        # Global features are kept
+        self.assertEqual(coarse[:, -2:].tolist(), self.f1[:, -2:].tolist())
+
+    def test_lower_bound(self):
+        """
+        The coarse distance never exceeds the full one.
+        """
+        full = identification.get_diff_matrix(self.f1, self.f2)
+        coarse = identification.get_diff_matrix(
+            identification.coarse_features(self.f1),
+            identification.coarse_features(self.f2)
+        )
+
+        self.assertTrue((coarse <= full * (1 + 1e-12)).all())
+
+    def test_refined(self):
+        full = identification.get_diff_matrix(self.f1, self.f2)
+        refined = identification.get_refined_diff_matrix(self.f1, self.f2, 5)
+
+        computed = numpy.isfinite(refined)
+
+        self.assertEqual(computed.sum(axis=1).tolist(), [5] * 20)
+        self.assertEqual(refined[computed].tolist(), full[computed].tolist())
+
+    def test_nearest_found(self):
+        """
+        Noisy copies of the vectors are matched to them.
+        """
+        random = numpy.random.RandomState(1)
+        noisy = self.f2 + random.randn(*self.f2.shape)
+
+        refined = identification.get_refined_diff_matrix(noisy, self.f2, 2)
+
+        self.assertEqual(refined.argmin(axis=1).tolist(), range(60))
+
+    def test_all_refined(self):
+        full = identification.get_diff_matrix(self.f1, self.f2)
+
+        for k in (None, 60, 100):
+            refined = identification.get_refined_diff_matrix(self.f1,
+                                                             self.f2, k)
+            self.assertEqual(refined.tolist(), full.tolist())
+
+
+class BandedMatchingTest(unittest.TestCase):
+
+    def setUp(self):
+        random = numpy.random.RandomState(0)
+        self.f2 = random.rand(60, identification.FEATURES_LENGTH) * 50
+
+        # Two frames per slide, shown in order one minute each
+        shown = numpy.repeat(numpy.arange(60), 2)
+        self.f1 = self.f2[shown] + random.randn(120, self.f2.shape[1])
+        self.timestamps = numpy.arange(120) * 30.0
+
+    def test_exact(self):
+        full = identification.get_diff_matrix(self.f1, self.f2)
+        banded = identification.get_banded_diff_matrix(
+            self.f1, self.timestamps, self.f2, 3, 0.3)
+
+        computed = numpy.isfinite(banded)
+
+        self.assertTrue(computed.sum() < full.size / 4)
+        self.assertEqual(banded[computed].tolist(), full[computed].tolist())
+        self.assertEqual(banded.argmin(axis=1).tolist(),
+                         full.argmin(axis=1).tolist())
+
+    def test_widened(self):
+        """
+        Slides shown out of order are found by widening the band.
+        """
+        self.f1[60] = self.f2[2]
+        self.f1[61] = self.f2[55]
+
+        banded = identification.get_banded_diff_matrix(
+            self.f1, self.timestamps, self.f2, 3, 0.3)
+
+        self.assertEqual(banded[60:62].argmin(axis=1).tolist(), [2, 55])
+        self.assertEqual(banded[62].argmin(), 31)
+
+    def test_narrow_slideshow(self):
+        full = identification.get_diff_matrix(self.f1, self.f2[:7])
+        banded = identification.get_banded_diff_matrix(
+            self.f1, self.timestamps, self.f2[:7], 3, 0.3)
+
+        self.assertEqual(banded.tolist(), full.tolist())
@@ -0,0 +1,122 @@
+"""
+Test suite for the smaclib.modules.analyzer.imaging module, checking the array
+operations against the PIL ones they replace.
+"""
+
+
+import numpy
+import Image
+import ImageChops
+import ImageFilter
+import ImageStat
+
+from twisted.trial import unittest
+
+from smaclib.modules.analyzer import imaging
+from smaclib.modules.analyzer.benchmarks import synthetic
+
+
+class ImagingTest(unittest.TestCase):
+
+    def setUp(self):
+        random = numpy.random.RandomState(0)
+        self.data = random.randint(0, 256, (50, 60, 3)).astype(numpy.uint8)
+        self.other = random.randint(0, 256, (50, 60, 3)).astype(numpy.uint8)
+        self.image = Image.fromarray(self.data)
+
+    def assertSameImage(self, data, image):
+        self.assertEqual(data.tolist(), numpy.asarray(image).tolist())
+
+    def test_crop(self):
+        self.assertSameImage(imaging.crop(self.data, (5, 10, 45, 30)),
+                             self.image.crop((5, 10, 45, 30)))
+        self.assertIdentical(imaging.crop(self.data, None), self.data)
+
+    def test_luma(self):
+        self.assertSameImage(imaging.luma(self.data), self.image.convert('L'))
+
+        gray = self.data[..., 0]
+        self.assertIdentical(imaging.luma(gray), gray)
+
+    def test_sharpen(self):
+        self.assertSameImage(imaging.sharpen(self.data),
+                             self.image.filter(ImageFilter.SHARPEN))
+
+    def test_vertical_blur(self):
+        kernel = ImageFilter.Kernel((5, 5), [0, 0, 1, 0, 0] * 5)
+
+        self.assertSameImage(imaging.vertical_blur(self.data),
+                             self.image.filter(kernel))
+
+        out = numpy.empty_like(self.data)
+        self.assertIdentical(imaging.vertical_blur(self.data, out=out), out)
+        self.assertSameImage(out, self.image.filter(kernel))
+
+    def test_area_resize(self):
+        resized = imaging.area_resize(self.data, (30, 25))
+        expected = self.data.reshape(25, 2, 30, 2, 3).mean(axis=(1, 3))
+
+        self.assertEqual(resized.tolist(), expected.tolist())
+        self.assertEqual(imaging.area_resize(self.data[..., 0],
+                                             (7, 9)).shape, (9, 7))
+
+    def test_difference(self):
+        difference = ImageChops.difference(self.image,
+                                           Image.fromarray(self.other))
+        expected = sum(ImageStat.Stat(difference).var)
+
+        self.assertAlmostEqual(imaging.difference(self.data, self.other),
+                               expected, places=6)
+
+    def test_signature(self):
+        slide = synthetic.slide_image(3)
+        revealed = numpy.array(slide)
+        revealed[200:208, 40:280] = 20
+
+        revealed = Image.fromarray(revealed)
+        images = (slide, slide, slide, revealed, revealed)
+
+        signatures = [
+            imaging.signature(numpy.asarray(synthetic.frame_image(image, seed)))
+            for seed, image in enumerate(images)
+        ]
+
+        self.assertEqual(signatures[0].shape, (12, 16))
+
+        # Same slide, different exposures and noise
+        for other in signatures[1:3]:
+            self.assertTrue(
+                imaging.signature_distance(signatures[0], other) < 0.25)
+
+        # One more line of text
+        for other in signatures[3:]:
+            self.assertTrue(
+                imaging.signature_distance(signatures[0], other) > 0.25)
+
+        flat = numpy.zeros((40, 40), dtype=numpy.uint8)
+        self.assertEqual(imaging.signature(flat).tolist(),
+                         numpy.zeros((12, 16)).tolist())
+
+    def test_signature_buckets(self):
+        """
+        The signatures within the distance of a signature lie in the
+        neighbouring buckets of its own.
+        """
+        random = numpy.random.RandomState(0)
+        signature = random.randn(12, 16)
+        key = imaging.signature_key(signature, 0.25)
+        neighbours = imaging.signature_neighbours(key)
+
+        self.assertEqual(len(neighbours), 27)
+        self.assertIn(key, neighbours)
+
+        for _ in xrange(200):
+            other = signature + random.uniform(-0.25, 0.25, signature.shape)
+            self.assertIn(imaging.signature_key(other, 0.25), neighbours)
+
+        for shift in (-0.24, 0.24):
+            self.assertIn(imaging.signature_key(signature + shift, 0.25),
+                          neighbours)
+
+        other = signature + 1.0
+        self.assertNotIn(imaging.signature_key(other, 0.25), neighbours)
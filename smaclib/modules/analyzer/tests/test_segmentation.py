@@ -0,0 +1,507 @@
+"""
+Test suite for the video segmentation of the
+smaclib.modules.analyzer.segmentation module.
+"""
+
+
+import os
+
+import numpy
+import Image
+
+from lxml import etree
+from twisted.trial import unittest
+
+from smaclib.modules.analyzer import segmentation
+
+
+class FakeTrack(object):
+    """
+    Mimics the pyffmpeg video track interface over a list of images and counts
+    the decoded frames.
+
+    As the decoder does, the frames are handed out as views over a single
+    buffer, overwritten by each decoded frame.
+    """
+
+    gop = 12
+
+    def __init__(self, images):
+        self.images = [numpy.asarray(image) for image in images]
+        self.buffer = numpy.empty_like(self.images[0])
+        self.current = 0
+        self.decoded = 0
+
+    def seek_to_frame(self, num):
+        if num > len(self.images):
+            raise IOError("Seeking beyond the end of stream")
+
+        # Decoding starts again from the previous keyframe
+        keyframe = (num - 1) // self.gop * self.gop
+        self.decoded += num - keyframe
+        self.current = num - 1
+
+    def get_next_frame(self):
+        if self.current + 1 >= len(self.images):
+            raise IOError("End of stream")
+        self.current += 1
+        self.decoded += 1
+
+    def get_current_frame(self):
+        pts = int(self.current * 40000)
+        self.buffer[...] = self.images[self.current]
+        return pts, self.current, self.buffer, None, None
+
+
+class FakeReader(segmentation.VideoReader):
+
+    def __init__(self, images, count=None):
+        self.track = FakeTrack(images)
+        self.count = count or len(images)
+
+    @property
+    def video(self):
+        return self.track
+
+    @property
+    def framescount(self):
+        return self.count
+
+
+def images(count):
+    return [Image.new('RGB', (16, 12), (i % 256, 0, 0)) for i in xrange(count)]
+
+
+def slide(seed, size=(160, 120)):
+    """
+    Renders a slide-like image: a light background with some dark text-like
+    blocks.
+    """
+    random = numpy.random.RandomState(seed)
+    data = numpy.empty((size[1], size[0], 3), dtype=numpy.uint8)
+    data[...] = random.randint(180, 256, 3)
+
+    for _ in xrange(random.randint(4, 10)):
+        x, y = random.randint(0, size[0] - 50), random.randint(0, size[1] - 10)
+        data[y:y + random.randint(2, 8), x:x + random.randint(15, 50)] = \
+                random.randint(0, 120, 3)
+
+    return data
+
+
+def lecture(durations, seed=0):
+    """
+    Returns the frames of a video showing a different slide for each of the
+    given durations (in frames), with some sensor noise.
+    """
+    random = numpy.random.RandomState(seed)
+    frames = []
+
+    for index, duration in enumerate(durations):
+        data = slide(index + seed * 100).astype(numpy.int16)
+        for _ in xrange(duration):
+            noise = random.randint(-3, 4, data.shape)
+            noisy = (data + noise).clip(0, 255).astype(numpy.uint8)
+            frames.append(Image.fromarray(noisy))
+
+    return frames
+
+
+def framed(frames, overlay=False):
+    """
+    Puts the given frames in a black border, with an overlay blinking every 60
+    frames in the border if ``overlay`` is set.
+    """
+    result = []
+
+    for index, frame in enumerate(frames):
+        data = numpy.zeros((150, 200, 3), dtype=numpy.uint8)
+        data[15:135, 20:180] = numpy.asarray(frame)
+
+        if overlay and index // 60 % 2:
+            data[2:12, 150:195] = 255
+
+        result.append(Image.fromarray(data))
+
+    return result
+
+
+class VideoReaderTest(unittest.TestCase):
+
+    def frames(self, reader, step, seek):
+        return [(f.number, f.timestamp, tuple(f.data[0, 0]))
+                for f in reader.iterframes(step, seek)]
+
+    def test_same_frames(self):
+        for step in (1, 5, 25, 60):
+            seeking = self.frames(FakeReader(images(250)), step, True)
+            forward = self.frames(FakeReader(images(250)), step, False)
+
+            self.assertEqual(forward, seeking)
+            self.assertEqual(forward[0][0], 1)
+            self.assertEqual(forward[1][0], 1 + step)
+
+    def test_forward_decodes_once(self):
+        reader = FakeReader(images(250))
+        list(reader.iterframes(25, False))
+
+        self.assertEqual(reader.track.decoded, 249)
+
+    def test_retain(self):
+        reader = FakeReader(images(250))
+        frames = reader.iterframes(25, False)
+
+        first = frames.next()
+        retained = frames.next().retain()
+        frames.next()
+
+        self.assertTrue(first.shared)
+        self.assertFalse(retained.shared)
+        self.assertEqual(first.data[0, 0, 0], 50)
+        self.assertEqual(retained.data[0, 0, 0], 25)
+        self.assertEqual(retained.image.getpixel((0, 0)), (25, 0, 0))
+
+    def test_truncated_stream(self):
+        # The estimated frames count can exceed the real stream length
+        reader = FakeReader(images(60), count=100)
+
+        frames = self.frames(reader, 25, False)
+
+        self.assertEqual([f[0] for f in frames], [1, 26, 51])
+
+
+class VideoSegmenterTest(unittest.TestCase):
+
+    durations = [100, 150, 75, 200, 125]
+
+    def boundaries(self, frames, count=None, **attributes):
+        segmenter = segmentation.VideoSegmenter(FakeReader(frames, count))
+        segmenter.__dict__.update(attributes)
+
+        return [(seq.first_frame.number, seq.last_frame.number, seq.unstable)
+                for seq in segmenter.sequences()]
+
+    def test_full_resolution(self):
+        boundaries = self.boundaries(lecture(self.durations))
+
+        self.assertEqual(len(boundaries), len(self.durations))
+
+    def test_proxy(self):
+        for seed in xrange(3):
+            frames = lecture(self.durations, seed)
+
+            self.assertEqual(self.boundaries(frames, analysis_size=(40, 30)),
+                             self.boundaries(frames))
+
+    def test_calibrate_proxy(self):
+        segmenter = segmentation.VideoSegmenter(
+                FakeReader(lecture(self.durations)))
+        segmenter.analysis_size = (40, 30)
+
+        scale = segmenter.calibrate_proxy()
+
+        self.assertEqual(scale, segmenter.proxy_score_scale)
+        self.assertTrue(1.0 < scale < 6.0)
+
+        # Calibrated by default before segmenting
+        reader = FakeReader(lecture(self.durations))
+        segmenter = segmentation.VideoSegmenter(reader)
+        segmenter.analysis_size = (40, 30)
+        list(segmenter.sequences())
+
+        self.assertEqual(segmenter.proxy_score_scale, scale)
+
+        # Static video
+        segmenter = segmentation.VideoSegmenter(FakeReader(lecture([300])))
+        segmenter.analysis_size = (40, 30)
+
+        self.assertEqual(segmenter.calibrate_proxy(),
+                         segmenter.default_proxy_score_scale)
+
+    def test_coarse_step(self):
+        """
+        Coarse sampling finds the same sequences, unstable ones included.
+        """
+        lectures = [self.durations, [300, 25, 25, 25, 25, 300],
+                    [20, 500, 260]]
+        unstable = []
+
+        for durations in lectures:
+            frames = lecture(durations)
+            expected = self.boundaries(frames)
+            unstable.extend(u for _, _, u in expected)
+
+            for step in (75, 125, 250):
+                self.assertEqual(self.boundaries(frames, coarse_step=step),
+                                 expected)
+
+        self.assertIn(True, unstable)
+
+    def test_coarse_step_decodes_less(self):
+        frames = lecture([400, 30, 40, 400])
+
+        fine = segmentation.VideoSegmenter(FakeReader(frames))
+        list(fine.sequences())
+
+        reader = FakeReader(frames)
+        coarse = segmentation.VideoSegmenter(reader)
+        coarse.coarse_step = 125
+        list(coarse.sequences())
+
+        self.assertTrue(len(coarse.timings) < len(fine.timings) / 2)
+        self.assertTrue(reader.track.decoded < len(frames) / 4)
+
+    def test_retained_frames(self):
+        """
+        Only the frames kept by the sequences are copied out of the buffer of
+        the decoder, the analyzed samples stay shared otherwise.
+        """
+        frames = lecture([400, 30, 40, 400])
+
+        for coarse_step in (None, 125):
+            segmenter = segmentation.VideoSegmenter(FakeReader(frames))
+            segmenter.coarse_step = coarse_step
+            sequences = list(segmenter.sequences())
+
+            for seq in sequences:
+                for frame in (seq.first_frame, seq.last_frame):
+                    self.assertFalse(frame.shared)
+                    self.assertEqual(
+                        frame.data.tolist(),
+                        numpy.asarray(frames[frame.number - 1]).tolist())
+
+        segmenter = segmentation.VideoSegmenter(FakeReader(frames))
+        detector = segmentation.ChangeDetector()
+        detector.load(numpy.asarray(frames[0]))
+        detector.keep()
+        segmenter.timings = []
+
+        samples = [frame for frame, _ in segmenter._samples(detector, 1, None)]
+
+        self.assertTrue(samples)
+        self.assertTrue(all(frame.shared for frame in samples))
+
+    def test_coarse_step_truncated_stream(self):
+        frames = lecture(self.durations)
+
+        self.assertEqual(self.boundaries(frames, len(frames) + 200,
+                                         coarse_step=125),
+                         self.boundaries(frames))
+
+    def test_region(self):
+        """
+        Changes outside of the slides region are ignored once the region is
+        estimated.
+        """
+        frames = lecture(self.durations)
+        expected = self.boundaries(frames)
+
+        overlaid = framed(frames, overlay=True)
+        self.assertNotEqual(self.boundaries(overlaid), expected)
+
+        segmenter = segmentation.VideoSegmenter(FakeReader(overlaid))
+
+        self.assertEqual(segmenter.estimate_region(), (20, 15, 180, 135))
+        self.assertEqual([(seq.first_frame.number, seq.last_frame.number,
+                           seq.unstable) for seq in segmenter.sequences()],
+                         expected)
+
+    def test_timings(self):
+        segmenter = segmentation.VideoSegmenter(
+                FakeReader(lecture(self.durations)))
+        list(segmenter.sequences())
+
+        numbers = [timing.number for timing in segmenter.timings]
+        self.assertEqual(numbers, range(1, sum(self.durations), 25))
+
+        summary = segmenter.timing_summary()
+        self.assertEqual(summary.number, len(numbers))
+        self.assertTrue(summary.decode >= 0 and summary.blur > 0
+                        and summary.diff > 0)
+
+
+class ChangeDetectorTest(unittest.TestCase):
+
+    def setUp(self):
+        frames = lecture([2, 2])
+        self.frames = [numpy.asarray(frames[i]) for i in (0, 1, 2)]
+
+    def test_same_as_difference(self):
+        for size in (None, (40, 30)):
+            detector = segmentation.ChangeDetector(analysis_size=size)
+            segmenter = segmentation.VideoSegmenter(None)
+            segmenter.analysis_size = size
+
+            detector.load(self.frames[0])
+            detector.keep()
+
+            reference = segmenter.analysis_image(self.frames[0])
+
+            for data in self.frames[1:]:
+                detector.load(data)
+                expected = segmentation.difference(
+                        reference, segmenter.analysis_image(data))
+
+                self.assertAlmostEqual(detector.score(), expected, places=6)
+
+    def test_buffers_reused(self):
+        detector = segmentation.ChangeDetector()
+        detector.load(self.frames[0])
+        detector.keep()
+        buffers = set([id(detector.reference), id(detector.current)])
+
+        for data in self.frames:
+            detector.load(data)
+            detector.score()
+            detector.keep()
+
+        self.assertEqual(set([id(detector.reference), id(detector.current)]),
+                         buffers)
+
+
+class ParallelSegmentationTest(unittest.TestCase):
+
+    def test_split_range(self):
+        ranges = segmentation.split_range(1000, 3, 25, 60)
+
+        self.assertEqual(ranges, [(1, 1, 326), (276, 326, 651),
+                                  (601, 651, 1000)])
+
+        for warmup, first, last in ranges:
+            self.assertEqual((warmup - 1) % 25, 0)
+            self.assertEqual((first - 1) % 25, 0)
+
+    def test_split_range_minimum_overlap(self):
+        ranges = segmentation.split_range(1000, 2, 25, 0)
+
+        self.assertEqual(ranges, [(1, 1, 501), (476, 501, 1000)])
+
+    def test_same_as_serial(self):
+        durations = [100, 150, 75, 200, 125, 90]
+        frames = lecture(durations)
+
+        serial = segmentation.VideoSegmenter(FakeReader(frames)).sequences()
+        serial = [(s.first_frame.number, s.last_frame.number, s.unstable)
+                  for s in serial]
+
+        for chunks in (2, 3, 5):
+            ranges = segmentation.split_range(len(frames), chunks, 25, 100)
+            results = []
+
+            for frames_range in ranges:
+                segmenter = segmentation.VideoSegmenter(FakeReader(frames))
+                results.append(segmentation.segment_range(segmenter,
+                                                          *frames_range))
+
+            stitched = [(s.first_frame.number, s.last_frame.number,
+                         s.unstable) for s in segmentation.stitch(results)]
+
+            self.assertEqual(stitched, serial)
+
+
+class LoadSlideTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = self.mktemp()
+        os.makedirs(os.path.join(directory, 'analysis'))
+
+        self.filename = os.path.join(directory, 'slide-001.png')
+        Image.fromarray(slide(0, (800, 600))).save(self.filename)
+
+    def save_copy(self, size, color):
+        Image.new('RGB', size, color).save(
+            segmentation.analysis_copy(self.filename))
+
+    def test_full_size(self):
+        self.assertEqual(segmentation.load_slide(self.filename).size,
+                         (800, 600))
+        self.assertEqual(segmentation.load_slide(self.filename,
+                                                 (1024, 768)).size,
+                         (800, 600))
+
+    def test_fitted(self):
+        img = segmentation.load_slide(self.filename, (400, 400))
+        expected = Image.open(self.filename).resize((400, 300),
+                                                    Image.ANTIALIAS)
+
+        self.assertEqual(img.size, (400, 300))
+        self.assertEqual(numpy.asarray(img).tolist(),
+                         numpy.asarray(expected).tolist())
+
+    def test_analysis_copy(self):
+        self.save_copy((400, 300), (0, 0, 255))
+
+        img = segmentation.load_slide(self.filename, (200, 150))
+        self.assertEqual(img.size, (200, 150))
+        self.assertEqual(img.getpixel((100, 75)), (0, 0, 255))
+
+        # Too small to be used
+        img = segmentation.load_slide(self.filename, (640, 480))
+        self.assertEqual(img.size, (640, 480))
+        self.assertNotEqual(img.getpixel((100, 75)), (0, 0, 255))
+
+    def test_palette(self):
+        Image.fromarray(slide(0, (800, 600))).convert('P').save(self.filename)
+
+        img = segmentation.load_slide(self.filename, (400, 300))
+        self.assertEqual(img.mode, 'RGB')
+        self.assertEqual(img.size, (400, 300))
+
+    def test_features(self):
+        full = segmentation.Slide(1, self.filename)
+        fitted = segmentation.Slide(1, self.filename)
+        fitted.analysis_size = (640, 480)
+
+        self.assertEqual(len(fitted.features), len(full.features))
+        self.assertNotEqual(fitted.features, full.features)
+
+
+class FeaturesXMLTest(unittest.TestCase):
+
+    def setUp(self):
+        random = numpy.random.RandomState(0)
+        self.vector = (random.rand(272) * 100).tolist()
+
+    def test_roundtrip(self):
+        root = etree.Element("slide")
+        segmentation.features_toxml(root, self.vector)
+
+        # Go through the serialized document, as the parser would
+        root = etree.fromstring(etree.tostring(root))
+        features = root.find('features')
+
+        self.assertEqual(features.get('encoding'),
+                         segmentation.FEATURES_ENCODING)
+
+        decoded = segmentation.features_fromxml(features)
+
+        self.assertEqual(decoded.dtype, numpy.float64)
+        self.assertEqual(decoded.tolist(),
+                         numpy.float32(self.vector).tolist())
+
+    def test_legacy(self):
+        features = etree.Element("features")
+        features.text = " ".join([str(f) for f in self.vector])
+
+        decoded = segmentation.features_fromxml(features)
+
+        self.assertEqual(decoded.tolist(),
+                         [float(str(f)) for f in self.vector])
+
+    def test_invalid(self):
+        features = etree.Element("features")
+        features.set("encoding", "base64-float128")
+        self.assertRaises(ValueError, segmentation.features_fromxml, features)
+
+        root = etree.Element("slide")
+        features = segmentation.features_toxml(root, self.vector)
+        features.set("length", "273")
+        self.assertRaises(ValueError, segmentation.features_fromxml, features)
+
+    def test_size(self):
+        root = etree.Element("slide")
+        segmentation.features_toxml(root, self.vector)
+
+        legacy = " ".join([str(f) for f in self.vector])
+
+        self.assertTrue(len(etree.tostring(root)) < len(legacy) / 2)
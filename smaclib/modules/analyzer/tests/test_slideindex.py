@@ -0,0 +1,84 @@
+"""
+Test suite for the smaclib.modules.analyzer.slideindex module.
+"""
+
+
+import pickle
+
+import numpy
+
+from twisted.trial import unittest
+
+from smaclib.modules.analyzer import identification
+from smaclib.modules.analyzer import slideindex
+
+
+def candidates(row, margin, nearest=2):
+    """
+    Returns the sorted indexes of the scores of ``row`` within the relative
+    ``margin`` of the best one or among the ``nearest`` best ones.
+    """
+    ranked = numpy.sort(row)
+    bound = max(ranked[nearest - 1], ranked[0] * (1.0 + margin))
+    return sorted(numpy.flatnonzero(row <= bound).tolist())
+
+
+class SlideIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        random = numpy.random.RandomState(0)
+        steps = random.randn(120, identification.FEATURES_LENGTH)
+        self.slides = numpy.abs(numpy.cumsum(steps, axis=0)) * 10
+
+        picks = random.randint(0, 120, 50)
+        self.frames = self.slides[picks] + random.randn(
+            50, identification.FEATURES_LENGTH) * 5
+
+        self.full = identification.get_diff_matrix(self.frames, self.slides)
+
+    def test_candidates(self):
+        """
+        All the slides within the margin are scored, exactly as by the full
+        distance matrix.
+        """
+        index = slideindex.SlideIndex(self.slides)
+
+        for margin in (0.0, 0.15, 1.0):
+            scores = index.get_diff_matrix(self.frames, margin)
+            computed = numpy.isfinite(scores)
+
+            self.assertEqual(scores[computed].tolist(),
+                             self.full[computed].tolist())
+
+            for row, full in zip(scores, self.full):
+                self.assertEqual(candidates(row, margin),
+                                 candidates(full, margin))
+
+    def test_fewer_scores(self):
+        index = slideindex.SlideIndex(self.slides)
+        index.get_diff_matrix(self.frames, 0.15)
+
+        self.assertTrue(index.computed < self.full.size / 2)
+
+    def test_small(self):
+        """
+        Slideshows smaller than a search batch are fully scored.
+        """
+        index = slideindex.SlideIndex(self.slides[:3])
+        scores = index.get_diff_matrix(self.frames, 0.15)
+
+        self.assertEqual(scores.tolist(), self.full[:, :3].tolist())
+
+    def test_pickle(self):
+        index = pickle.loads(pickle.dumps(slideindex.SlideIndex(self.slides),
+                                          pickle.HIGHEST_PROTOCOL))
+        scores = index.get_diff_matrix(self.frames, 0.15)
+
+        self.assertEqual(scores.argmin(axis=1).tolist(),
+                         self.full.argmin(axis=1).tolist())
+
+    def test_get_index(self):
+        index = slideindex.get_index(self.slides)
+
+        self.assertIdentical(slideindex.get_index(self.slides.tolist()), index)
+        self.assertNotIdentical(slideindex.get_index(self.slides[1:]), index)
@@ -0,0 +1,156 @@
+"""
+Test suite for the smaclib.modules.analyzer.sweep module.
+"""
+
+
+import cStringIO as StringIO
+
+from lxml import etree
+
+from twisted.trial import unittest
+
+from smaclib import workers
+from smaclib.modules.analyzer import sweep
+from smaclib.modules.analyzer import alignment
+from smaclib.modules.analyzer import identification
+from smaclib.modules.analyzer.benchmarks import synthetic
+
+
+class AccuracyTest(unittest.TestCase):
+
+    def test_accuracy(self):
+        reference = [(1, 0, 100), (2, 100, 200), (3, 200, 400)]
+
+        self.assertEqual(sweep.accuracy(reference, reference), 1.0)
+        self.assertEqual(sweep.accuracy([], reference), 0.0)
+        self.assertEqual(sweep.accuracy(reference, []), 0.0)
+
+        # Late switch to the second slide, third slide never found
+        segments = [(1, 0, 150), (2, 150, 400)]
+        self.assertEqual(sweep.accuracy(segments, reference), 150 / 400.)
+
+        # Segments starting after the first reference ones
+        segments = [(2, 50, 200), (3, 200, 300), (1, 300, 400)]
+        self.assertEqual(sweep.accuracy(segments, reference), 200 / 400.)
+
+    def test_read_alignment(self):
+        sequences, slides = synthetic.lecture()
+        matches = alignment.Identification(sequences, slides).identify()
+
+        root = etree.Element("alignment")
+        for match in matches:
+            root.append(match.toxml())
+        source = StringIO.StringIO(etree.tostring(root, pretty_print=True))
+
+        self.assertEqual(sweep.read_alignment(source), sweep.segments(matches))
+
+    def test_configurations(self):
+        grid = {'min_confidence': [0.1, 0.2], 'off_seq_min_conf': [0.5],
+                'missing_max_confidence': [0.1, 0.15, 0.3]}
+        configurations = sweep.configurations(grid)
+
+        self.assertEqual(len(configurations), 6)
+        self.assertIn({'min_confidence': 0.2, 'off_seq_min_conf': 0.5,
+                       'missing_max_confidence': 0.15}, configurations)
+
+        self.assertRaises(ValueError, sweep.configurations,
+                          {'min_confidence': [0.1], 'framerate': [25.]})
+
+    def test_sequence_class(self):
+        cls = sweep.sequence_class({'min_confidence': 0.3})
+        sequence = cls(alignment.Frame(1), alignment.Frame(100))
+
+        self.assertEqual(sequence.min_confidence, 0.3)
+        self.assertEqual(alignment.Sequence.min_confidence, 0.1)
+        self.assertRaises(AttributeError, setattr, sequence, 'extra', 1)
+
+    def test_empty_alignment(self):
+        """
+        Configurations keeping no sequence score an empty alignment, the
+        ones discarding all the matches too.
+        """
+        sequences, slides = synthetic.lecture()
+        reference = [(1, 0, 100)]
+        runner = sweep.ParameterSweep(sequences, slides, reference, {})
+        scores = identification.get_diff_matrix(
+            [seq.end_frame.features for seq in runner.sequences],
+            [slide.features for slide in runner.slides])
+
+        for parameters in ({'min_confidence': float('inf'),
+                            'max_nb_of_candidates': 0},
+                           {'trailling_seq_min_duration': float('inf')}):
+            self.assertEqual(runner.evaluate(parameters, scores),
+                             {'accuracy': 0.0, 'matches': 0})
+
+
+class ParameterSweepTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = workers.WorkerPool(1)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_cancel_before_start(self):
+        runner = sweep.ParameterSweep([], [], [], {}, self.pool)
+        runner.cancel()
+
+    def test_sweep(self):
+        """
+        Tests that the configurations evaluated in the worker processes over
+        the shared distance matrix score as the alignments computed from
+        scratch with the same thresholds.
+        """
+        sequences, slides = synthetic.lecture(noise=2.0, revisit=0.1)
+        matches = alignment.Identification(*synthetic.lecture(
+                noise=2.0, revisit=0.1)).identify()
+        reference = sweep.segments(matches)
+
+        grid = {'min_confidence': [0.1, 0.5],
+                'missing_max_confidence': [0.15, 0.6],
+                'remnant_seq_min_conf': [0.4, 10.0]}
+
+        runner = sweep.ParameterSweep(sequences, slides, reference, grid,
+                                      self.pool)
+        runner.chunksize = 3
+        d = runner.getTask()()
+
+        @d.addCallback
+        def check(results):
+            self.assertEqual(len(results), 8)
+            self.assertEqual(runner.evaluated, 8)
+
+            accuracies = [result['accuracy'] for result in results]
+            self.assertEqual(accuracies, sorted(accuracies, reverse=True))
+
+            defaults = {'min_confidence': 0.1, 'missing_max_confidence': 0.15,
+                        'remnant_seq_min_conf': 0.4}
+            default, = [r for r in results if r['parameters'] == defaults]
+            self.assertEqual(default['accuracy'], 1.0)
+            self.assertEqual(default['matches'], len(matches))
+
+            scores = identification.get_refined_diff_matrix(
+                [seq.end_frame.features for seq in sorted(sequences)],
+                [slide.features for slide in slides], None)
+
+            for result in results:
+                parameters = result['parameters']
+                expected = runner.evaluate(parameters, scores)
+                expected['parameters'] = parameters
+                self.assertEqual(result, expected)
+
+                # Against the batch alignment with the same thresholds
+                ident = alignment.Identification(*synthetic.lecture(
+                        noise=2.0, revisit=0.1))
+                for name, value in parameters.items():
+                    setattr(alignment.Sequence, name, value)
+                try:
+                    batch = ident.identify()
+                finally:
+                    for name, value in defaults.items():
+                        setattr(alignment.Sequence, name, value)
+
+                self.assertEqual(result['accuracy'], sweep.accuracy(
+                        sweep.segments(batch), reference))
+
+        return d
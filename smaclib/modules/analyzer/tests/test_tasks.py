@@ -0,0 +1,180 @@
+"""
+Test suite for the smaclib.modules.analyzer.tasks module.
+"""
+
+
+import numpy
+
+from twisted.internet import defer
+from twisted.trial import unittest
+
+from smaclib import workers
+from smaclib.modules.analyzer import tasks
+from smaclib.modules.analyzer import framestore
+from smaclib.modules.analyzer import segmentation
+from smaclib.modules.analyzer.benchmarks import synthetic
+from smaclib.modules.analyzer.tests import test_segmentation
+
+
+class ArrayReader(test_segmentation.FakeReader):
+    """
+    A video reader over the frames saved to a NumPy file, which the worker
+    processes can open by path.
+    """
+
+    def __init__(self, video_path):
+        test_segmentation.FakeReader.__init__(self, numpy.load(video_path))
+
+    @property
+    def duration(self):
+        return self.count / self.framerate
+
+    @property
+    def framerate(self):
+        return 25.
+
+
+class VideoSegmentationTaskTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = workers.WorkerPool(2)
+        self.store = framestore.FrameStore()
+
+        frames = test_segmentation.lecture([100, 150, 75, 200, 125, 90])
+        self.video = self.mktemp() + '.npy'
+        numpy.save(self.video, numpy.array([numpy.asarray(f) for f in frames]))
+
+    def tearDown(self):
+        self.pool.close()
+        self.store.clear()
+
+    def runner(self, workers):
+        runner = tasks.VideoSegmentationTask(self.video, self.store, self.pool)
+        runner.reader_class = ArrayReader
+        runner.workers = workers
+        runner.chunk_overlap = 100
+        return runner
+
+    def test_parallel(self):
+        """
+        Tests that the ranges segmented by the worker processes of the pool
+        are stitched to the sequences of a serial segmentation.
+        """
+        results = []
+
+        def segment(workers):
+            runner = self.runner(workers)
+            d = runner.getTask()()
+
+            @d.addCallback
+            def check(result):
+                sequences = result[0]
+                results.append([(s.first_frame.number, s.last_frame.number)
+                                for s in sequences])
+                for sequence in sequences:
+                    self.assertIn(sequence.last_frame.key, self.store)
+                self.assertEqual(runner.getTask().completed, 1)
+
+            return d
+
+        d = segment(1)
+        d.addCallback(lambda _: segment(3))
+
+        @d.addCallback
+        def compare(_):
+            self.assertEqual(len(results[0]), 6)
+            self.assertEqual(results[1], results[0])
+
+        return d
+
+    def test_cancel(self):
+        runner = self.runner(3)
+        task = runner.getTask()()
+        task.cancel()
+
+        return self.assertFailure(task, defer.CancelledError)
+
+    def test_cancel_parallel(self):
+        runner = self.runner(3)
+        completed = runner.chunk_completed
+
+        def cancel(index, results):
+            completed(index, results)
+            runner.getTask().cancel()
+
+        runner.chunk_completed = cancel
+        task = runner.getTask()()
+
+        @task.addErrback
+        def check(failure):
+            failure.trap(defer.CancelledError)
+            self.assertEqual(runner.sequences, [])
+            self.assertTrue(runner.getTask().completed < 1)
+
+        return task
+
+
+class FrameAnalysisTaskTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = workers.WorkerPool(1)
+        self.store = framestore.FrameStore()
+        self.slides = [synthetic.slide_image(seed, (160, 120))
+                       for seed in xrange(3)]
+
+    def tearDown(self):
+        self.pool.close()
+        self.store.clear()
+
+    def sequences(self, slides):
+        sequences = []
+
+        for number, slide in enumerate(slides):
+            image = synthetic.frame_image(self.slides[slide], number)
+            frame = segmentation.Frame.fromarray(number, number * 1000,
+                                                 numpy.asarray(image))
+            frame.keep(self.store)
+            sequences.append(segmentation.Sequence(frame, 0))
+
+        return sequences
+
+    def test_duplicates(self):
+        """
+        Tests that the features vectors of the frames showing an already
+        analyzed slide are reused instead of being extracted again.
+        """
+        sequences = self.sequences([0, 1, 0, 2, 1, 1])
+
+        runner = tasks.FrameAnalysisTask(sequences, self.pool)
+        runner.chunksize = 2
+        runner.duplicate_distance = 0.25
+        d = runner.getTask()()
+
+        @d.addCallback
+        def check(result):
+            self.assertIdentical(result, sequences)
+            self.assertEqual(runner.hits, 3)
+            self.assertIn("3 duplicates reused", runner.getTask().statustext)
+            self.assertEqual(len(self.store), 0)
+
+            self.assertIdentical(sequences[2].features, sequences[0].features)
+            self.assertIdentical(sequences[4].features, sequences[1].features)
+            self.assertIdentical(sequences[5].features, sequences[1].features)
+            self.assertNotEqual(sequences[0].features, sequences[1].features)
+            self.assertNotEqual(sequences[0].features, sequences[3].features)
+
+        return d
+
+    def test_disabled(self):
+        sequences = self.sequences([0, 0])
+
+        runner = tasks.FrameAnalysisTask(sequences, self.pool)
+        d = runner.getTask()()
+
+        @d.addCallback
+        def check(result):
+            self.assertEqual(runner.hits, 0)
+            self.assertNotIdentical(sequences[1].features,
+                                    sequences[0].features)
+
+        return d
@@ -76,6 +76,15 @@ class ImageGenerator(object):
 
     supersampling_factor = 4
 
+    analysis_size = None
+    """
+    Size in which the analysis copy of each slide image is fitted: a smaller
+    version stored in the ``analysis`` directory next to the slide images,
+    which the analyzer decodes instead of the full image when fitting the
+    slides in the same size (see the ``slide_analysis_size`` analyzer
+    setting). No copies are generated if ``None``.
+    """
+
     def __init__(self, source):
         self.source = source
 
@@ -93,6 +102,28 @@ class ImageGenerator(object):
             filename,
         ]
 
+        proto = process.DeferredProcessProtocol()
+        reactor.spawnProcess(proto, bin, [bin] + args, env=os.environ)
+
+        if self.analysis_size is not None:
+            proto.task.addCallback(lambda _: self.analysis_copy(filename))
+
+        return proto.task
+
+    def analysis_copy(self, filename):
+        directory = os.path.join(os.path.dirname(filename), 'analysis')
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        bin = 'convert'
+
+        args = [
+            filename,
+            '-scale', '{0:d}x{1:d}>'.format(*self.analysis_size),
+            os.path.join(directory, os.path.basename(filename)),
+        ]
+
         proto = process.DeferredProcessProtocol()
         reactor.spawnProcess(proto, bin, [bin] + args, env=os.environ)
         return proto.task
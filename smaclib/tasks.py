@@ -408,6 +408,6 @@ class Task(defer.Deferred, object):
             self.status = TaskStatus.RUNNING
             IPauseableTaskRunner(self.runner).unpause()
 
-    def _cancel(self):
+    def _cancel(self, _):
         ICancelableTaskRunner(self.runner).cancel()
 
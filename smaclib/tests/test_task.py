@@ -4,6 +4,7 @@ Tests for the text oriented utilities of the smaclib.text module.
 
 
 from twisted.trial import unittest
+from twisted.internet import defer
 
 from smaclib import tasks
 
@@ -32,6 +33,17 @@ class CountingRunner(SimpleRunner):
         self.started += 1
 
 
+class CancelableRunner(CountingRunner):
+    implements(tasks.ICancelableTaskRunner)
+
+    def __init__(self, name):
+        super(CancelableRunner, self).__init__(name)
+        self.cancelled = 0
+
+    def cancel(self):
+        self.cancelled += 1
+
+
 class TaskTest(unittest.TestCase):
 
     def test_initialValues(self):
@@ -108,4 +120,17 @@ class TaskTest(unittest.TestCase):
         self.assertEqual(report['called'], 101)
         self.assertEqual(report['completed'], 1)
 
+    def test_cancel(self):
+        """
+        Tests that cancelling a task cancels its runner and fails the task.
+        """
+        runner = CancelableRunner("Test task")
+        task = runner.getTask()
+        task()
+
+        task.cancel()
+
+        self.assertEqual(runner.cancelled, 1)
+        self.assertEqual(task.status, tasks.TaskStatus.FAILED)
 
+        return self.assertFailure(task, defer.CancelledError)
@@ -0,0 +1,133 @@
+"""
+Tests for the worker process pool of the smaclib.workers module.
+"""
+
+
+import os
+import signal
+
+from twisted.trial import unittest
+from twisted.internet import defer
+
+from smaclib import workers
+
+
+def squares(chunk, offset=0):
+    return [n * n + offset for n in chunk]
+
+
+def fail(chunk):
+    raise ValueError("Failing chunk {0!r}".format(chunk))
+
+
+def die(chunk):
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def unpicklable(chunk):
+    return [lambda: n for n in chunk]
+
+
+class WorkerPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = workers.WorkerPool(2)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_results(self):
+        """
+        Tests that the results are returned in order and that the progress
+        is reported for each chunk.
+        """
+        progress = []
+
+        def processed(start, results):
+            progress.append((start, results))
+
+        d = self.pool.submit(squares, xrange(10), args=(1,), chunksize=3,
+                             progress=processed)
+
+        @d.addCallback
+        def check(results):
+            self.assertEqual(results, [n * n + 1 for n in xrange(10)])
+            self.assertEqual(sorted(progress), [
+                (0, [1, 2, 5]),
+                (3, [10, 17, 26]),
+                (6, [37, 50, 65]),
+                (9, [82]),
+            ])
+
+        return d
+
+    def test_empty(self):
+        d = self.pool.submit(squares, [])
+        d.addCallback(self.assertEqual, [])
+        return d
+
+    def test_failure(self):
+        d = self.pool.submit(fail, [1, 2, 3], chunksize=3)
+        d = self.assertFailure(d, workers.RemoteError)
+
+        @d.addCallback
+        def check(error):
+            self.assertIn("ValueError: Failing chunk [1, 2, 3]", str(error))
+
+        return d
+
+    def test_worker_died(self):
+        """
+        Tests that a job fails instead of hanging when a worker process dies
+        while running one of its chunks.
+        """
+        self.pool.check_interval = 0.1
+        d = self.pool.submit(die, [1], chunksize=1)
+        d = self.assertFailure(d, workers.RemoteError)
+
+        @d.addCallback
+        def check(error):
+            self.assertIn("worker process died", str(error))
+
+            # The pool replaced the worker and is still usable
+            return self.pool.submit(squares, xrange(4))
+
+        d.addCallback(self.assertEqual, [0, 1, 4, 9])
+        return d
+
+    def test_unpicklable_results(self):
+        self.pool.check_interval = 0.1
+        d = self.pool.submit(unpicklable, [1, 2])
+        d = self.assertFailure(d, workers.RemoteError)
+
+        @d.addCallback
+        def check(error):
+            self.assertIn("MaybeEncodingError", str(error))
+
+        return d
+
+    def test_cancel(self):
+        """
+        Tests that no more items are consumed once a job is cancelled.
+        """
+        self.pool.window = 1
+        consumed = []
+
+        def items():
+            for n in xrange(100):
+                consumed.append(n)
+                yield n
+
+        def processed(start, results):
+            d.cancel()
+
+        d = self.pool.submit(squares, items(), chunksize=5,
+                             progress=processed)
+        d = self.assertFailure(d, defer.CancelledError)
+
+        @d.addCallback
+        def check(_):
+            # At most a chunk per worker was submitted
+            self.assertTrue(len(consumed) <= 10, consumed)
+
+        return d
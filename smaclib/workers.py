@@ -0,0 +1,310 @@
+"""
+Worker process pool
+-------------------
+
+CPU bound task runners executing their work in a thread through
+``threads.deferToThread`` all share the single interpreter lock of the
+process. The ``WorkerPool`` defined here runs such work in a fixed number of
+long lived worker processes instead, so that concurrent runners scale with the
+number of cores.
+
+Work is submitted from the reactor thread as a function and an iterable of
+items; the items are sent to the workers in chunks and the results of each
+chunk are relayed back to the reactor thread as soon as they are available,
+allowing the runner to keep its ``Task`` updated.
+
+The submitted function and the items have to be picklable, which in practice
+means that the function has to be defined at the top level of a module.
+"""
+
+
+from __future__ import absolute_import
+
+import signal
+import functools
+import itertools
+import traceback
+import multiprocessing
+
+from twisted.internet import defer
+from twisted.internet import reactor
+from twisted.internet import task
+
+
+class RemoteError(Exception):
+    """
+    Raised when the function submitted to a ``WorkerPool`` fails in a worker
+    process. The message contains the traceback of the original exception.
+    """
+
+
+class WorkerPool(object):
+    """
+    A fixed size pool of worker processes to which chunked jobs are submitted
+    from the reactor thread (see ``submit``).
+    """
+
+    processes = None
+    """
+    Number of worker processes of the pool; defaults to the number of CPUs of
+    the machine.
+    """
+
+    window = 2
+    """
+    Number of chunks per worker process each job keeps submitted at once. The
+    remaining chunks are submitted as the submitted ones complete, so that
+    concurrent jobs share the workers and that a cancelled job stops quickly.
+    """
+
+    check_interval = 1.0
+    """
+    Interval (in seconds) at which the running jobs are checked for chunks
+    lost by the underlying pool (see ``check``).
+    """
+
+    def __init__(self, processes=None):
+        if processes is not None:
+            self.processes = processes
+
+        if self.processes is None:
+            self.processes = multiprocessing.cpu_count()
+
+        self._pool = None
+        self._pids = set()
+        self._jobs = set()
+        self._monitor = task.LoopingCall(self.check)
+
+    @property
+    def pool(self):
+        """
+        The underlying ``multiprocessing.Pool``, started on first access.
+        """
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(self.processes, _init_worker)
+            self._pids = self._alive()
+        return self._pool
+
+    def _alive(self):
+        return set(p.pid for p in self._pool._pool if p.exitcode is None)
+
+    def check(self):
+        """
+        Fails the running jobs whose chunks will never complete: the
+        ``multiprocessing.Pool`` only calls back the chunks which succeeded,
+        and silently replaces the worker processes which died along with the
+        chunk they were running.
+
+        A job fails if one of its chunks could not be sent to or from the
+        workers (pickling errors), and all the running jobs fail if a worker
+        process died, as the job of the lost chunk is unknown.
+        """
+        if self._pool is None:
+            return
+
+        alive = self._alive()
+        died = self._pids - alive
+        self._pids = alive
+
+        for job in list(self._jobs):
+            if died:
+                job.fail(RemoteError("A worker process died unexpectedly "
+                                     "(process {0})".format(
+                                        ', '.join(map(str, sorted(died))))))
+            else:
+                job.check()
+
+        if not self._jobs and self._monitor.running:
+            self._monitor.stop()
+
+    def _register(self, job):
+        self._jobs.add(job)
+
+        if not self._monitor.running:
+            self._monitor.start(self.check_interval, now=False)
+
+    def _unregister(self, job):
+        # The monitor stops at its next check
+        self._jobs.discard(job)
+
+    def submit(self, function, items, args=(), chunksize=1, progress=None):
+        """
+        Applies ``function(chunk, *args)`` in the worker processes to each
+        chunk of (at most) ``chunksize`` items taken from the ``items``
+        iterable. The function has to return a list with a result for each of
+        the items of the chunk.
+
+        The items are consumed lazily, as the chunks are submitted. If given,
+        ``progress`` is called in the reactor thread as each chunk completes
+        with the index of the first item of the chunk and the list of its
+        results; chunks may complete out of order.
+
+        Returns a deferred firing with the list of the results of all the
+        items, in order. Cancelling it stops the submission of the remaining
+        chunks and discards the results of the already submitted ones.
+        """
+        job = _Job(self, function, items, args, chunksize, progress)
+        return job.start()
+
+    def close(self):
+        """
+        Stops the worker processes, abandoning any running job.
+        """
+        if self._monitor.running:
+            self._monitor.stop()
+
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+
+class _Job(object):
+    """
+    The bookkeeping of a single ``WorkerPool.submit`` call.
+    """
+
+    def __init__(self, pool, function, items, args, chunksize, progress):
+        self.pool = pool
+        self.function = function
+        self.args = args
+        self.progress = progress
+        self.items = iter(items)
+        self.chunksize = chunksize
+        self.submitted = 0
+        self.running = 0
+        self.results = {}
+        self.submitted_chunks = {}
+        self.exhausted = False
+        self.deferred = defer.Deferred(self.cancel)
+
+    def start(self):
+        self.pool._register(self)
+
+        @self.deferred.addBoth
+        def unregister(result):
+            self.pool._unregister(self)
+            return result
+
+        for _ in xrange(self.pool.processes * self.pool.window):
+            if not self.submit():
+                break
+
+        if not self.running:
+            self.deferred.callback([])
+
+        return self.deferred
+
+    def submit(self):
+        """
+        Submits the next chunk of items and returns whether there was one.
+        """
+        if self.exhausted:
+            return False
+
+        chunk = list(itertools.islice(self.items, self.chunksize))
+
+        if not chunk:
+            self.exhausted = True
+            return False
+
+        start, self.submitted = self.submitted, self.submitted + len(chunk)
+        self.running += 1
+
+        callback = functools.partial(reactor.callFromThread, self.completed,
+                                     start)
+        self.submitted_chunks[start] = self.pool.pool.apply_async(
+            _run, (self.function, chunk, self.args), callback=callback)
+
+        return True
+
+    def check(self):
+        """
+        Fails this job if one of its submitted chunks failed without being
+        called back (see ``WorkerPool.check``).
+        """
+        for result in self.submitted_chunks.values():
+            if result.ready() and not result.successful():
+                try:
+                    result.get()
+                except Exception:
+                    self.fail(RemoteError(traceback.format_exc()))
+                return
+
+    def fail(self, error):
+        self.exhausted = True
+
+        if not self.deferred.called:
+            self.deferred.errback(error)
+
+    def completed(self, start, (succeeded, results)):
+        self.running -= 1
+        del self.submitted_chunks[start]
+
+        if self.deferred.called:
+            # Cancelled or already failed
+            return
+
+        if not succeeded:
+            self.exhausted = True
+            self.deferred.errback(RemoteError(results))
+            return
+
+        self.results[start] = results
+
+        if self.progress is not None:
+            try:
+                self.progress(start, results)
+            except Exception:
+                self.exhausted = True
+                self.deferred.errback()
+                return
+
+        if self.deferred.called:
+            # Cancelled by the progress callback
+            return
+
+        self.submit()
+
+        if not self.running:
+            results = [self.results[i] for i in sorted(self.results)]
+            self.deferred.callback(list(itertools.chain(*results)))
+
+    def cancel(self, deferred):
+        self.exhausted = True
+
+
+def _init_worker():
+    # Interrupts are handled by the parent process, which terminates the pool;
+    # the handlers installed by the reactor are of no use in the workers and
+    # would prevent them from being terminated.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def _run(function, chunk, args):
+    """
+    Worker process side of ``WorkerPool.submit``. Exceptions are returned as
+    a formatted traceback, as they can't be reliably pickled.
+    """
+    try:
+        return True, function(chunk, *args)
+    except Exception:
+        return False, traceback.format_exc()
+
+
+_shared = None
+
+
+def get_pool():
+    """
+    Returns the worker pool shared by all the runners of this process. The
+    pool is created on first call and closed when the reactor shuts down.
+    """
+    global _shared
+
+    if _shared is None:
+        _shared = WorkerPool()
+        reactor.addSystemEventTrigger('before', 'shutdown', _shared.close)
+
+    return _shared
@@ -1,3 +1,4 @@
+from smaclib.conf import settings
 from smaclib.twisted.plugins import module
 
 
@@ -5,9 +6,15 @@ class AnalyzerMaker(module.ModuleMaker):
     tapname = "smac-analyzer"
     description = "Analyzer module for SMAC."
 
+    def loadSettings(self, configfile):
+        from smaclib.modules.analyzer import settings as analyzer_settings
+        settings.load(analyzer_settings)
+
+        super(AnalyzerMaker, self).loadSettings(configfile)
+
     def getModule(self):
         from smaclib.modules.analyzer import module
         return module.Analyzer()
 
 
-serviceMaker = AnalyzerMaker()
\ No newline at end of file
+serviceMaker = AnalyzerMaker()